@@ -26,7 +26,9 @@ print("🔇 Disabled Google ADK telemetry (avoids thought_signature bytes serial
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
-from typing import List
+import asyncio
+import json
+from typing import Dict, List, Optional
 import logging
 
 # Force load Quartz/PyObjC for pynput (required for PyInstaller)
@@ -72,9 +74,20 @@ load_env_from_settings()
 # Import Pointer backend agent
 try:
     from agent import root_agent
-    from google.adk.runners import InMemoryRunner
+    from google.adk.artifacts import InMemoryArtifactService
+    from google.adk.memory import InMemoryMemoryService
+    from google.adk.runners import Runner
+    from tools.session_store import SQLiteSessionService
     
-    pointer_runner = InMemoryRunner(agent=root_agent, app_name="pointer_agent")
+    # InMemoryRunner's services, but with sessions persisted to SQLite and only
+    # recently used ones kept in memory
+    pointer_runner = Runner(
+        app_name="pointer_agent",
+        agent=root_agent,
+        artifact_service=InMemoryArtifactService(),
+        session_service=SQLiteSessionService(),
+        memory_service=InMemoryMemoryService(),
+    )
     POINTER_BACKEND_AVAILABLE = True
     print("✅ Pointer backend agent loaded successfully")
 except ImportError as e:
@@ -116,19 +129,41 @@ app.include_router(asi.router, prefix="/api/asi", tags=["asi"])
 class ConnectionManager:
     def __init__(self):
         self.connections: List[WebSocket] = []
+        # Broadcasts and agent replies share a socket; one send at a time each
+        self._send_locks: Dict[WebSocket, asyncio.Lock] = {}
+        # The server's event loop, for broadcasts from other threads (keyboard monitor)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
     
     def add(self, websocket: WebSocket):
         self.connections.append(websocket)
+        self._send_locks[websocket] = asyncio.Lock()
     
     def remove(self, websocket: WebSocket):
         if websocket in self.connections:
             self.connections.remove(websocket)
+        self._send_locks.pop(websocket, None)
     
     def get_all(self):
         return self.connections[:]
     
     def count(self):
         return len(self.connections)
+    
+    async def send(self, websocket: WebSocket, message: dict):
+        """Send a JSON message to one connection"""
+        lock = self._send_locks.get(websocket)
+        if lock is None:
+            raise RuntimeError("WebSocket is not connected")
+        async with lock:
+            await websocket.send_text(json.dumps(message, default=str))
+    
+    async def broadcast(self, message: dict):
+        """Send a JSON message to every connection, dropping ones that fail"""
+        for connection in self.get_all():
+            try:
+                await self.send(connection, message)
+            except Exception:
+                self.remove(connection)
 
 connection_manager = ConnectionManager()
 
@@ -141,26 +176,71 @@ screenshot_handler = ScreenshotHandler()
 keyboard_monitor = None
 
 
+def _log_store_open_error(future: asyncio.Future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"Could not open the knowledge base: {future.exception()}")
+
+
 @app.on_event("startup")
 async def startup_event():
     """Startup event - keyboard monitor is initialized in main"""
+    # Resume knowledge base ingestion jobs and stream their progress over /ws
+    from tools import ingest
+    from tools.concurrency import get_store_executor
+    from tools.rag import get_store
+    ingest.connection_manager = connection_manager
+    connection_manager.loop = asyncio.get_running_loop()
+    # Open the knowledge base in the background; startup doesn't wait for it
+    opening = asyncio.get_running_loop().run_in_executor(get_store_executor(), get_store)
+    opening.add_done_callback(_log_store_open_error)
+    await ingest.start_workers()
+    
     print("✅ Pointer backend startup event completed!")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Shutdown event - stop ingestion workers and flush the knowledge base ANN index"""
+    from tools.ingest import stop_workers
+    from tools.concurrency import shutdown_store_pool
+    await stop_workers()
+    shutdown_store_pool()
+    
+    try:
+        from tools import rag
+        # Nothing to flush if the store was never opened; don't open it just to close it
+        if rag._store is not None:
+            rag._store.save_index()
+            rag._store.close()
+    except Exception as e:
+        logger.warning(f"Could not save knowledge base index: {e}")
+
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    """WebSocket connection for real-time events"""
+    """WebSocket connection for real-time events and agent queries (see routes.agent.AgentSocket)"""
+    from routes.agent import AgentSocket
     await websocket.accept()
     connection_manager.add(websocket)
+    agent_socket = AgentSocket(lambda message: connection_manager.send(websocket, message))
     print(f"✅ WebSocket connected! Total connections: {connection_manager.count()}")
     
     try:
         while True:
             data = await websocket.receive_text()
+            try:
+                message = json.loads(data)
+            except ValueError:
+                message = None
+            if isinstance(message, dict) and await agent_socket.handle(message):
+                continue
             print(f"📨 Received WebSocket message: {data}")
     except WebSocketDisconnect:
         connection_manager.remove(websocket)
         print(f"❌ WebSocket disconnected. Remaining connections: {connection_manager.count()}")
+    finally:
+        agent_socket.close()
+        connection_manager.remove(websocket)
 
 
 def get_keyboard_monitor():
@@ -215,6 +295,10 @@ def initialize_backend():
 
 
 if __name__ == "__main__":
+    # Required for the PDF extraction process pool in the PyInstaller build
+    import multiprocessing
+    multiprocessing.freeze_support()
+    
     # Initialize keyboard monitor before starting server
     initialize_backend()
     
@@ -1,6 +1,9 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, AsyncIterator, Tuple
+import asyncio
+import json
 import logging
 import uuid
 
@@ -56,136 +59,418 @@ async def process_query(request: dict):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/agent", response_model=AgentResponse)
-async def process_agent_request(request: AgentRequest):
+def _asi_context(request: AgentRequest) -> Dict[str, Any]:
+    """Build the ASI One context (selected text) from the request's context parts"""
+    context = {}
+    if request.context_parts:
+        for part in request.context_parts:
+            if part.get("type") == "text" and "Selected text:" in part.get("content", ""):
+                selected_text = part.get("content", "").replace("Selected text:", "").strip()
+                context["selected_text"] = selected_text
+    return context
+
+
+async def _run_intent(intent) -> Tuple[Dict[str, Any], str]:
+    """Call the tool for a fast-path intent; returns its result and a description of it"""
+    if intent.name == "rag_add":
+        from tools.rag import rag_add
+        result = await rag_add(str(uuid.uuid4()), intent.args["text"], source=intent.args["source"])
+        return result, "Already in your knowledge base." if result["duplicate"] else "Saved to your knowledge base."
+    
+    if intent.name == "rag_query":
+        from tools.rag import rag_query
+        # Keyword mode: with no model to judge relevance, only list notes that
+        # share words with the query (hybrid always fills every slot)
+        result = await rag_query(intent.args["query"], k=3, mode="bm25")
+        matches = result.get("matches", [])
+        if not matches:
+            return result, f"I couldn't find anything about \"{intent.args['query']}\" in your knowledge base."
+        lines = [f"{i}. {match['preview']}" for i, match in enumerate(matches, 1)]
+        # Raw keyword matches, not an answer; say so rather than pass them off as one
+        return result, (f"Notes in your knowledge base that mention \"{intent.args['query']}\" "
+                        f"(keyword matches, best first):\n\n" + "\n".join(lines))
+    
+    from tools.calendar import add_to_calendar
+    result = await add_to_calendar(**intent.args)
+    title = intent.args["title"]
+    if result.get("status") == "success":
+        link = f"\n{result['htmlLink']}" if result.get("htmlLink") else ""
+        return result, f"Added \"{title}\" to your calendar at {intent.args['start_iso']}.{link}"
+    reason = result.get("error") or result.get("reason") or result.get("status")
+    return result, f"Couldn't add \"{title}\" to your calendar: {reason}"
+
+
+def _get_or_create_session(session_id: str, user_id: str):
+    session = pointer_runner.session_service.get_session(
+        app_name=pointer_runner.app_name,
+        user_id=user_id,
+        session_id=session_id
+    )
+    if not session:
+        session = pointer_runner.session_service.create_session(
+            app_name=pointer_runner.app_name,
+            user_id=user_id,
+            session_id=session_id
+        )
+    return session
+
+
+def _user_content(request: AgentRequest):
+    """The user turn as the agent sees it: the message, then any context parts"""
+    from google.genai import types
+    parts = [types.Part(text=request.message)]
+    for ctx_part in request.context_parts or []:
+        parts.append(types.Part(text=ctx_part.get("content", "")))
+    return types.Content(role="user", parts=parts)
+
+
+def _record_fast_path(session_id: str, user_id: str, request: AgentRequest, intent,
+                      call_id: str, result: Dict[str, Any], response_text: str):
+    """Append a fast-path turn to the session as the agent would have recorded it
+    (user message, tool call, tool response, reply), so later turns can refer to it"""
+    from google.genai import types
+    from google.adk.events.event import Event
+    from google.adk.agents.invocation_context import new_invocation_context_id
+    
+    session = _get_or_create_session(session_id, user_id)
+    invocation_id = new_invocation_context_id()
+    author = pointer_runner.agent.name
+    for event in (
+        Event(invocation_id=invocation_id, author="user", content=_user_content(request)),
+        Event(invocation_id=invocation_id, author=author, content=types.Content(role="model", parts=[
+            types.Part(function_call=types.FunctionCall(id=call_id, name=intent.name, args=intent.args))
+        ])),
+        Event(invocation_id=invocation_id, author=author, content=types.Content(role="user", parts=[
+            types.Part(function_response=types.FunctionResponse(id=call_id, name=intent.name, response=result))
+        ])),
+        Event(invocation_id=invocation_id, author=author,
+              content=types.Content(role="model", parts=[types.Part(text=response_text)])),
+    ):
+        pointer_runner.session_service.append_event(session, event)
+
+
+async def _fast_path_events(request: AgentRequest, intent,
+                            intent_router) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """agent_events() frames for an intent handled without the agent"""
+    import time
+    from google.adk.flows.llm_flows.functions import generate_client_function_call_id
+    start_time = time.time()
+    # Client-side ids ("adk-...") are stripped before the history goes to the model
+    call_id = generate_client_function_call_id()
+    logger.info(f"⚡ Fast path: {intent.name} ({intent.matched_by}, confidence {intent.confidence:.2f})")
+    
+    yield "function_call_start", {"name": intent.name, "args": intent.args, "id": call_id}
+    result, response_text = await _run_intent(intent)
+    yield "function_call_end", {"name": intent.name, "id": call_id}
+    yield "delta", {"text": response_text}
+    
+    session_id = request.session_id
+    if pointer_runner:
+        session_id = session_id or str(uuid.uuid4())
+        _record_fast_path(session_id, "default_user", request, intent, call_id, result, response_text)
+    
+    elapsed_ms = (time.time() - start_time) * 1000
+    intent_router.record_fast_path(intent, elapsed_ms)
+    yield "done", {
+        "response": response_text,
+        "session_id": session_id,
+        "metadata": {
+            "routed_to": "fast_path",
+            "intent": intent.name,
+            "matched_by": intent.matched_by,
+            "confidence": round(intent.confidence, 3),
+            "tool_calls": [intent.name],
+            "elapsed_ms": round(elapsed_ms)
+        }
+    }
+
+
+async def agent_events(request: AgentRequest,
+                       streaming: bool = False) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
     """
-    Process user message through the Pointer agent and return results.
+    Run a request through the Pointer agent, yielding (frame type, data) as events arrive.
     
-    Args:
-        request: AgentRequest containing message, optional context, and session_id
+    Frames:
+        ("delta", {"text"}) - a piece of the response text
+        ("function_call_start", {"name", "args", "id"}) - the agent called a tool
+        ("function_call_end", {"name", "id"}) - the tool returned
+        ("done", {"response", "session_id", "metadata"}) - always last
     
-    Returns:
-        AgentResponse with agent's response and metadata
+    With `streaming`, the model's output is requested in ADK's SSE mode, so
+    deltas are token chunks rather than whole model turns.
     """
     # Check if message starts with @asi - route to ASI One
     if request.message.strip().lower().startswith("@asi"):
         from .asi import process_asi_query
         asi_query = request.message[4:].strip()  # Remove @asi prefix
-        
-        # Build context from context_parts
-        context = {}
-        if request.context_parts:
-            for part in request.context_parts:
-                if part.get("type") == "text" and "Selected text:" in part.get("content", ""):
-                    selected_text = part.get("content", "").replace("Selected text:", "").strip()
-                    context["selected_text"] = selected_text
-        
-        result = await process_asi_query(asi_query, context)
-        return AgentResponse(
-            response=result,
-            session_id=request.session_id,
-            metadata={"routed_to": "asi_one"}
-        )
+        result = await process_asi_query(asi_query, _asi_context(request))
+        yield "delta", {"text": result}
+        yield "done", {
+            "response": result,
+            "session_id": request.session_id,
+            "metadata": {"routed_to": "asi_one"}
+        }
+        return
+    
+    # Deterministic commands ("remember this: ...") run their tool directly,
+    # skipping the agent's model round trips
+    from tools.intent import FAST_PATH_ENABLED, get_intent_router
+    intent_router = None
+    if FAST_PATH_ENABLED:
+        intent_router = get_intent_router()
+        intent = intent_router.classify(request.message, _asi_context(request).get("selected_text"))
+        if intent:
+            async for frame in _fast_path_events(request, intent, intent_router):
+                yield frame
+            return
     
     if not pointer_runner:
         raise HTTPException(status_code=503, detail="Pointer backend not available")
     
-    try:
-        from google.genai import types
-        
-        logger.info("=" * 60)
-        logger.info("🚀 POINTER AGENT REQUEST")
-        logger.info(f"📝 Message: {request.message}")
-        logger.info(f"🔑 Session ID: {request.session_id}")
-        logger.info("=" * 60)
-        
-        # Generate session_id if not provided
-        session_id = request.session_id or str(uuid.uuid4())
-        user_id = "default_user"
-        
-        # Create or get session
-        session = pointer_runner.session_service.get_session(
-            app_name=pointer_runner.app_name,
-            user_id=user_id,
-            session_id=session_id
-        )
-        if not session:
-            session = pointer_runner.session_service.create_session(
-                app_name=pointer_runner.app_name,
-                user_id=user_id,
-                session_id=session_id
-            )
-        
-        # Prepare the message content
-        parts = [types.Part(text=request.message)]
-        logger.info(f"📝 User message: {request.message}")
-        print(f"[DEBUG] User message: {request.message}")
-        
-        # Add context parts if provided
-        if request.context_parts:
-            for ctx_part in request.context_parts:
-                parts.append(types.Part(text=ctx_part.get("content", "")))
-            logger.info(f"📎 Added {len(request.context_parts)} context part(s)")
-        else:
-            logger.info("📎 No context parts provided")
-        
-        logger.info(f"📨 Total message parts: {len(parts)}")
-        print(f"[DEBUG] Total message parts: {len(parts)}")
-        new_message = types.Content(role="user", parts=parts)
-        
-        # Run the agent and collect the response
-        logger.info("🤖 Starting agent execution...")
-        print("[DEBUG] Starting agent execution...")
-        response_text = ""
-        event_count = 0
-        
-        import time
-        start_time = time.time()
-        
-        async for event in pointer_runner.run_async(
-            user_id=user_id,
-            session_id=session_id,
-            new_message=new_message
-        ):
-            event_count += 1
-            elapsed = time.time() - start_time
+    from google.adk.agents.run_config import RunConfig, StreamingMode
+    
+    logger.info("=" * 60)
+    logger.info("🚀 POINTER AGENT REQUEST")
+    logger.info(f"📝 Message: {request.message}")
+    logger.info(f"🔑 Session ID: {request.session_id}")
+    logger.info("=" * 60)
+    
+    # Generate session_id if not provided
+    session_id = request.session_id or str(uuid.uuid4())
+    user_id = "default_user"
+    
+    # Create or get session
+    _get_or_create_session(session_id, user_id)
+    
+    # Prepare the message content
+    logger.info(f"📝 User message: {request.message}")
+    if request.context_parts:
+        logger.info(f"📎 Added {len(request.context_parts)} context part(s)")
+    else:
+        logger.info("📎 No context parts provided")
+    new_message = _user_content(request)
+    logger.info(f"📨 Total message parts: {len(new_message.parts)}")
+    
+    # Run the agent, passing events on as they arrive
+    logger.info("🤖 Starting agent execution...")
+    response_text = ""
+    event_count = 0
+    tool_calls = []
+    first_delta_time = None
+    # In SSE mode each model turn arrives as partial chunks followed by one
+    # final event repeating the whole text; only the chunks are forwarded
+    streamed_partial = False
+    run_config = RunConfig(streaming_mode=StreamingMode.SSE) if streaming else None
+    
+    import time
+    start_time = time.time()
+    
+    async for event in pointer_runner.run_async(
+        user_id=user_id,
+        session_id=session_id,
+        new_message=new_message,
+        **({"run_config": run_config} if run_config else {})
+    ):
+        event_count += 1
+        elapsed = time.time() - start_time
+        partial = bool(getattr(event, "partial", False))
+        if not partial:
             logger.info(f"⏱️  Event {event_count} at {elapsed:.2f}s - Type: {type(event).__name__}")
-            print(f"[DEBUG] Event {event_count}: {type(event).__name__}")
-            
-            # Log function calls
-            if hasattr(event, 'content') and event.content:
-                for part in event.content.parts:
-                    if hasattr(part, 'function_call') and part.function_call:
-                        func_name = part.function_call.name if part.function_call.name else "unknown"
-                        print(f"[DEBUG] 🔧 Function call: {func_name}")
-                        print(f"[DEBUG] 📋 Arguments: {part.function_call.args}")
-                        logger.info(f"🔧 Function call: {func_name}")
-                        logger.info(f"📋 Arguments: {part.function_call.args}")
-                    elif hasattr(part, 'function_response') and part.function_response:
-                        func_name = part.function_response.name if part.function_response.name else "unknown"
-                        print(f"[DEBUG] ✅ Function response: {func_name}")
-                        print(f"[DEBUG] 📤 Response: {part.function_response.response}")
-                        logger.info(f"✅ Function response: {func_name}")
-                    elif hasattr(part, 'text') and part.text:
-                        response_text += part.text
-                        logger.info(f"💬 Agent response chunk: {part.text[:100]}...")
-                        print(f"[DEBUG] 💬 Text: {part.text[:200]}...")
         
-        total_time = time.time() - start_time
-        logger.info(f"✅ Agent execution complete in {total_time:.2f}s. Total events: {event_count}")
-        logger.info(f"📤 Final response length: {len(response_text)} characters")
-        logger.info(f"📤 Full response: {response_text}")
-        print(f"[DEBUG] Full response: {response_text}")
+        if hasattr(event, 'content') and event.content and event.content.parts:
+            for part in event.content.parts:
+                if hasattr(part, 'function_call') and part.function_call:
+                    func_name = part.function_call.name if part.function_call.name else "unknown"
+                    logger.info(f"🔧 Function call: {func_name}")
+                    logger.info(f"📋 Arguments: {part.function_call.args}")
+                    tool_calls.append(func_name)
+                    yield "function_call_start", {
+                        "name": func_name,
+                        "args": dict(part.function_call.args or {}),
+                        "id": part.function_call.id
+                    }
+                elif hasattr(part, 'function_response') and part.function_response:
+                    func_name = part.function_response.name if part.function_response.name else "unknown"
+                    logger.info(f"✅ Function response: {func_name}")
+                    yield "function_call_end", {"name": func_name, "id": part.function_response.id}
+                elif hasattr(part, 'text') and part.text:
+                    if partial:
+                        streamed_partial = True
+                    elif streamed_partial:
+                        continue
+                    if first_delta_time is None:
+                        first_delta_time = time.time() - start_time
+                    response_text += part.text
+                    yield "delta", {"text": part.text}
+        if not partial:
+            streamed_partial = False
+    
+    total_time = time.time() - start_time
+    logger.info(f"✅ Agent execution complete in {total_time:.2f}s. Total events: {event_count}")
+    logger.info(f"📤 Final response length: {len(response_text)} characters")
+    if intent_router:
+        intent_router.record_agent_run(total_time * 1000)
+    
+    yield "done", {
+        "response": response_text or "No response generated",
+        "session_id": session_id,
+        "metadata": {
+            "event_count": event_count,
+            "tool_calls": tool_calls,
+            "elapsed_ms": round(total_time * 1000),
+            "first_delta_ms": round(first_delta_time * 1000) if first_delta_time is not None else None
+        }
+    }
 
-        
-        return AgentResponse(
-            response=response_text or "No response generated",
-            session_id=session_id,
-            metadata={"event_count": event_count}
-        )
+
+@router.post("/agent", response_model=AgentResponse)
+async def process_agent_request(request: AgentRequest):
+    """
+    Process user message through the Pointer agent and return results.
     
+    Args:
+        request: AgentRequest containing message, optional context, and session_id
+    
+    Returns:
+        AgentResponse with agent's response and metadata
+    """
+    try:
+        async for frame_type, data in agent_events(request):
+            if frame_type == "done":
+                logger.info(f"📤 Full response: {data['response']}")
+                return AgentResponse(**data)
+        raise RuntimeError("Agent run ended without a result")
+    
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"❌ Error processing agent request: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/agent/sessions")
+async def get_session_stats():
+    """Agent session counts and memory use (see tools.sessions.BoundedSessionService)"""
+    if not pointer_runner:
+        raise HTTPException(status_code=503, detail="Pointer backend not available")
+    service = pointer_runner.session_service
+    if not hasattr(service, "stats"):
+        return {"success": True, "stats": None}
+    return {"success": True, "stats": service.stats()}
+
+
+@router.get("/agent/fast-path")
+async def get_fast_path_stats():
+    """How often requests skip the agent via the local intent router, and the time saved"""
+    from tools.intent import get_intent_router
+    return {"success": True, "stats": get_intent_router().stats()}
+
+
+def _sse(frame_type: str, data: Dict[str, Any]) -> str:
+    return f"event: {frame_type}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@router.post("/agent/stream")
+async def stream_agent_request(request: AgentRequest):
+    """
+    Process user message through the Pointer agent, streaming Server-Sent Events.
+    
+    Each frame's event name is its type (delta, function_call_start,
+    function_call_end, done, or error) and its data is JSON; see agent_events().
+    """
+    if not request.message.strip().lower().startswith("@asi") and not pointer_runner:
+        raise HTTPException(status_code=503, detail="Pointer backend not available")
+    
+    async def frames():
+        try:
+            async for frame_type, data in agent_events(request, streaming=True):
+                yield _sse(frame_type, data)
+        except Exception as e:
+            logger.error(f"❌ Error streaming agent request: {e}")
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            yield _sse("error", {"message": detail})
+    
+    return StreamingResponse(frames(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+
+class AgentSocket:
+    """
+    Agent requests over one /ws connection, so the overlay can reuse the
+    connection that delivered the hotkey instead of opening an HTTP request.
+    
+    Client messages:
+        {"type": "agent-query", "data": {"id", "message", "context_parts", "session_id"}}
+        {"type": "agent-cancel", "data": {"id"}}
+    
+    Server messages, each carrying the query's "id" in data:
+        agent-delta, agent-function-call-start, agent-function-call-end and
+        agent-done (the agent_events() frames), then agent-error or
+        agent-cancelled if the run fails or is cancelled
+    """
+    
+    def __init__(self, send):
+        # send: coroutine function taking one JSON message
+        self._send = send
+        self._tasks: Dict[str, asyncio.Task] = {}
+    
+    async def handle(self, message: Dict[str, Any]) -> bool:
+        """Act on an agent-* message; returns False for messages of any other type"""
+        message_type = message.get("type")
+        data = message.get("data") or {}
+        query_id = str(data.get("id") or "")
+        
+        if message_type == "agent-query":
+            if not query_id:
+                await self._send({"type": "agent-error", "data": {"id": None, "message": "agent-query needs an id"}})
+            elif query_id in self._tasks:
+                await self._send({"type": "agent-error", "data": {"id": query_id, "message": "Query id already in use"}})
+            else:
+                try:
+                    request = AgentRequest(**{key: data.get(key) for key in ("message", "context_parts", "session_id")})
+                except Exception as e:
+                    await self._send({"type": "agent-error", "data": {"id": query_id, "message": str(e)}})
+                    return True
+                task = asyncio.create_task(self._run(query_id, request))
+                self._tasks[query_id] = task
+                task.add_done_callback(lambda _: self._tasks.pop(query_id, None))
+            return True
+        
+        if message_type == "agent-cancel":
+            task = self._tasks.get(query_id)
+            if task:
+                task.cancel()
+            return True
+        
+        return False
+    
+    async def _run(self, query_id: str, request: AgentRequest):
+        try:
+            async for frame_type, data in agent_events(request, streaming=True):
+                await self._send({
+                    "type": "agent-" + frame_type.replace("_", "-"),
+                    "data": {"id": query_id, **data}
+                })
+        except asyncio.CancelledError:
+            logger.info(f"🛑 Agent query {query_id} cancelled")
+            try:
+                await self._send({"type": "agent-cancelled", "data": {"id": query_id}})
+            except Exception:
+                pass
+            raise
+        except Exception as e:
+            logger.error(f"❌ Error running agent query {query_id} over WebSocket: {e}")
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            try:
+                await self._send({"type": "agent-error", "data": {"id": query_id, "message": detail}})
+            except Exception:
+                pass
+    
+    def close(self):
+        """Cancel every running query (the connection is gone)"""
+        for task in list(self._tasks.values()):
+            task.cancel()
@@ -1,6 +1,9 @@
 from fastapi import APIRouter, HTTPException, UploadFile, File
-from pydantic import BaseModel
-from typing import List, Optional
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Any, Dict, List, Optional, Union
+from datetime import datetime
+import json
 import logging
 import os
 
@@ -15,9 +18,33 @@ class AddDocumentRequest(BaseModel):
     filename: Optional[str] = None
 
 
+class AddBatchRequest(BaseModel):
+    documents: List[AddDocumentRequest]
+
+
 class QueryRequest(BaseModel):
     query: str
     k: int = 5
+    mode: str = "exact"  # exact, ann, bm25, hybrid
+    nprobe: Optional[int] = None
+    # Filters (all optional, combined with AND)
+    source: Optional[Union[str, List[str]]] = None
+    filename: Optional[str] = None
+    file_id: Optional[str] = None
+    created_after: Optional[str] = None  # ISO 8601, inclusive
+    created_before: Optional[str] = None  # ISO 8601, exclusive
+    metadata: Optional[Dict[str, Any]] = None
+    # Maximal Marginal Relevance rerank of the top fetch_k (off unless lambda is set)
+    mmr_lambda: Optional[float] = Field(None, alias="lambda", ge=0.0, le=1.0)
+    fetch_k: Optional[int] = None
+
+    model_config = ConfigDict(populate_by_name=True)
+
+
+class SearchRequest(BaseModel):
+    query: str
+    k: int = 10
+    prefix: bool = True
 
 
 @router.get("/stats")
@@ -25,16 +52,18 @@ async def get_stats():
     """Get knowledge base statistics."""
     try:
         from tools.rag import get_store
-        store = get_store()
+        from tools.concurrency import run_in_store_pool
+        store = await run_in_store_pool(get_store)
         
-        # Count by source
-        sources = {}
-        for doc in store.docs:
-            sources[doc.source] = sources.get(doc.source, 0) + 1
+        stats = await run_in_store_pool(store.stats)
+        # Storage mode (float32/float16/int8), memory use and estimated recall
+        vectors = await run_in_store_pool(store.vector_stats)
         
         return {
-            "total_documents": len(store.docs),
-            "by_source": sources,
+            "success": True,
+            **stats,
+            "vectors": vectors,
+            "cache": store.cache_stats(),
             "database_path": store.db_path
         }
     except Exception as e:
@@ -44,76 +73,90 @@ async def get_stats():
 
 @router.post("/add")
 async def add_document(request: AddDocumentRequest):
-    """Add a document to the knowledge base."""
+    """Queue a document for the knowledge base; returns its id immediately.
+
+    Text that is already stored isn't queued again: the existing document's id
+    comes back with `"duplicate": true`.
+    """
     try:
-        from tools.rag import get_store, embed
-        import uuid
+        from tools.rag import get_store
+        from tools.ingest import submit_text
+        from tools.concurrency import run_in_store_pool
         
-        store = get_store()
-        doc_id = str(uuid.uuid4())
+        store = await run_in_store_pool(get_store)
+        existing = await run_in_store_pool(store.find_duplicate, request.text)
+        if existing is not None:
+            return {
+                "success": True,
+                "id": existing,
+                "job_id": None,
+                "status": "done",
+                "duplicate": True,
+                "total_documents": len(store)
+            }
         
-        # Embed and add
-        vec = embed(request.text)
-        store.add(doc_id, request.text, vec, source=request.source, filename=request.filename)
+        job = await submit_text(request.text, source=request.source, filename=request.filename)
         
         return {
             "success": True,
-            "id": doc_id,
-            "total_documents": len(store.docs)
+            "id": job.result_id,
+            "job_id": job.id,
+            "status": job.status,
+            "duplicate": False,
+            "total_documents": len(store)
         }
     except Exception as e:
         logger.error(f"Error adding document: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
-    """Upload a file to the knowledge base."""
+@router.post("/add-batch")
+async def add_documents_batch(request: AddBatchRequest):
+    """Add many documents at once (single embedding pass and transaction)."""
     try:
-        from tools.rag import get_store, embed
-        import uuid
+        from tools.rag import get_store
+        from tools.concurrency import run_in_store_pool
         
-        # Read file content
-        content = await file.read()
+        store = await run_in_store_pool(get_store)
+        ids = await run_in_store_pool(store.add_many, [doc.model_dump() for doc in request.documents])
         
-        # Handle PDF files
-        if file.filename and (file.filename.endswith('.pdf') or file.content_type == 'application/pdf'):
-            try:
-                from pypdf import PdfReader
-                from io import BytesIO
-                
-                # Extract text from PDF
-                pdf_reader = PdfReader(BytesIO(content))
-                text_parts = []
-                for page in pdf_reader.pages:
-                    text_parts.append(page.extract_text())
-                text = "\n\n".join(text_parts)
-                
-                if not text.strip():
-                    raise HTTPException(status_code=400, detail="Could not extract text from PDF")
-                    
-            except Exception as e:
-                logger.error(f"Error extracting PDF text: {e}")
-                raise HTTPException(status_code=400, detail=f"Failed to process PDF: {str(e)}")
-        else:
-            # Handle text files
-            try:
-                text = content.decode('utf-8')
-            except UnicodeDecodeError:
-                raise HTTPException(status_code=400, detail="File must be UTF-8 encoded text or PDF")
+        return {
+            "success": True,
+            "ids": ids,
+            "added": len(ids),
+            "total_documents": len(store)
+        }
+    except Exception as e:
+        logger.error(f"Error adding documents: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/upload")
+async def upload_file(file: UploadFile = File(...), chunk_size: Optional[int] = None,
+                      chunk_overlap: Optional[int] = None):
+    """Upload a file to the knowledge base.
+    
+    The upload is spooled to disk and indexed in the background; poll
+    /api/rag/jobs/{job_id} for progress.
+    """
+    try:
+        from tools.ingest import spool_upload, submit_file, is_pdf
         
-        store = get_store()
-        doc_id = str(uuid.uuid4())
+        if chunk_size is not None and chunk_size <= 0:
+            raise HTTPException(status_code=400, detail="chunk_size must be positive")
         
-        # Embed and add
-        vec = embed(text)
-        store.add(doc_id, text, vec, source="file", filename=file.filename)
+        path = await spool_upload(file)
+        job = await submit_file(path, file.filename, source="file", options={
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+            "is_pdf": is_pdf(file.filename, file.content_type)
+        })
         
         return {
             "success": True,
-            "id": doc_id,
+            "job_id": job.id,
             "filename": file.filename,
-            "total_documents": len(store.docs)
+            "status": job.status
         }
     except HTTPException:
         raise
@@ -122,57 +165,263 @@ async def upload_file(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/jobs")
+async def list_jobs():
+    """List recent ingestion jobs."""
+    from tools.ingest import list_jobs as list_ingest_jobs
+    from tools.concurrency import run_in_store_pool
+    
+    # Progress is also pushed to /ws clients as "ingest-progress" messages
+    jobs = await run_in_store_pool(list_ingest_jobs)
+    return {
+        "success": True,
+        "jobs": [job.to_dict() for job in jobs]
+    }
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Get the status and progress of an ingestion job."""
+    from tools.ingest import get_job as get_ingest_job
+    from tools.concurrency import run_in_store_pool
+    
+    job = await run_in_store_pool(get_ingest_job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"success": True, "job": job.to_dict()}
+
+
+@router.get("/files")
+async def list_files():
+    """List uploaded files (each stored as a set of chunks)."""
+    try:
+        from tools.rag import get_store
+        from tools.concurrency import run_in_store_pool
+        
+        store = await run_in_store_pool(get_store)
+        files = await run_in_store_pool(store.list_files)
+        return {
+            "success": True,
+            "total": len(files),
+            "files": files
+        }
+    except Exception as e:
+        logger.error(f"Error listing files: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.delete("/files/{file_id}")
+async def delete_file(file_id: str):
+    """Delete an uploaded file and all of its chunks."""
+    try:
+        from tools.rag import get_store
+        from tools.concurrency import run_in_store_pool
+        
+        store = await run_in_store_pool(get_store)
+        deleted_chunks = await run_in_store_pool(store.delete_file, file_id)
+        
+        if deleted_chunks is None:
+            raise HTTPException(status_code=404, detail="File not found")
+        
+        return {
+            "success": True,
+            "id": file_id,
+            "deleted_chunks": deleted_chunks,
+            "total_documents": len(store)
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error deleting file: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _match(doc, score: float) -> dict:
+    return {
+        "id": doc.id,
+        "score": float(score),
+        "text": doc.text,
+        "source": doc.source,
+        "filename": doc.filename,
+        "created_at": doc.created_at,
+        "metadata": doc.metadata,
+        "preview": doc.text[:200] + "..." if len(doc.text) > 200 else doc.text
+    }
+
+
+def _ndjson(message_type: str, data: Any) -> str:
+    return json.dumps({"type": message_type, "data": data}) + "\n"
+
+
+# Matches hydrated per store call when streaming query results
+STREAM_BATCH = 32
+
+
 @router.post("/query")
-async def query_documents(request: QueryRequest):
-    """Query the knowledge base."""
+async def query_documents(request: QueryRequest, stream: bool = False):
+    """Query the knowledge base.
+
+    With `?stream=true` the response is NDJSON: one {"type": "match"} line per
+    result in rank order (documents are loaded in small batches as they are
+    written out), then a {"type": "done"} line.
+    """
     try:
-        from tools.rag import get_store, embed
+        from tools.rag import get_store, QueryFilter
+        from tools.concurrency import run_in_store_pool
+        
+        store = await run_in_store_pool(get_store)
+        filters = QueryFilter(
+            source=request.source,
+            filename=request.filename,
+            file_id=request.file_id,
+            created_after=request.created_after,
+            created_before=request.created_before,
+            metadata=request.metadata
+        )
+        try:
+            ranked = await run_in_store_pool(store.rank, request.query, k=request.k,
+                                             mode=request.mode, nprobe=request.nprobe, filters=filters,
+                                             mmr_lambda=request.mmr_lambda, fetch_k=request.fetch_k)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        store = get_store()
-        query_vec = embed(request.query)
-        results = store.search(query_vec, k=request.k)
+        if stream:
+            async def lines():
+                count = 0
+                try:
+                    for start in range(0, len(ranked), STREAM_BATCH):
+                        results = await run_in_store_pool(store.hydrate, ranked[start:start + STREAM_BATCH])
+                        for doc, score in results:
+                            count += 1
+                            yield _ndjson("match", _match(doc, score))
+                    yield _ndjson("done", {"query": request.query, "count": count})
+                except Exception as e:
+                    logger.error(f"Error streaming query results: {e}")
+                    yield _ndjson("error", {"message": str(e)})
+            
+            return StreamingResponse(lines(), media_type="application/x-ndjson")
         
+        results = await run_in_store_pool(store.hydrate, ranked)
         return {
             "success": True,
             "query": request.query,
-            "matches": [{
-                "id": doc.id,
-                "score": float(score),
-                "text": doc.text,
-                "source": doc.source,
-                "filename": doc.filename,
-                "created_at": doc.created_at,
-                "preview": doc.text[:200] + "..." if len(doc.text) > 200 else doc.text
-            } for doc, score in results]
+            "matches": [_match(doc, score) for doc, score in results]
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error querying documents: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/export")
+async def export_knowledge_base():
+    """Stream the whole knowledge base as NDJSON (a backup or migration source).
+
+    The first line is {"type": "meta"} (embedder, vector dimension and
+    encoding), followed by one {"type": "file"} line per uploaded file and one
+    {"type": "document"} line per document with its text, metadata and
+    base64-encoded float32 vector. Rows are streamed from a SQLite cursor,
+    never loaded all at once.
+    """
+    try:
+        from tools.rag import get_store
+        from tools.concurrency import run_in_store_pool
+        
+        store = await run_in_store_pool(get_store)
+        records = store.export_records()
+        meta = {
+            "embedder": store.embedder.signature,
+            "dim": store.embedder.dim,
+            "vector_encoding": "float32-le-base64",
+            "documents": len(store),
+            "exported_at": datetime.utcnow().isoformat()
+        }
+        
+        async def lines():
+            try:
+                yield _ndjson("meta", meta)
+                while True:
+                    batch = await run_in_store_pool(next, records, None)
+                    if batch is None:
+                        break
+                    yield "".join(json.dumps(record) + "\n" for record in batch)
+            except Exception as e:
+                logger.error(f"Error exporting knowledge base: {e}")
+                yield _ndjson("error", {"message": str(e)})
+            finally:
+                # Closes the export's SQLite connection, also when the client disconnects
+                await run_in_store_pool(records.close)
+        
+        filename = f"pointer-knowledge-base-{datetime.utcnow():%Y%m%d-%H%M%S}.ndjson"
+        return StreamingResponse(lines(), media_type="application/x-ndjson",
+                                 headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+    except Exception as e:
+        logger.error(f"Error exporting knowledge base: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/search")
+async def search_documents(request: SearchRequest):
+    """Full-text keyword search (SQLite FTS5); returns ids and snippets only."""
+    try:
+        from tools.rag import get_store
+        from tools.concurrency import run_in_store_pool
+        
+        store = await run_in_store_pool(get_store)
+        try:
+            matches = await run_in_store_pool(store.fts_search, request.query, limit=request.k,
+                                              prefix=request.prefix)
+        except RuntimeError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        
+        return {
+            "success": True,
+            "query": request.query,
+            "matches": matches
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error searching documents: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/documents")
-async def list_documents(skip: int = 0, limit: int = 50):
-    """List all documents in the knowledge base."""
+async def list_documents(limit: int = 50, cursor: Optional[str] = None, fields: str = "id,preview",
+                         sort: str = "created_at", order: str = "desc", search: Optional[str] = None,
+                         source: Optional[str] = None):
+    """List documents a page at a time.
+
+    Pass `next_cursor` from a response as `cursor` to get the following page.
+    `fields` is a comma-separated projection (id, preview, text, source,
+    filename, created_at, metadata, parent_id); `sort` is created_at, filename
+    or source.
+    """
     try:
         from tools.rag import get_store
+        from tools.concurrency import run_in_store_pool
         
-        store = get_store()
-        docs = store.docs[skip:skip + limit]
+        store = await run_in_store_pool(get_store)
+        limit = max(1, min(limit, 500))
+        try:
+            docs, next_cursor = await run_in_store_pool(
+                store.list_documents, limit, cursor,
+                fields=tuple(f.strip() for f in fields.split(",") if f.strip()),
+                sort=sort, order=order, search=search, source=source
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         return {
             "success": True,
-            "total": len(store.docs),
-            "skip": skip,
+            "total": len(store),
             "limit": limit,
-            "documents": [{
-                "id": doc.id,
-                "text": doc.text,
-                "source": doc.source,
-                "filename": doc.filename,
-                "created_at": doc.created_at,
-                "preview": doc.text[:100] + "..." if len(doc.text) > 100 else doc.text
-            } for doc in docs]
+            "next_cursor": next_cursor,
+            "documents": docs
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error listing documents: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -183,11 +432,13 @@ async def delete_document(doc_id: str):
     """Delete a document from the knowledge base."""
     try:
         from tools.rag import get_store
+        from tools.concurrency import run_in_store_pool
         
-        store = get_store()
+        store = await run_in_store_pool(get_store)
         
-        # Use the delete method which handles DB updates
-        deleted = store.delete(doc_id)
+        # Use the delete method which handles DB updates; file ids delete all their chunks
+        deleted = (await run_in_store_pool(store.delete, doc_id)
+                   or await run_in_store_pool(store.delete_file, doc_id) is not None)
         
         if not deleted:
             raise HTTPException(status_code=404, detail="Document not found")
@@ -195,7 +446,7 @@ async def delete_document(doc_id: str):
         return {
             "success": True,
             "id": doc_id,
-            "total_documents": len(store.docs)
+            "total_documents": len(store)
         }
     except HTTPException:
         raise
@@ -209,12 +460,13 @@ async def clear_knowledge_base():
     """Clear all documents from the knowledge base."""
     try:
         from tools.rag import get_store
+        from tools.concurrency import run_in_store_pool
         
-        store = get_store()
-        count = len(store.docs)
+        store = await run_in_store_pool(get_store)
+        count = len(store)
         
         # Use the clear method which handles DB updates
-        store.clear()
+        await run_in_store_pool(store.clear)
         
         return {
             "success": True,
@@ -0,0 +1,51 @@
+"""
+Recall@k / latency report for the knowledge base IVF index against exact search.
+
+Builds a synthetic knowledge base in a temporary directory and prints, for a
+range of nprobe values, how many of the exact top-k results the approximate
+search finds and how long each search takes.
+
+Usage: python scripts/ann_recall_report.py [num_docs] [k]
+"""
+import os
+import sys
+import tempfile
+
+# Add parent directory to path so we can import from tools
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from tools.rag import TinyStore
+
+
+def synthetic_texts(count: int, rng: np.random.Generator, vocab_size: int = 20000):
+    """Random short notes drawn from a Zipf-distributed vocabulary."""
+    vocab = [f"term{i}" for i in range(vocab_size)]
+    for _ in range(count):
+        length = int(rng.integers(8, 40))
+        words = np.minimum(rng.zipf(1.3, size=length), vocab_size) - 1
+        yield " ".join(vocab[w] for w in words)
+
+
+def main():
+    num_docs = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    rng = np.random.default_rng(42)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TinyStore(os.path.join(tmp, "knowledge_base.db"))
+        print(f"📥 Adding {num_docs} synthetic documents...")
+        for i, text in enumerate(synthetic_texts(num_docs, rng)):
+            store.add(f"doc-{i}", text, store.embedder.embed(text))
+
+        queries = [store.embedder.embed(t) for t in synthetic_texts(200, rng)]
+        print(f"\n{'nprobe':>8} {'recall@' + str(k):>10} {'exact ms':>10} {'ann ms':>10}")
+        for nprobe in (1, 2, 4, 8, 16, 32, 64):
+            report = store.ann_recall(queries, k=k, nprobe=nprobe)
+            print(f"{report['nprobe']:>8} {report['recall_at_k']:>10.3f} "
+                  f"{report['exact_ms']:>10.2f} {report['ann_ms']:>10.2f}")
+        print(f"\n🧭 {report['documents']} documents in {report['nlist']} IVF lists")
+
+
+if __name__ == '__main__':
+    main()
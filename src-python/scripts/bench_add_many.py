@@ -0,0 +1,46 @@
+"""
+Benchmark knowledge base ingestion: per-row TinyStore.add vs batched add_many.
+
+Each path writes the same synthetic notes into a fresh database in a temporary
+directory and reports documents per second.
+
+Usage: python scripts/bench_add_many.py [num_docs] [batch_size]
+"""
+import os
+import sys
+import tempfile
+import time
+
+# Add parent directory to path so we can import from tools
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.rag import TinyStore
+
+
+def main():
+    num_docs = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    texts = [f"Note {i}: remember to follow up on item {i % 97} with team {i % 13}" for i in range(num_docs)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TinyStore(os.path.join(tmp, "per_row.db"))
+        start = time.perf_counter()
+        for i, text in enumerate(texts):
+            store.add(f"doc-{i}", text, store.embedder.embed(text))
+        per_row = num_docs / (time.perf_counter() - start)
+
+        store = TinyStore(os.path.join(tmp, "batched.db"))
+        start = time.perf_counter()
+        for offset in range(0, num_docs, batch_size):
+            store.add_many([{"id": f"doc-{i}", "text": texts[i]}
+                            for i in range(offset, min(offset + batch_size, num_docs))])
+        batched = num_docs / (time.perf_counter() - start)
+
+    print(f"📥 {num_docs} documents")
+    print(f"   per-row add:          {per_row:>10.0f} docs/sec")
+    print(f"   add_many (batch {batch_size}): {batched:>10.0f} docs/sec")
+    print(f"   speedup:              {batched / per_row:>10.1f}x")
+
+
+if __name__ == '__main__':
+    main()
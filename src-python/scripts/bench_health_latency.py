@@ -0,0 +1,100 @@
+"""
+Benchmark event-loop responsiveness under knowledge-base query load.
+
+Serves the health and RAG routers in-process (httpx ASGI transport, one event
+loop, like uvicorn) and keeps `concurrency` clients hammering /api/rag/query
+while a probe hits /health every few milliseconds. Runs twice: once with store
+calls made inline on the event loop (the old behaviour) and once on the store
+thread pool, and reports /health latency percentiles and query throughput.
+
+Usage: python scripts/bench_health_latency.py [num_docs] [concurrency] [seconds]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Add parent directory to path so we can import from tools and routes
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import FastAPI
+
+import tools.concurrency
+from routes import health, rag
+from tools.rag import TinyStore, set_store
+
+PROBE_INTERVAL = 0.005
+
+
+async def run_inline(func, *args, **kwargs):
+    """Old behaviour: call the store directly on the event loop."""
+    return func(*args, **kwargs)
+
+
+async def measure(app: FastAPI, concurrency: int, seconds: float, queries):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        deadline = time.perf_counter() + seconds
+        completed = 0
+
+        async def load(worker: int):
+            nonlocal completed
+            i = worker
+            while time.perf_counter() < deadline:
+                r = await client.post("/api/rag/query", json={"query": queries[i % len(queries)], "k": 10})
+                r.raise_for_status()
+                completed += 1
+                i += concurrency
+
+        async def probe():
+            latencies = []
+            while time.perf_counter() < deadline:
+                # Measure from when the probe meant to fire, so time spent
+                # waiting for a blocked event loop counts as latency
+                due = time.perf_counter() + PROBE_INTERVAL
+                await asyncio.sleep(PROBE_INTERVAL)
+                (await client.get("/health")).raise_for_status()
+                latencies.append((time.perf_counter() - due) * 1000)
+            return latencies
+
+        results = await asyncio.gather(probe(), *[load(w) for w in range(concurrency)])
+        return np.array(results[0]), completed / seconds
+
+
+def main():
+    num_docs = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 5.0
+
+    app = FastAPI()
+    app.include_router(health.router)
+    app.include_router(rag.router)
+
+    queries = [f"follow up on item {i} with team {i % 13}" for i in range(200)]
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TinyStore(os.path.join(tmp, "bench.db"))
+        store.add_many([{"id": f"doc-{i}", "text": f"Note {i}: remember to follow up on item {i % 97} "
+                                                    f"with team {i % 13} about topic {i % 1009}"}
+                        for i in range(num_docs)])
+        set_store(store)
+
+        pooled_runner = tools.concurrency.run_in_store_pool
+        print(f"🩺 /health latency with {concurrency} concurrent /query clients over {num_docs} documents "
+              f"({tools.concurrency.STORE_THREADS} store threads)")
+        for label, runner in (("inline", run_inline), ("store pool", pooled_runner)):
+            tools.concurrency.run_in_store_pool = runner
+            latencies, qps = asyncio.run(measure(app, concurrency, seconds, queries))
+            p50, p99 = np.percentile(latencies, [50, 99])
+            print(f"   {label:<11} p50 {p50:>8.2f} ms   p99 {p99:>8.2f} ms   "
+                  f"max {latencies.max():>8.2f} ms   {qps:>7.0f} queries/sec")
+        tools.concurrency.run_in_store_pool = pooled_runner
+        tools.concurrency.shutdown_store_pool()
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
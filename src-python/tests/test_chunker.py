@@ -0,0 +1,27 @@
+"""
+Chunk packing and overlap in tools/chunker.py.
+
+Run from src-python: python -m pytest tests/test_chunker.py
+"""
+from tools.chunker import chunk_text
+
+TEXT = "First one. Second one. Third! Fourth? " + "x" * 55 + "."
+
+
+def test_overlap_never_yields_a_tail_only_chunk():
+    chunks = chunk_text(TEXT, chunk_size=60, overlap=25)
+    assert [c.text for c in chunks] == ["First one. Second one. Third! Fourth?", "x" * 55 + "."]
+
+
+def test_overlap_keeps_the_tail_that_fits_with_the_next_unit():
+    chunks = chunk_text("Alpha beta. Gamma delta. Epsilon zeta. Eta theta.", chunk_size=30, overlap=14)
+    assert [c.text for c in chunks] == [
+        "Alpha beta. Gamma delta.",
+        "Gamma delta. Epsilon zeta.",
+        "Epsilon zeta. Eta theta.",
+    ]
+
+
+def test_offsets_point_into_the_text():
+    for chunk in chunk_text(TEXT, chunk_size=60, overlap=25, base_offset=0):
+        assert TEXT[chunk.start:chunk.end] == chunk.text
@@ -0,0 +1,84 @@
+"""
+Argument extraction for the local intent router (tools/intent.py).
+
+Run from src-python: python -m pytest tests/test_intent.py
+"""
+import pytest
+
+from tools.intent import (_SEED_EXAMPLES, IntentModel, IntentRouter, _calendar_args, _rag_add_args,
+                          _rag_query_args)
+
+
+@pytest.fixture(scope="module")
+def router():
+    # Trained in memory; get_intent_router() would save the model to the data dir
+    return IntentRouter(IntentModel.train(_SEED_EXAMPLES))
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("remember this: the meeting is at 10:30", "the meeting is at 10:30"),
+    ("Remember this for later: Project deadline is Dec 15", "Project deadline is Dec 15"),
+    ("please remember the following: wifi password is hunter2", "wifi password is hunter2"),
+    ("remember that the meeting is at 10:30", "the meeting is at 10:30"),
+    ("remember that my locker code is 4412.", "my locker code is 4412"),
+])
+def test_rag_add_text(message, expected):
+    assert _rag_add_args(message, None)["text"] == expected
+
+
+@pytest.mark.parametrize("message", [
+    "my flight is at 7:45 tomorrow",
+    "remember that bug we fixed last week? what was the cause",
+    "save this file as pdf",
+    "remember this",
+])
+def test_rag_add_not_a_note(message):
+    assert _rag_add_args(message, None) is None
+
+
+def test_rag_add_selected_text():
+    assert _rag_add_args("save this", "Brunch Sunday 9:30") == {
+        "text": "Brunch Sunday 9:30", "source": "selection"
+    }
+    # A colon elsewhere in the message doesn't replace the selection
+    assert _rag_add_args("remember this", "Standup at 9:30")["text"] == "Standup at 9:30"
+
+
+def test_calendar_args():
+    assert _calendar_args("add lunch with sam 2025-11-03T12:00 to my calendar", None) == {
+        "title": "lunch with sam", "start_iso": "2025-11-03T12:00"
+    }
+    assert _calendar_args("schedule dentist 2025-11-05T15:00 to 2025-11-05T16:00", None) == {
+        "title": "dentist", "start_iso": "2025-11-05T15:00", "end_iso": "2025-11-05T16:00"
+    }
+
+
+@pytest.mark.parametrize("message", [
+    "summarize this and add it to my calendar at 2025-11-03T10:00",
+    "schedule the email to be sent 2025-11-03T10:00",
+    "add standup 2025-11-04T09:30 to my calendar and then email the team",
+    "can you add the review 2025-11-06T10:00 to my calendar",
+])
+def test_calendar_compound_requests_go_to_the_agent(router, message):
+    assert _calendar_args(message, None) is None
+    assert router.classify(message) is None
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("check my notes for the flight number", "the flight number"),
+    ("what did I save about the project deadline?", "the project deadline"),
+    ("search my knowledge base for onboarding", "onboarding"),
+])
+def test_rag_query_topic(message, expected):
+    assert _rag_query_args(message, None) == {"query": expected}
+
+
+@pytest.mark.parametrize("message", [
+    "check my notes for the flight number and email it to bob",
+    "check my notes for typos in this paragraph",
+    "what did I write down yesterday",
+    "search my notes for the budget then summarize it",
+])
+def test_rag_query_needs_the_agent(router, message):
+    assert _rag_query_args(message, None) is None
+    assert router.classify(message) is None
@@ -0,0 +1,91 @@
+"""
+TinyStore write path (tools/rag.py): duplicate collapsing, file deletion and
+keyset pagination, each on a scratch database.
+
+Run from src-python: python -m pytest tests/test_store.py
+"""
+import pytest
+
+from tools.chunker import chunk_text
+from tools.rag import TinyStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = TinyStore(db_path=str(tmp_path / "knowledge_base.db"), near_duplicates=False)
+    yield store
+    store.close()
+
+
+def test_duplicate_add_returns_the_existing_id(store):
+    assert store.add("a", "The meeting is at 10:30") == "a"
+    # Same text after case and whitespace normalization: nothing is written
+    assert store.add("b", "  the MEETING is at   10:30 ") == "a"
+    assert len(store) == 1
+    assert store.find_duplicate("the meeting is at 10:30") == "a"
+
+
+def test_add_many_maps_duplicates_to_the_stored_id(store):
+    store.add("a", "Dentist on Friday")
+    ids = store.add_many([
+        {"id": "b", "text": "dentist on friday"},
+        {"id": "c", "text": "Rent is due on the 1st"},
+        {"id": "d", "text": "Rent is due on the 1st"},
+    ])
+    assert ids == ["a", "c", "c"]
+    assert len(store) == 2
+
+
+def test_delete_file_removes_its_chunks(store):
+    chunks = chunk_text("Alpha beta. Gamma delta. Epsilon zeta. Eta theta.", chunk_size=30, overlap=0)
+    result = store.add_file("notes.txt", chunks, file_id="f1")
+    store.add("solo", "A standalone note")
+    assert result["chunk_count"] == len(chunks) == len(store) - 1
+
+    assert store.delete_file("f1") == len(chunks)
+    assert store.get_file("f1") is None
+    assert len(store) == 1
+    docs, _ = store.list_documents(limit=10, fields=("id",))
+    assert docs == [{"id": "solo"}]
+    assert store.delete_file("f1") is None
+
+
+def test_deleting_chunks_updates_the_file(store):
+    chunks = chunk_text("Alpha beta. Gamma delta. Epsilon zeta. Eta theta.", chunk_size=30, overlap=0)
+    store.add_file("notes.txt", chunks, file_id="f1")
+    chunk_ids = [row[0] for row in store.connection().execute(
+        "SELECT id FROM documents WHERE parent_id = 'f1'")]
+
+    assert store.delete(chunk_ids[0])
+    assert store.get_file("f1")["chunk_count"] == len(chunks) - 1
+    for chunk_id in chunk_ids[1:]:
+        store.delete(chunk_id)
+    assert store.get_file("f1") is None
+    assert not store.delete(chunk_ids[0])
+
+
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_keyset_pages_have_no_gaps_or_repeats(store, order):
+    # One batch shares a created_at, so pages must break ties by id
+    store.add_many([{"id": f"doc-{i:02d}", "text": f"note number {i}"} for i in range(23)])
+    store.add("late", "added after the batch")
+
+    seen, cursor = [], None
+    while True:
+        docs, cursor = store.list_documents(limit=5, cursor=cursor, fields=("id",), order=order)
+        seen += [doc["id"] for doc in docs]
+        if cursor is None:
+            break
+    assert len(seen) == len(set(seen)) == len(store)
+    assert (seen[0] == "late") == (order == "desc")
+
+
+@pytest.mark.parametrize("fts", [True, False])
+def test_list_search_matches_text_or_filename(store, fts):
+    # Without FTS5 the search falls back to LIKE
+    store.fts_available = store.fts_available and fts
+    store.add("a", "Quarterly budget review", filename="finance.md")
+    store.add("b", "Team offsite agenda", filename="budget-2025.md")
+    store.add("c", "Lunch menu")
+    docs, _ = store.list_documents(limit=10, fields=("id",), search="budget", order="asc")
+    assert sorted(doc["id"] for doc in docs) == ["a", "b"]
@@ -0,0 +1,235 @@
+"""
+Inverted-file (IVF) approximate nearest-neighbour index for the knowledge base.
+
+Pure NumPy: vectors are bucketed by their nearest k-means centroid, and a query
+only scores the matrix rows in its `nprobe` closest buckets. The index is
+maintained incrementally by TinyStore (keyed by matrix row, so it follows the
+store's swap-remove) and persisted by document id as a sidecar `.npz` file next
+to knowledge_base.db so startup never has to re-run k-means.
+"""
+from typing import Callable, Dict, List, Optional
+from pathlib import Path
+import numpy as np
+import logging
+import os
+
+logger = logging.getLogger("pointer.tools.ann_index")
+
+
+class IVFIndex:
+    # Below this many documents an exact scan is already fast; don't train
+    MIN_TRAIN_SIZE = 2048
+    # Retrain once the collection has grown this much since the last training
+    RETRAIN_GROWTH = 4
+    # Persist after this many incremental updates
+    SAVE_EVERY = 256
+    KMEANS_ITERATIONS = 10
+    KMEANS_SAMPLE_PER_LIST = 64
+
+    def __init__(self, dim: int, id_of_row: Callable[[int], str], path: Optional[str] = None,
+                 signature: str = "", nprobe: int = 8):
+        self.dim = dim
+        self.path = path
+        self.signature = signature
+        self.nprobe = nprobe
+        self._id_of_row = id_of_row
+        self.centroids: Optional[np.ndarray] = None
+        self.trained_size = 0
+        self._reset_lists(0, 0)
+
+    def _reset_lists(self, nlist: int, capacity: int):
+        # Posting lists are growable row arrays; _row_list/_row_pos locate a row in them
+        self._lists: List[np.ndarray] = [np.empty(16, dtype=np.int64) for _ in range(nlist)]
+        self._sizes = np.zeros(nlist, dtype=np.int64)
+        self._row_list = np.full(max(capacity, 16), -1, dtype=np.int64)
+        self._row_pos = np.zeros(max(capacity, 16), dtype=np.int64)
+        self._dirty = 0
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    @property
+    def nlist(self) -> int:
+        return 0 if self.centroids is None else self.centroids.shape[0]
+
+    def needs_training(self, n: int) -> bool:
+        if n < self.MIN_TRAIN_SIZE:
+            return False
+        return not self.trained or n >= self.trained_size * self.RETRAIN_GROWTH
+
+    def train(self, matrix: np.ndarray):
+        """Run spherical k-means over the store matrix and assign every row."""
+        n = len(matrix)
+        nlist = max(8, int(np.sqrt(n)))
+        rng = np.random.default_rng(0)
+        sample_size = min(n, nlist * self.KMEANS_SAMPLE_PER_LIST)
+        sample = matrix[rng.choice(n, size=sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, size=nlist, replace=False)].copy()
+
+        for _ in range(self.KMEANS_ITERATIONS):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            empty = norms[:, 0] == 0
+            # Re-seed empty clusters from random sample points
+            sums[empty] = sample[rng.choice(sample_size, size=int(empty.sum()))]
+            norms[empty] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+
+        self.centroids = centroids
+        self.trained_size = n
+        self._reset_lists(nlist, n)
+        self._insert(np.arange(n), self._assign(matrix))
+        logger.info(f"🧭 Trained IVF index: {n} vectors in {nlist} lists")
+        self.save(n)
+
+    def _assign(self, vecs: np.ndarray) -> np.ndarray:
+        """Nearest-centroid list number for each row of `vecs`."""
+        assign = np.empty(len(vecs), dtype=np.int64)
+        # Chunk to bound the size of the (rows x nlist) score matrix
+        for start in range(0, len(vecs), 8192):
+            block = vecs[start:start + 8192]
+            assign[start:start + len(block)] = np.argmax(block @ self.centroids.T, axis=1)
+        return assign
+
+    def _insert(self, rows: np.ndarray, assign: np.ndarray):
+        top = int(rows.max()) + 1 if len(rows) else 0
+        if top > len(self._row_list):
+            size = max(top, len(self._row_list) * 2)
+            self._row_list = np.concatenate([self._row_list, np.full(size - len(self._row_list), -1, dtype=np.int64)])
+            self._row_pos = np.concatenate([self._row_pos, np.zeros(size - len(self._row_pos), dtype=np.int64)])
+        for list_no in np.unique(assign).tolist():
+            new_rows = rows[assign == list_no]
+            size = int(self._sizes[list_no])
+            needed = size + len(new_rows)
+            if needed > len(self._lists[list_no]):
+                grown = np.empty(max(needed, len(self._lists[list_no]) * 2), dtype=np.int64)
+                grown[:size] = self._lists[list_no][:size]
+                self._lists[list_no] = grown
+            self._lists[list_no][size:needed] = new_rows
+            self._sizes[list_no] = needed
+            self._row_list[new_rows] = list_no
+            self._row_pos[new_rows] = np.arange(size, needed)
+
+    def add(self, row: int, vec: np.ndarray, n: int):
+        """Assign matrix row `row` (re-assigning it if already indexed)."""
+        if not self.trained:
+            return
+        self.remove(row, n)
+        list_no = int(np.argmax(self.centroids @ vec))
+        self._insert(np.array([row]), np.array([list_no]))
+        self._touch(n)
+
+    def add_many(self, rows: np.ndarray, vecs: np.ndarray, n: int):
+        """Assign a block of new (not yet indexed) matrix rows at once."""
+        if not self.trained or not len(rows):
+            return
+        self._insert(rows, self._assign(vecs))
+        self._dirty += len(rows)
+        if self._dirty >= self.SAVE_EVERY:
+            self.save(n)
+
+    def remove(self, row: int, n: int):
+        if row >= len(self._row_list) or self._row_list[row] < 0:
+            return
+        list_no, pos = int(self._row_list[row]), int(self._row_pos[row])
+        last = int(self._sizes[list_no]) - 1
+        moved = int(self._lists[list_no][last])
+        self._lists[list_no][pos] = moved
+        self._row_pos[moved] = pos
+        self._sizes[list_no] = last
+        self._row_list[row] = -1
+        self._touch(n)
+
+    def move(self, src: int, dst: int):
+        """Follow the store moving matrix row `src` into the (removed) slot `dst`."""
+        if src >= len(self._row_list) or self._row_list[src] < 0:
+            return
+        list_no, pos = int(self._row_list[src]), int(self._row_pos[src])
+        self._lists[list_no][pos] = dst
+        self._row_list[dst], self._row_pos[dst] = list_no, pos
+        self._row_list[src] = -1
+
+    def clear(self):
+        self.centroids = None
+        self.trained_size = 0
+        self._reset_lists(0, 0)
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def candidates(self, qvec: np.ndarray, nprobe: Optional[int] = None) -> np.ndarray:
+        """Matrix rows stored in the `nprobe` lists whose centroids are closest to `qvec`."""
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        scores = self.centroids @ qvec
+        probe = np.argpartition(-scores, nprobe - 1)[:nprobe]
+        return np.concatenate([self._lists[l][:self._sizes[l]] for l in probe.tolist()])
+
+    def sync(self, matrix: np.ndarray):
+        """Assign store rows that the loaded index doesn't know about yet."""
+        if not self.trained:
+            return
+        n = len(matrix)
+        known = np.zeros(n, dtype=bool)
+        top = min(n, len(self._row_list))
+        known[:top] = self._row_list[:top] >= 0
+        missing = np.flatnonzero(~known)
+        if len(missing):
+            self._insert(missing, self._assign(matrix[missing]))
+            self._dirty += len(missing)
+        if self._dirty:
+            self.save(n)
+
+    def _touch(self, n: int):
+        self._dirty += 1
+        if self._dirty >= self.SAVE_EVERY:
+            self.save(n)
+
+    def save(self, n: int):
+        """Atomically write centroids and per-document list assignments to the sidecar file."""
+        if not self.path or not self.trained:
+            return
+        rows = np.flatnonzero(self._row_list[:n] >= 0)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                signature=np.array(self.signature),
+                centroids=self.centroids,
+                trained_size=np.array(self.trained_size),
+                ids=np.array([self._id_of_row(r) for r in rows.tolist()], dtype=str),
+                lists=self._row_list[rows],
+            )
+        os.replace(tmp_path, self.path)
+        self._dirty = 0
+
+    def load(self, row_of: Dict[str, int]) -> bool:
+        """Load the sidecar file, mapping saved ids onto current rows via `row_of`.
+
+        Returns False if the file is missing, stale or unreadable. Ids that no
+        longer exist are dropped; call sync() afterwards to index new rows.
+        """
+        if not self.path or not Path(self.path).exists():
+            return False
+        try:
+            with np.load(self.path) as data:
+                if str(data["signature"]) != self.signature or data["centroids"].shape[1] != self.dim:
+                    logger.info("🧭 IVF index was built for a different embedder, ignoring it")
+                    return False
+                centroids = data["centroids"].astype(np.float32)
+                pairs = [(row_of[doc_id], list_no)
+                         for doc_id, list_no in zip(data["ids"].tolist(), data["lists"].tolist())
+                         if doc_id in row_of]
+                self.centroids = centroids
+                self.trained_size = int(data["trained_size"])
+            self._reset_lists(centroids.shape[0], len(row_of))
+            if pairs:
+                rows, assign = (np.array(col, dtype=np.int64) for col in zip(*pairs))
+                self._insert(rows, assign)
+            logger.info(f"🧭 Loaded IVF index: {len(pairs)} vectors in {self.nlist} lists")
+            return True
+        except Exception as e:
+            logger.error(f"❌ Error loading IVF index: {e}")
+            self.centroids = None
+            return False
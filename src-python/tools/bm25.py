@@ -0,0 +1,80 @@
+"""
+In-memory BM25 inverted index over knowledge-base documents.
+
+Each term maps to a posting list of {doc_id: term frequency}; a query only
+walks the posting lists of its own terms, so its cost scales with the number
+of query terms and their document frequency rather than with the corpus size.
+"""
+from typing import Dict, List, Tuple
+import heapq
+import math
+
+from tools.embeddings import tokenize
+
+
+class BM25Index:
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._doc_len: Dict[str, int] = {}
+        self._total_len = 0
+
+    def __len__(self) -> int:
+        return len(self._doc_len)
+
+    def add(self, doc_id: str, text: str):
+        """Index `text` under `doc_id` (replacing any previous version)."""
+        self.remove(doc_id)
+        counts: Dict[str, int] = {}
+        tokens = tokenize(text)
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for term, tf in counts.items():
+            self._postings.setdefault(term, {})[doc_id] = tf
+        self._doc_len[doc_id] = len(tokens)
+        self._total_len += len(tokens)
+
+    def remove(self, doc_id: str, text: str = None):
+        """Remove a document; pass its `text` to only visit its own posting lists."""
+        length = self._doc_len.pop(doc_id, None)
+        if length is None:
+            return
+        self._total_len -= length
+        terms = set(tokenize(text)) if text is not None else list(self._postings)
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings and postings.pop(doc_id, None) is not None and not postings:
+                del self._postings[term]
+
+    def clear(self):
+        self._postings = {}
+        self._doc_len = {}
+        self._total_len = 0
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[str, float]]:
+        """Top-k (doc_id, BM25 score) pairs, best first."""
+        n = len(self._doc_len)
+        if not n or k <= 0:
+            return []
+        avg_len = self._total_len / n or 1.0
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            df = len(postings)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for doc_id, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self._doc_len[doc_id] / avg_len)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int, rrf_k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists with RRF: score(d) = sum over rankings of 1 / (rrf_k + rank)."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+    return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
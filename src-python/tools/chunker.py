@@ -0,0 +1,99 @@
+"""
+Split documents into overlapping chunks for the knowledge base.
+
+Chunks are packed from whole paragraphs and sentences up to `chunk_size`
+characters; only a single sentence longer than that is hard-split on
+whitespace. Consecutive chunks share up to `overlap` characters of trailing
+sentences so context isn't lost at chunk boundaries.
+"""
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+import os
+import re
+
+DEFAULT_CHUNK_SIZE = int(os.environ.get("POINTER_CHUNK_SIZE", 1200))
+DEFAULT_CHUNK_OVERLAP = int(os.environ.get("POINTER_CHUNK_OVERLAP", 200))
+
+# Paragraph breaks, or whitespace following sentence-ending punctuation
+_BOUNDARY_RE = re.compile(r"\n\s*\n|(?<=[.!?])\s+")
+
+
+@dataclass
+class Chunk:
+    text: str
+    start: int  # character offsets into the whole extracted document
+    end: int
+    page: Optional[int] = None
+
+
+def _units(text: str, max_len: int) -> List[Tuple[int, int]]:
+    """(start, end) spans of sentences/paragraphs, hard-splitting any longer than max_len."""
+    spans = []
+    prev = 0
+    for m in _BOUNDARY_RE.finditer(text):
+        spans.append((prev, m.end()))
+        prev = m.end()
+    if prev < len(text):
+        spans.append((prev, len(text)))
+
+    units = []
+    for start, end in spans:
+        while end - start > max_len:
+            cut = text.rfind(" ", start + 1, start + max_len)
+            cut = cut + 1 if cut > start else start + max_len
+            units.append((start, cut))
+            start = cut
+        units.append((start, end))
+    return units
+
+
+def chunk_text(text: str, chunk_size: int = DEFAULT_CHUNK_SIZE, overlap: int = DEFAULT_CHUNK_OVERLAP,
+               page: Optional[int] = None, base_offset: int = 0) -> List[Chunk]:
+    """Chunk `text`; offsets are shifted by `base_offset` (its position in the whole document)."""
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+    overlap = max(0, min(overlap, chunk_size // 2))
+    units = _units(text, chunk_size)
+    chunks: List[Chunk] = []
+    i = 0
+    while i < len(units):
+        start = units[i][0]
+        j = i
+        while j < len(units) and (j == i or units[j][1] - start <= chunk_size):
+            j += 1
+        end = units[j - 1][1]
+
+        raw = text[start:end]
+        stripped = raw.strip()
+        if stripped:
+            lead = len(raw) - len(raw.lstrip())
+            chunks.append(Chunk(
+                text=stripped,
+                start=base_offset + start + lead,
+                end=base_offset + start + lead + len(stripped),
+                page=page
+            ))
+        if j >= len(units):
+            break
+
+        # Step back over trailing units that fit in the overlap, always making progress
+        k = j
+        while k - 1 > i and end - units[k - 1][0] <= overlap:
+            k -= 1
+        # ...but only as far as the next unit still fits after them; otherwise the
+        # next chunk would be nothing but the overlap tail
+        while k < j and units[j][1] - units[k][0] > chunk_size:
+            k += 1
+        i = k
+    return chunks
+
+
+def chunk_pages(pages: List[str], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                overlap: int = DEFAULT_CHUNK_OVERLAP, separator: str = "\n\n") -> List[Chunk]:
+    """Chunk each page separately (1-based page numbers) with offsets into the joined text."""
+    chunks: List[Chunk] = []
+    offset = 0
+    for page_no, page_text in enumerate(pages, start=1):
+        chunks.extend(chunk_text(page_text or "", chunk_size, overlap, page=page_no, base_offset=offset))
+        offset += len(page_text or "") + len(separator)
+    return chunks
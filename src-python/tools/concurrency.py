@@ -0,0 +1,109 @@
+"""
+Concurrency helpers for the knowledge base.
+
+TinyStore methods are synchronous (SQLite I/O, NumPy scans), so async callers
+run them on a small dedicated thread pool instead of the event loop; inside the
+store a reader/writer lock lets queries run side by side while writes are
+exclusive.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Optional
+import asyncio
+import functools
+import os
+import threading
+
+# Threads serving knowledge-base calls; NumPy and SQLite release the GIL, so
+# concurrent queries really do overlap
+STORE_THREADS = int(os.environ.get("POINTER_STORE_THREADS", min(8, (os.cpu_count() or 2) + 2)))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+class ReadWriteLock:
+    """Many concurrent readers or one writer.
+
+    Writers are preferred: once a writer is waiting, new readers queue behind
+    it so a steady stream of queries can't starve an add. The writing thread
+    may re-enter write() and read(); readers must not nest read() calls, as a
+    queued writer would deadlock them.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer: Optional[int] = None
+        self._write_depth = 0
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                # The writer already excludes everyone else
+                self._write_depth += 1
+                owned = True
+            else:
+                while self._writer is not None or self._writers_waiting:
+                    self._cond.wait()
+                self._readers += 1
+                owned = False
+        try:
+            yield
+        finally:
+            with self._cond:
+                if owned:
+                    self._write_depth -= 1
+                else:
+                    self._readers -= 1
+                    if not self._readers:
+                        self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer != me:
+                self._writers_waiting += 1
+                try:
+                    while self._writer is not None or self._readers:
+                        self._cond.wait()
+                finally:
+                    self._writers_waiting -= 1
+                self._writer = me
+            self._write_depth += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._write_depth -= 1
+                if not self._write_depth:
+                    self._writer = None
+                    self._cond.notify_all()
+
+
+def get_store_executor() -> ThreadPoolExecutor:
+    """The bounded thread pool that runs blocking knowledge-base work."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=STORE_THREADS, thread_name_prefix="pointer-store")
+        return _executor
+
+
+async def run_in_store_pool(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a blocking store call on the store thread pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_store_executor(), functools.partial(func, *args, **kwargs))
+
+
+def shutdown_store_pool():
+    """Wait for in-flight store calls and stop the pool (on app shutdown)."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
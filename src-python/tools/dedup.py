@@ -0,0 +1,65 @@
+"""
+Duplicate detection for knowledge-base documents.
+
+content_hash() identifies exact duplicates after normalizing Unicode form,
+case and whitespace. simhash() gives a 64-bit locality-sensitive signature
+over word unigrams and bigrams: lightly edited copies of a text differ in
+only a few bits, so near duplicates are found by Hamming distance.
+"""
+from collections import Counter
+from typing import Optional
+import hashlib
+import os
+import unicodedata
+
+import numpy as np
+
+from tools.embeddings import tokenize
+
+# Signatures this many bits apart (or fewer) count as near duplicates
+SIMHASH_DISTANCE = int(os.environ.get("POINTER_SIMHASH_DISTANCE", 3))
+
+_BIT_WEIGHTS = np.uint64(1) << np.arange(64, dtype=np.uint64)
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def normalize_text(text: str) -> str:
+    """NFKC-normalized, case-folded text with runs of whitespace collapsed."""
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+def content_hash(text: str) -> str:
+    """SHA-256 hex digest of the normalized text."""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash of the text's word unigrams and bigrams (0 for empty text)."""
+    tokens = tokenize(text)
+    features = Counter(tokens)
+    features.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    if not features:
+        return 0
+    hashes = np.array([
+        int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+        for feature in features
+    ], dtype=np.uint64)
+    weights = np.array(list(features.values()), dtype=np.float64)
+    bits = (hashes[:, None] & _BIT_WEIGHTS) != 0
+    votes = weights @ np.where(bits, 1.0, -1.0)
+    return int(_BIT_WEIGHTS[votes > 0].sum(dtype=np.uint64))
+
+
+def to_signed(value: int) -> int:
+    """Map an unsigned 64-bit signature into SQLite's signed INTEGER range."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def from_signed(value: Optional[int]) -> int:
+    return 0 if value is None else value & 0xFFFFFFFFFFFFFFFF
+
+
+def hamming_distances(signatures: np.ndarray, signature: int) -> np.ndarray:
+    """Bit distance from `signature` to each uint64 in `signatures`."""
+    diff = np.ascontiguousarray(signatures ^ np.uint64(signature))
+    return _POPCOUNT[diff.view(np.uint8)].reshape(-1, 8).sum(axis=1)
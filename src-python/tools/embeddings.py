@@ -0,0 +1,101 @@
+"""
+Text embedders for the knowledge base.
+
+Every embedder produces fixed-width, L2-normalized float32 vectors so that any
+stored vector can be compared with any query vector with a plain dot product.
+"""
+from typing import List, Optional
+import numpy as np
+import os
+import re
+import zlib
+import logging
+
+logger = logging.getLogger("pointer.tools.embeddings")
+
+DEFAULT_EMBED_DIM = 512
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens shared by the embedders and keyword indexes."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+def normalize(vec: np.ndarray) -> np.ndarray:
+    """Return `vec` as a float32 unit vector (zero vectors are left as-is)."""
+    vec = np.asarray(vec, dtype=np.float32)
+    norm = float(np.linalg.norm(vec))
+    if norm > 0:
+        vec = vec / norm
+    return vec.astype(np.float32, copy=False)
+
+
+class Embedder:
+    """Base class for pluggable embedders."""
+
+    name: str = "base"
+    dim: int = 0
+
+    @property
+    def signature(self) -> str:
+        """Identifies the vector space; stored vectors are re-embedded when it changes."""
+        return f"{self.name}:{self.dim}"
+
+    def embed(self, text: str) -> np.ndarray:
+        raise NotImplementedError
+
+    def embed_many(self, texts: List[str]) -> np.ndarray:
+        """Embed several texts into an (n, dim) float32 matrix."""
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            out[i] = self.embed(text)
+        return out
+
+
+class HashingEmbedder(Embedder):
+    """
+    Hashing-trick bag-of-words embedder.
+
+    Tokens are hashed with CRC32 (stable across processes, unlike `hash()`)
+    into `dim` buckets with a hash-derived sign, weighted by 1 + log(tf).
+    """
+
+    name = "hashing-v1"
+
+    def __init__(self, dim: int = DEFAULT_EMBED_DIM):
+        if dim <= 0:
+            raise ValueError("Embedding dimension must be positive")
+        self.dim = dim
+
+    def embed(self, text: str) -> np.ndarray:
+        counts = {}
+        for token in tokenize(text):
+            counts[token] = counts.get(token, 0) + 1
+
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for token, tf in counts.items():
+            h = zlib.crc32(token.encode("utf-8"))
+            sign = 1.0 if h & 0x80000000 else -1.0
+            vec[h % self.dim] += sign * (1.0 + np.log(tf))
+        return normalize(vec)
+
+
+_embedder: Optional[Embedder] = None
+
+
+def get_embedder() -> Embedder:
+    """Get the process-wide embedder (dimension from POINTER_EMBED_DIM)."""
+    global _embedder
+    if _embedder is None:
+        dim = int(os.environ.get("POINTER_EMBED_DIM", DEFAULT_EMBED_DIM))
+        _embedder = HashingEmbedder(dim=dim)
+        logger.info(f"Using embedder {_embedder.signature}")
+    return _embedder
+
+
+def set_embedder(embedder: Embedder):
+    """Replace the process-wide embedder (call before the store is created)."""
+    global _embedder
+    _embedder = embedder
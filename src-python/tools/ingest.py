@@ -0,0 +1,495 @@
+"""
+File ingestion for the knowledge base: spooled uploads, process-pooled PDF
+text extraction and a persistent background job queue.
+
+Jobs are stored in the `ingest_jobs` table of knowledge_base.db and processed
+by a few worker tasks on the event loop (extract -> chunk -> embed -> insert).
+Jobs interrupted by a crash are re-queued on the next start. Progress is
+pushed to every `/ws` client as `ingest-progress` messages.
+
+PDF pages are extracted in batches on a bounded process pool so large files
+never block the FastAPI event loop (and with it the `/ws` hotkey socket).
+Nothing in this module imports tools.rag at import time because the pool's
+worker processes import it too.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import uuid
+
+logger = logging.getLogger("pointer.tools.ingest")
+
+# Worker processes for PDF extraction
+MAX_EXTRACT_WORKERS = int(os.environ.get("POINTER_EXTRACT_WORKERS", min(4, os.cpu_count() or 1)))
+# Worker tasks processing queued jobs
+MAX_CONCURRENT_JOBS = int(os.environ.get("POINTER_INGEST_CONCURRENCY", 2))
+PAGES_PER_TASK = 8
+SPOOL_CHUNK_SIZE = 1024 * 1024
+# Finished jobs kept around for status queries
+MAX_FINISHED_JOBS = 200
+# File types picked up by folder imports
+IMPORT_EXTENSIONS = (".txt", ".md", ".pdf")
+
+# Will be set by main.py; used to push ingest-progress events over /ws
+connection_manager = None
+
+_pool: Optional[ProcessPoolExecutor] = None
+_queue: Optional[asyncio.Queue] = None
+_workers: List[asyncio.Task] = []
+_active: Dict[str, "IngestJob"] = {}
+# Ids on the queue or being run; the resume scan and _enqueue can both see a new job
+_pending: Set[str] = set()
+_table_ready = False
+
+
+@dataclass
+class IngestJob:
+    id: str
+    kind: str  # file, text
+    filename: Optional[str] = None
+    path: Optional[str] = None
+    owned: bool = True  # delete `path` once the job finishes
+    payload: Optional[str] = None  # text of `text` jobs
+    source: str = "file"
+    status: str = "queued"  # queued, extracting, indexing, done, failed
+    pages_total: int = 0
+    pages_done: int = 0
+    chunk_count: int = 0
+    result_id: Optional[str] = None  # file id (file jobs) or document id (text jobs)
+    error: Optional[str] = None
+    options: Dict[str, Any] = field(default_factory=dict)
+    created_at: str = ""
+    finished_at: Optional[str] = None
+
+    def __post_init__(self):
+        if not self.created_at:
+            self.created_at = datetime.utcnow().isoformat()
+
+    @property
+    def progress(self) -> float:
+        if self.status == "done":
+            return 1.0
+        if not self.pages_total:
+            return 0.0
+        # Extraction is most of the work; reserve the last 10% for indexing
+        return 0.9 * self.pages_done / self.pages_total
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        del data["path"], data["payload"]
+        data["progress"] = round(self.progress, 3)
+        return data
+
+
+_COLUMNS = ["id", "kind", "filename", "path", "owned", "payload", "source", "status",
+            "pages_total", "pages_done", "chunk_count", "result_id", "error", "options",
+            "created_at", "finished_at"]
+
+
+def _connect() -> sqlite3.Connection:
+    """The knowledge base's persistent connection for this thread (call on the store pool)"""
+    from tools.rag import get_store
+    conn = get_store().connection()
+    if not _table_ready:
+        _init_jobs_table(conn)
+    return conn
+
+
+def _init_jobs_table(conn: sqlite3.Connection):
+    global _table_ready
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            filename TEXT,
+            path TEXT,
+            owned INTEGER NOT NULL,
+            payload TEXT,
+            source TEXT NOT NULL,
+            status TEXT NOT NULL,
+            pages_total INTEGER NOT NULL,
+            pages_done INTEGER NOT NULL,
+            chunk_count INTEGER NOT NULL,
+            result_id TEXT,
+            error TEXT,
+            options TEXT,
+            created_at TEXT NOT NULL,
+            finished_at TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ingest_jobs_status ON ingest_jobs(status, created_at)")
+    conn.commit()
+    _table_ready = True
+
+
+def _row_to_job(row) -> IngestJob:
+    data = dict(zip(_COLUMNS, row))
+    data["owned"] = bool(data["owned"])
+    data["options"] = json.loads(data["options"]) if data["options"] else {}
+    return IngestJob(**data)
+
+
+def _save_job(job: IngestJob):
+    data = asdict(job)
+    data["owned"] = int(job.owned)
+    data["options"] = json.dumps(job.options)
+    conn = _connect()
+    conn.execute(
+        f"INSERT OR REPLACE INTO ingest_jobs ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+        [data[c] for c in _COLUMNS]
+    )
+    conn.commit()
+
+
+async def _publish(job: IngestJob):
+    """Persist the job's state on the store pool and push it to connected /ws clients"""
+    from tools.concurrency import run_in_store_pool
+    await run_in_store_pool(_save_job, job)
+    _broadcast(job)
+
+
+def _broadcast(job: IngestJob):
+    if connection_manager is not None:
+        message = {"type": "ingest-progress", "data": job.to_dict()}
+        asyncio.get_running_loop().create_task(connection_manager.broadcast(message))
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=MAX_EXTRACT_WORKERS)
+        logger.info(f"🧵 Started PDF extraction pool with {MAX_EXTRACT_WORKERS} worker(s)")
+    return _pool
+
+
+def shutdown_pool():
+    """Stop the extraction worker processes"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+# --- Worker-process functions (must stay importable without side effects) ---
+
+def _pdf_page_count(path: str) -> int:
+    from pypdf import PdfReader
+    return len(PdfReader(path).pages)
+
+
+def _extract_pdf_pages(path: str, start: int, end: int) -> List[str]:
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+async def extract_pdf(path: str, on_progress: Optional[Callable[[int, int], None]] = None) -> List[str]:
+    """Extract PDF text page by page on the process pool; returns one string per page"""
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+    total = await loop.run_in_executor(pool, _pdf_page_count, path)
+    pages = [""] * total
+    done = 0
+    if on_progress:
+        on_progress(done, total)
+
+    async def run_batch(start: int, end: int):
+        return start, await loop.run_in_executor(pool, _extract_pdf_pages, path, start, end)
+
+    batches = [run_batch(s, min(s + PAGES_PER_TASK, total)) for s in range(0, total, PAGES_PER_TASK)]
+    for next_batch in asyncio.as_completed(batches):
+        start, texts = await next_batch
+        pages[start:start + len(texts)] = texts
+        done += len(texts)
+        if on_progress:
+            on_progress(done, total)
+    return pages
+
+
+def _read_text_file(path: str) -> List[str]:
+    with open(path, "rb") as f:
+        content = f.read()
+    try:
+        return [content.decode("utf-8")]
+    except UnicodeDecodeError:
+        raise ValueError("File must be UTF-8 encoded text or PDF")
+
+
+def is_pdf(filename: Optional[str], content_type: Optional[str] = None) -> bool:
+    return bool(filename and filename.lower().endswith(".pdf")) or content_type == "application/pdf"
+
+
+def _spool_dir() -> Path:
+    """Spooled uploads live next to knowledge_base.db so queued jobs survive restarts"""
+    from tools.rag import get_store
+    spool_dir = Path(get_store().db_path).parent / "ingest"
+    spool_dir.mkdir(parents=True, exist_ok=True)
+    return spool_dir
+
+
+async def spool_upload(upload) -> str:
+    """Copy a FastAPI UploadFile to a spool file in fixed-size reads; returns its path"""
+    from tools.concurrency import run_in_store_pool
+
+    suffix = os.path.splitext(upload.filename or "")[1]
+    spool_dir = await run_in_store_pool(_spool_dir)
+    fd, path = tempfile.mkstemp(prefix="upload-", suffix=suffix, dir=str(spool_dir))
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                block = await upload.read(SPOOL_CHUNK_SIZE)
+                if not block:
+                    break
+                out.write(block)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def _chunk_and_embed(pages: List[str], options: Dict[str, Any]):
+    """CPU-bound chunking and embedding, run off the event loop"""
+    from tools.chunker import chunk_pages, DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP
+    from tools.rag import get_store
+
+    chunks = chunk_pages(
+        pages,
+        chunk_size=options.get("chunk_size") or DEFAULT_CHUNK_SIZE,
+        overlap=options["chunk_overlap"] if options.get("chunk_overlap") is not None else DEFAULT_CHUNK_OVERLAP
+    )
+    if len(pages) == 1 and not options.get("is_pdf"):
+        # Plain text files have no pages
+        for chunk in chunks:
+            chunk.page = None
+    vecs = get_store().embedder.embed_many([c.text for c in chunks]) if chunks else None
+    return chunks, vecs
+
+
+async def run_job(job: IngestJob):
+    """Extract, chunk, embed and index one job, publishing progress as it goes"""
+    from tools.rag import get_store
+    from tools.concurrency import run_in_store_pool
+    from tools.dedup import content_hash
+
+    store = await run_in_store_pool(get_store)
+    _active[job.id] = job
+    cancelled = False
+    try:
+        if job.kind == "text":
+            job.status = "indexing"
+            await _publish(job)
+            # Stored under an existing id if the text is a duplicate
+            job.result_id = await run_in_store_pool(store.add, job.result_id, job.payload,
+                                                    source=job.source, filename=job.filename)
+            job.chunk_count = 1
+        elif job.result_id and await run_in_store_pool(store.get_file, job.result_id):
+            # Indexed before a crash, but the job was never marked done
+            job.chunk_count = (await run_in_store_pool(store.get_file, job.result_id))["chunk_count"]
+        else:
+            job.status = "extracting"
+            job.pages_done = 0
+            await _publish(job)
+            if job.options.get("is_pdf"):
+                def on_progress(done: int, total: int):
+                    # In-memory only (get_job serves active jobs from _active);
+                    # extraction restarts from page 0 after a crash anyway
+                    job.pages_done, job.pages_total = done, total
+                    _broadcast(job)
+                pages = await extract_pdf(job.path, on_progress)
+                if not any(p.strip() for p in pages):
+                    raise ValueError("Could not extract text from PDF")
+            else:
+                pages = await asyncio.to_thread(_read_text_file, job.path)
+                job.pages_done = job.pages_total = 1
+
+            job.status = "indexing"
+            await _publish(job)
+            digest = await asyncio.to_thread(content_hash, "\n".join(pages))
+            result = await run_in_store_pool(store.find_file, digest)
+            if result is None:
+                chunks, vecs = await asyncio.to_thread(_chunk_and_embed, pages, job.options)
+                result = await run_in_store_pool(store.add_file, job.filename, chunks, source=job.source,
+                                                 vecs=vecs, file_id=job.result_id, content_hash=digest)
+            if result["id"] != job.result_id:
+                logger.info(f"⏭️  {job.filename or job.id} is already in the knowledge base as {result['id']}")
+            job.result_id = result["id"]
+            job.chunk_count = result["chunk_count"]
+        job.status = "done"
+        logger.info(f"✅ Ingested {job.filename or job.result_id}: {job.chunk_count} chunk(s)")
+    except asyncio.CancelledError:
+        cancelled = True
+        raise
+    except Exception as e:
+        logger.error(f"❌ Ingestion of {job.filename or job.id} failed: {e}")
+        job.status = "failed"
+        job.error = str(e)
+    finally:
+        _active.pop(job.id, None)
+        if cancelled:
+            # Shutting down: keep the spool file and text so the job resumes next start
+            job.status = "queued"
+            await run_in_store_pool(_save_job, job)
+        else:
+            job.finished_at = datetime.utcnow().isoformat()
+            job.payload = None
+            await _publish(job)
+            if job.owned and job.path and os.path.exists(job.path):
+                os.remove(job.path)
+
+
+def _prune_finished_jobs():
+    conn = _connect()
+    conn.execute("""
+        DELETE FROM ingest_jobs WHERE finished_at IS NOT NULL AND id NOT IN (
+            SELECT id FROM ingest_jobs WHERE finished_at IS NOT NULL
+            ORDER BY finished_at DESC LIMIT ?
+        )
+    """, (MAX_FINISHED_JOBS,))
+    conn.commit()
+
+
+async def _worker(worker_no: int):
+    from tools.concurrency import run_in_store_pool
+
+    while True:
+        job_id = await _queue.get()
+        try:
+            job = await run_in_store_pool(get_job, job_id)
+            if job and job.status not in ("done", "failed"):
+                await run_job(job)
+                await run_in_store_pool(_prune_finished_jobs)
+        except Exception as e:
+            logger.error(f"❌ Ingest worker {worker_no} error: {e}")
+        finally:
+            _pending.discard(job_id)
+            _queue.task_done()
+
+
+def _queue_job(job_id: str):
+    """Put a job on the queue unless it is already queued or running"""
+    if _queue is None or job_id in _pending:
+        return
+    _pending.add(job_id)
+    _queue.put_nowait(job_id)
+
+
+async def start_workers():
+    """Start worker tasks and (in the background) re-queue jobs interrupted by a crash"""
+    global _queue
+    if _queue is not None:
+        return
+    _queue = asyncio.Queue()
+    for worker_no in range(MAX_CONCURRENT_JOBS):
+        _workers.append(asyncio.get_running_loop().create_task(_worker(worker_no)))
+
+    # Opening the store can take a while; don't hold up startup for it
+    asyncio.get_running_loop().create_task(_resume_pending())
+
+
+async def _resume_pending():
+    from tools.concurrency import run_in_store_pool
+
+    def pending_job_ids() -> List[str]:
+        cursor = _connect().cursor()
+        cursor.execute("""
+            SELECT id FROM ingest_jobs WHERE status NOT IN ('done', 'failed') ORDER BY created_at
+        """)
+        return [row[0] for row in cursor.fetchall()]
+
+    pending = await run_in_store_pool(pending_job_ids)
+    if pending:
+        logger.info(f"🔁 Resuming {len(pending)} unfinished ingestion job(s)")
+    for job_id in pending:
+        _queue_job(job_id)
+
+
+async def stop_workers():
+    """Cancel worker tasks and stop the extraction pool; unfinished jobs resume next start"""
+    global _queue
+    for task in _workers:
+        task.cancel()
+    # Let cancelled jobs record themselves as queued before the queue goes away
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    _pending.clear()
+    _queue = None
+    shutdown_pool()
+
+
+async def _enqueue(job: IngestJob) -> IngestJob:
+    from tools.concurrency import run_in_store_pool
+
+    await start_workers()
+    await run_in_store_pool(_save_job, job)
+    _queue_job(job.id)
+    return job
+
+
+async def submit_file(path: str, filename: Optional[str], source: str = "file",
+                      options: Optional[Dict[str, Any]] = None, owned: bool = True) -> IngestJob:
+    """Queue a file for ingestion; `owned` files (spooled uploads) are deleted when done"""
+    job_id = str(uuid.uuid4())
+    return await _enqueue(IngestJob(
+        id=job_id, kind="file", filename=filename, path=path, owned=owned,
+        source=source, options=options or {}, result_id=job_id
+    ))
+
+
+async def submit_text(text: str, source: str = "manual", filename: Optional[str] = None,
+                      doc_id: Optional[str] = None) -> IngestJob:
+    """Queue a single text document for embedding and insertion"""
+    return await _enqueue(IngestJob(
+        id=str(uuid.uuid4()), kind="text", payload=text, source=source,
+        filename=filename, owned=False, result_id=doc_id or str(uuid.uuid4())
+    ))
+
+
+async def submit_folder(folder: str, recursive: bool = True, source: str = "file",
+                        options: Optional[Dict[str, Any]] = None) -> List[IngestJob]:
+    """Queue every importable file in a folder (files are read in place, not copied).
+
+    Deliberately not exposed over HTTP: the backend accepts requests from any
+    origin, so an arbitrary path there would let any web page index (and read
+    back) the user's files.
+    """
+    root = Path(folder).expanduser()
+    if not root.is_dir():
+        raise ValueError(f"Not a folder: {folder}")
+    paths = root.rglob("*") if recursive else root.glob("*")
+    jobs = []
+    for path in sorted(p for p in paths if p.is_file() and p.suffix.lower() in IMPORT_EXTENSIONS):
+        jobs.append(await submit_file(
+            str(path), path.name, source=source, owned=False,
+            options={**(options or {}), "is_pdf": is_pdf(path.name)}
+        ))
+    return jobs
+
+
+def get_job(job_id: str) -> Optional[IngestJob]:
+    """Look up a job (blocking SQLite; call on the store pool)"""
+    if job_id in _active:
+        return _active[job_id]
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT {', '.join(_COLUMNS)} FROM ingest_jobs WHERE id = ?", (job_id,))
+    row = cursor.fetchone()
+    return _row_to_job(row) if row else None
+
+
+def list_jobs(limit: int = 100) -> List[IngestJob]:
+    """Most recent jobs first (blocking SQLite; call on the store pool)"""
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute(
+        f"SELECT {', '.join(_COLUMNS)} FROM ingest_jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+    )
+    jobs = [_active.get(row[0]) or _row_to_job(row) for row in cursor.fetchall()]
+    return jobs
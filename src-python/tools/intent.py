@@ -0,0 +1,381 @@
+"""
+Local intent router for deterministic agent commands.
+
+Requests like "remember this: ..." or "add standup 2025-11-03T09:30 to my
+calendar" need no reasoning, yet going through the agent costs at least two
+Gemini round trips (root agent, then PointerCoordinator, then the tool).
+IntentRouter recognizes them locally in well under a millisecond so the
+caller can run rag_add, rag_query or add_to_calendar directly.
+
+Classification uses high-precision keyword rules first, then a small linear
+(softmax) model over hashed word unigrams and bigrams. The model is trained
+from the seed examples below the first time it is needed and saved next to
+the knowledge base; it is retrained when the examples change. Either way an
+intent is only returned when its arguments can be extracted from the message
+(and the selected text); everything else falls through to the agent.
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from tools.embeddings import tokenize
+
+logger = logging.getLogger("pointer.tools.intent")
+
+# Set POINTER_FAST_PATH=0 to send every request through the agent
+FAST_PATH_ENABLED = os.environ.get("POINTER_FAST_PATH", "1") != "0"
+# Lowest model probability that skips the agent
+INTENT_THRESHOLD = float(os.environ.get("POINTER_INTENT_THRESHOLD", 0.9))
+
+LABELS = ("other", "rag_add", "rag_query", "add_to_calendar")
+FEATURE_DIM = 1 << 12
+
+_SEED_EXAMPLES: List[Tuple[str, str]] = [
+    ("remember this", "rag_add"),
+    ("remember this for later", "rag_add"),
+    ("remember that my locker code is 4412", "rag_add"),
+    ("save this to my notes", "rag_add"),
+    ("save this snippet", "rag_add"),
+    ("store this in my knowledge base", "rag_add"),
+    ("add this to my knowledge base", "rag_add"),
+    ("keep this in mind", "rag_add"),
+    ("note this down", "rag_add"),
+    ("memorize this", "rag_add"),
+    ("please remember the following: wifi password is hunter2", "rag_add"),
+    ("save the selected text", "rag_add"),
+    ("put this in my notes", "rag_add"),
+    ("don't forget this", "rag_add"),
+    ("what did I save about the project deadline", "rag_query"),
+    ("what did i store about kubernetes", "rag_query"),
+    ("search my notes for the api key rotation", "rag_query"),
+    ("search my knowledge base for onboarding", "rag_query"),
+    ("find in my notes the dentist address", "rag_query"),
+    ("look up the meeting notes in my knowledge base", "rag_query"),
+    ("what do my notes say about the budget", "rag_query"),
+    ("what do I have saved about taxes", "rag_query"),
+    ("check my notes for the flight number", "rag_query"),
+    ("did I save anything about the launch", "rag_query"),
+    ("recall what I saved about react hooks", "rag_query"),
+    ("add lunch with sam 2025-11-03T12:00 to my calendar", "add_to_calendar"),
+    ("add this to my calendar", "add_to_calendar"),
+    ("put standup on my calendar 2025-11-04T09:30", "add_to_calendar"),
+    ("schedule dentist 2025-11-05T15:00", "add_to_calendar"),
+    ("schedule a meeting with the team", "add_to_calendar"),
+    ("create an event for the demo", "add_to_calendar"),
+    ("create event review 2025-11-06T10:00 to 2025-11-06T11:00", "add_to_calendar"),
+    ("add the brunch to calendar", "add_to_calendar"),
+    ("book a calendar slot for the interview", "add_to_calendar"),
+    ("summarize this", "other"),
+    ("summarize this article in three bullets", "other"),
+    ("send an email to alex about the report", "other"),
+    ("email this to my manager", "other"),
+    ("write a terminal command to list large files", "other"),
+    ("how do I undo the last git commit", "other"),
+    ("explain this code", "other"),
+    ("translate this to spanish", "other"),
+    ("what is the capital of france", "other"),
+    ("fix the grammar in this paragraph", "other"),
+    ("rewrite this more politely", "other"),
+    ("what does this error mean", "other"),
+    ("make this shorter", "other"),
+    ("reply to this message", "other"),
+    ("what time is it in tokyo", "other"),
+    ("give me a regex for email addresses", "other"),
+    ("describe what is on my screen", "other"),
+    ("help me remember how to use grep", "other"),
+    ("how do I save a file in vim", "other"),
+]
+
+_ISO_RE = re.compile(r"\b\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(?::\d{2})?\b")
+
+# "save this", "remember this for later: ...", "add the following to my notes:"
+_ADD_CUE = (r"^\s*(please\s+)?(remember|save|store|memorize|keep|note(\s+down)?|add|put)\s+"
+            r"(this|that|the\s+following)\b\s*"
+            r"((for\s+later|down|in\s+mind|(to|in)\s+my\s+(notes|knowledge\s+base))\b\s*)?")
+_ADD_CUE_RE = re.compile(_ADD_CUE + r"(?P<rest>.*)$", re.I | re.S)
+_REMEMBER_THAT_RE = re.compile(r"^\s*(please\s+)?(remember|memorize)\s+that\s+(?P<rest>\S.*)$", re.I | re.S)
+_QUERY_CUE_RE = re.compile(
+    r"^\s*(what\s+(did\s+i|do\s+i\s+have)\s+(save|saved|store|stored|note|noted|write\s+down)|"
+    r"what\s+do\s+my\s+notes\s+say|(search|check)\s+(in\s+)?my\s+(notes|knowledge\s+base)|"
+    r"find\s+in\s+my\s+(notes|knowledge\s+base)|recall\s+what\s+i\s+saved|"
+    r"did\s+i\s+save\s+anything)\s*(about|for|on|regarding)?\s*", re.I)
+_CALENDAR_TARGET_RE = re.compile(r"\b(to|on|in|into)\s+(my\s+)?calendar\b", re.I)
+_CALENDAR_VERB_RE = re.compile(
+    r"^\s*(please\s+)?(add|put|schedule|create\s+(an\s+)?event(\s+for)?)\b", re.I)
+# A second request riding along ("... and email it to bob", "schedule the email")
+_SECOND_ACTION_RE = re.compile(
+    r"\b(and|then|also|e-?mail|mail|summari[sz]e|send|sent|reply|forward|write|translate|remind)\b", re.I)
+# Topics that point at the screen or a date ("typos in this paragraph", "yesterday")
+# rather than words a keyword search could match
+_DEICTIC_RE = re.compile(
+    r"\b(this|these|that|those|here|it|yesterday|today|tomorrow|tonight|"
+    r"last\s+(night|week|month|year)|earlier|recently)\b", re.I)
+_CALENDAR_TIME_RE = re.compile(
+    r"\b((at|from|to|on|until)\s+)?\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(:\d{2})?\b", re.I)
+
+_RULES = [
+    ("rag_add", re.compile(_ADD_CUE + r"(:|[.!]?\s*$)", re.I)),
+    ("rag_add", _REMEMBER_THAT_RE),
+    ("rag_query", re.compile(
+        r"^\s*(what\s+did\s+i\s+(save|store|note|write\s+down)|"
+        r"(search|check)\s+(in\s+)?my\s+(notes|knowledge\s+base)|"
+        r"find\s+in\s+my\s+(notes|knowledge\s+base))\b", re.I)),
+    ("add_to_calendar", re.compile(
+        r"^\s*(please\s+)?((add|put)\b.*\b(to|on|in|into)\s+(my\s+)?calendar\b|schedule\b|"
+        r"create\s+(an\s+)?event\b)", re.I)),
+]
+
+
+@dataclass
+class Intent:
+    name: str
+    confidence: float
+    args: Dict[str, Any] = field(default_factory=dict)
+    # "rule" or "model"
+    matched_by: str = "rule"
+
+
+def _features(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Signed hashed unigram and bigram features as (bucket indices, values)"""
+    tokens = tokenize(text)
+    grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    if not grams:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    hashes = [zlib.crc32(gram.encode("utf-8")) for gram in grams]
+    index = np.array([h % FEATURE_DIM for h in hashes], dtype=np.int64)
+    values = np.array([1.0 if h & 0x80000000 else -1.0 for h in hashes], dtype=np.float32)
+    return index, values / np.sqrt(len(grams))
+
+
+def _dense(text: str) -> np.ndarray:
+    vec = np.zeros(FEATURE_DIM, dtype=np.float32)
+    index, values = _features(text)
+    np.add.at(vec, index, values)
+    return vec
+
+
+def _seed_signature(examples: List[Tuple[str, str]]) -> int:
+    return zlib.crc32(repr((FEATURE_DIM, LABELS, examples)).encode("utf-8"))
+
+
+class IntentModel:
+    """Multinomial logistic regression over hashed features"""
+
+    def __init__(self, weights: np.ndarray, bias: np.ndarray, signature: int = 0):
+        self.weights = weights
+        self.bias = bias
+        self.signature = signature
+
+    @classmethod
+    def train(cls, examples: List[Tuple[str, str]], epochs: int = 300, lr: float = 2.0,
+              l2: float = 1e-4) -> "IntentModel":
+        X = np.stack([_dense(text) for text, _ in examples])
+        y = np.array([LABELS.index(label) for _, label in examples])
+        onehot = np.eye(len(LABELS), dtype=np.float32)[y]
+        weights = np.zeros((len(LABELS), FEATURE_DIM), dtype=np.float32)
+        bias = np.zeros(len(LABELS), dtype=np.float32)
+        for _ in range(epochs):
+            logits = X @ weights.T + bias
+            probs = np.exp(logits - logits.max(axis=1, keepdims=True))
+            probs /= probs.sum(axis=1, keepdims=True)
+            error = (probs - onehot) / len(examples)
+            weights -= lr * (error.T @ X + l2 * weights)
+            bias -= lr * error.sum(axis=0)
+        return cls(weights, bias, _seed_signature(examples))
+
+    @classmethod
+    def load(cls, path: str) -> Optional["IntentModel"]:
+        try:
+            with np.load(path) as data:
+                if tuple(data["labels"]) != LABELS or data["weights"].shape[1] != FEATURE_DIM:
+                    return None
+                return cls(data["weights"], data["bias"], int(data["signature"]))
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def save(self, path: str):
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, weights=self.weights, bias=self.bias,
+                 labels=np.array(LABELS), signature=np.int64(self.signature))
+        os.replace(tmp_path, path)
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        index, values = _features(text)
+        logits = self.weights[:, index] @ values + self.bias
+        probs = np.exp(logits - logits.max())
+        probs /= probs.sum()
+        best = int(probs.argmax())
+        return LABELS[best], float(probs[best])
+
+
+def _rag_add_args(message: str, selected_text: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Text after "<cue>:", a "remember that ..." fact, or else the selected text"""
+    selected = (selected_text or "").strip()
+    cue = _ADD_CUE_RE.match(message)
+    rest = cue.group("rest").strip() if cue else ""
+    if rest.startswith(":"):
+        # "remember this: the meeting is at 10:30"
+        text = rest[1:].strip()
+    else:
+        fact = _REMEMBER_THAT_RE.match(message)
+        if fact is not None:
+            if "?" in message:
+                # "remember that bug we fixed? what was the cause" asks something
+                return None
+            text = fact.group("rest").strip().rstrip(".!").strip()
+        elif cue is None or rest.rstrip(".!").strip():
+            # "save this file as pdf" is not a note
+            return None
+        else:
+            text = ""
+    text = text or selected
+    if not text:
+        return None
+    return {"text": text, "source": "selection" if text == selected else "manual"}
+
+
+def _rag_query_args(message: str, selected_text: Optional[str]) -> Optional[Dict[str, Any]]:
+    """The plain topic after a search cue; None if anything else is asked of it"""
+    query = _QUERY_CUE_RE.sub("", message, count=1).strip().rstrip("?").strip()
+    if query == message.strip().rstrip("?").strip() or not tokenize(query):
+        # No lead-in to strip: the question itself needs the agent
+        return None
+    if _SECOND_ACTION_RE.search(query) or _DEICTIC_RE.search(query):
+        # "... for the flight number and email it to bob", "... yesterday"
+        return None
+    return {"query": query}
+
+
+def _calendar_args(message: str, selected_text: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Title and ISO 8601 start (and end) times; None unless the message is only a
+    calendar command (verb first, nothing else asked) with an ISO time"""
+    if not _CALENDAR_VERB_RE.match(message) or _SECOND_ACTION_RE.search(message):
+        # "summarize this and add it to my calendar" is for the agent
+        return None
+    times = _ISO_RE.findall(message)
+    if not times:
+        return None
+    title = _CALENDAR_TIME_RE.sub(" ", _CALENDAR_TARGET_RE.sub(" ", message))
+    title = _CALENDAR_VERB_RE.sub(" ", title)
+    title = " ".join(title.split()).strip(" ,-:")
+    if not title or title.lower() in ("this", "that", "it"):
+        return None
+    args = {"title": title, "start_iso": times[0].replace(" ", "T")}
+    if len(times) > 1:
+        args["end_iso"] = times[1].replace(" ", "T")
+    return args
+
+
+_EXTRACTORS = {
+    "rag_add": _rag_add_args,
+    "rag_query": _rag_query_args,
+    "add_to_calendar": _calendar_args,
+}
+
+
+class IntentRouter:
+    """Rules, then the model; tracks how often and how much the fast path helps"""
+
+    def __init__(self, model: IntentModel, threshold: float = INTENT_THRESHOLD):
+        self.model = model
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hits: Dict[str, int] = {label: 0 for label in _EXTRACTORS}
+        self.model_hits = 0
+        self.classify_ms = 0.0
+        self.fast_path_ms = 0.0
+        self.agent_runs = 0
+        self.agent_ms = 0.0
+        self.saved_ms = 0.0
+
+    def classify(self, message: str, selected_text: Optional[str] = None) -> Optional[Intent]:
+        """The intent to run directly, or None to fall through to the agent"""
+        start = time.perf_counter()
+        intent = None
+        for label, pattern in _RULES:
+            if pattern.search(message):
+                args = _EXTRACTORS[label](message, selected_text)
+                if args is not None:
+                    intent = Intent(label, 1.0, args, "rule")
+                break
+        if intent is None:
+            label, confidence = self.model.predict(message)
+            if label in _EXTRACTORS and confidence >= self.threshold:
+                args = _EXTRACTORS[label](message, selected_text)
+                if args is not None:
+                    intent = Intent(label, confidence, args, "model")
+        with self._lock:
+            self.requests += 1
+            self.classify_ms += (time.perf_counter() - start) * 1000
+        return intent
+
+    def record_fast_path(self, intent: Intent, elapsed_ms: float):
+        with self._lock:
+            self.hits[intent.name] += 1
+            if intent.matched_by == "model":
+                self.model_hits += 1
+            self.fast_path_ms += elapsed_ms
+            if self.agent_runs:
+                self.saved_ms += max(self.agent_ms / self.agent_runs - elapsed_ms, 0.0)
+
+    def record_agent_run(self, elapsed_ms: float):
+        with self._lock:
+            self.agent_runs += 1
+            self.agent_ms += elapsed_ms
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = sum(self.hits.values())
+            return {
+                "enabled": FAST_PATH_ENABLED,
+                "threshold": self.threshold,
+                "requests": self.requests,
+                "hits": hits,
+                "hits_by_intent": dict(self.hits),
+                "model_hits": self.model_hits,
+                "hit_rate": hits / self.requests if self.requests else 0.0,
+                "avg_classify_ms": self.classify_ms / self.requests if self.requests else 0.0,
+                "avg_fast_path_ms": self.fast_path_ms / hits if hits else 0.0,
+                "avg_agent_ms": self.agent_ms / self.agent_runs if self.agent_runs else None,
+                # Against the mean agent latency at the time of each hit
+                "latency_saved_ms": round(self.saved_ms, 1),
+            }
+
+
+_router: Optional[IntentRouter] = None
+_router_lock = threading.Lock()
+
+
+def _model_path() -> str:
+    path = os.environ.get("POINTER_INTENT_MODEL")
+    if path:
+        return path
+    from tools.rag import _get_data_dir
+    return str(_get_data_dir() / "intent_model.npz")
+
+
+def get_intent_router() -> IntentRouter:
+    """The process-wide router, loading (or training and saving) the model on first use"""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                path = _model_path()
+                model = IntentModel.load(path)
+                if model is None or model.signature != _seed_signature(_SEED_EXAMPLES):
+                    model = IntentModel.train(_SEED_EXAMPLES)
+                    try:
+                        model.save(path)
+                        logger.info(f"🧠 Trained intent model saved to {path}")
+                    except OSError as e:
+                        logger.warning(f"⚠️ Could not save intent model: {e}")
+                _router = IntentRouter(model)
+    return _router
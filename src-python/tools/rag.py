@@ -1,13 +1,26 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 import numpy as np
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, replace
 from google.adk.tools import FunctionTool
 import sqlite3
 import json
 import uuid
-from datetime import datetime
+import hashlib
+import base64
+from datetime import datetime, timezone
 import os
+import threading
+import functools
 from pathlib import Path
+from tools.embeddings import Embedder, get_embedder, normalize, tokenize
+from tools.ann_index import IVFIndex
+from tools.bm25 import BM25Index, reciprocal_rank_fusion
+from tools.chunker import Chunk
+from tools.vector_file import DEFAULT_VECTOR_MODE, QuantizedVectors
+from tools.cache import LRUCache
+from tools.dedup import (SIMHASH_DISTANCE, content_hash, from_signed, hamming_distances,
+                          simhash, to_signed)
+from tools.concurrency import ReadWriteLock, run_in_store_pool
 
 
 # Enhanced document with metadata
@@ -20,6 +33,7 @@ class Doc:
     filename: Optional[str] = None
     created_at: str = ""
     metadata: Dict[str, Any] = None
+    parent_id: Optional[str] = None  # id in the files table for chunks of an uploaded file
     
     def __post_init__(self):
         if not self.created_at:
@@ -28,6 +42,65 @@ class Doc:
             self.metadata = {}
 
 
+@dataclass
+class QueryFilter:
+    """Restricts a query to matching documents; every given field must match."""
+    source: Optional[List[str]] = None  # any of these sources
+    filename: Optional[str] = None
+    file_id: Optional[str] = None  # chunks of one uploaded file
+    created_after: Optional[str] = None  # ISO 8601, inclusive
+    created_before: Optional[str] = None  # ISO 8601, exclusive
+    metadata: Optional[Dict[str, Any]] = None  # exact value per metadata key
+
+    def __post_init__(self):
+        if isinstance(self.source, str):
+            self.source = [self.source]
+
+    def is_empty(self) -> bool:
+        return all(value is None for value in asdict(self).values())
+
+    def cache_key(self) -> str:
+        return json.dumps(asdict(self), sort_keys=True, default=str)
+
+
+def _parse_time(value: Optional[str]) -> np.datetime64:
+    """An ISO 8601 timestamp as UTC datetime64 (NaT if missing or unparsable)"""
+    if not value:
+        return np.datetime64("NaT", "us")
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return np.datetime64("NaT", "us")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return np.datetime64(parsed, "us")
+
+
+def _writes(method):
+    """Run a TinyStore method holding the store's write lock (exclusive), rolling
+    back this thread's connection if it fails so the next call doesn't inherit an
+    open transaction."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock.write():
+            try:
+                return method(self, *args, **kwargs)
+            except Exception:
+                self.connection().rollback()
+                raise
+    return wrapper
+
+
+def _reads(method):
+    """Run a TinyStore method that reads in-memory state under the store's read
+    lock (shared with other readers). Must not call other @_reads methods."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock.read():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
 def _get_data_dir() -> Path:
     """Get the application data directory, creating it if needed."""
     # Use user's home directory for data storage
@@ -46,19 +119,128 @@ def _get_data_dir() -> Path:
     return data_dir
 
 
+
+
 class TinyStore:
-    def __init__(self, db_path: str = None):
-        self.docs: List[Doc] = []
+    # Initial row capacity of the vector file; doubles whenever it fills up
+    _INITIAL_CAPACITY = 256
+    # SQLite page cache per connection, in KiB (negative cache_size)
+    _CACHE_SIZE_KB = 16 * 1024
+    # Rows read per batch when rebuilding the vector file from SQLite
+    _REBUILD_BATCH = 4096
+    # With quantized vectors, rescore this many times k candidates in float32
+    _RESCORE_FACTOR = 4
+    # Sample used to estimate quantized-search recall for /api/rag/stats
+    _RECALL_SAMPLE = 2000
+    _RECALL_QUERIES = 50
+    # Cached query embeddings and top-k results (0 disables a cache)
+    _EMBED_CACHE_SIZE = int(os.environ.get("POINTER_EMBED_CACHE_SIZE", 1024))
+    _RESULT_CACHE_SIZE = int(os.environ.get("POINTER_QUERY_CACHE_SIZE", 256))
+    _FILTER_CACHE_SIZE = 64
+
+    def __init__(self, db_path: str = None, embedder: Optional[Embedder] = None,
+                 vector_mode: Optional[str] = None, rescore: Optional[bool] = None,
+                 near_duplicates: Optional[bool] = None):
+        self.embedder = embedder or get_embedder()
         # Use default path in app data directory if not specified
         if db_path is None:
             db_path = str(_get_data_dir() / "knowledge_base.db")
         self.db_path = db_path
+        # Row i of the memory-mapped vector matrix belongs to document self._ids[i];
+        # texts and metadata stay in SQLite until a row shows up in results
+        self._ids: List[str] = []
+        self._row_of: Dict[str, int] = {}
+        # Columnar per-row fields for counts, filters and near-duplicate checks:
+        # interned source and filename codes (with live counts per source),
+        # creation time and SimHash signature (0 for file chunks)
+        self._reset_columns(self._INITIAL_CAPACITY)
+        # Exact duplicates (same normalized text) are always collapsed; with
+        # POINTER_NEAR_DUPLICATES=1, lightly edited copies update the original
+        if near_duplicates is None:
+            near_duplicates = os.environ.get("POINTER_NEAR_DUPLICATES", "0") == "1"
+        self.near_duplicates = near_duplicates
+        # float32, float16 or int8 (POINTER_VECTOR_DTYPE); quantized modes can
+        # rescore their top candidates with the exact float32 vectors in SQLite
+        self.vectors = QuantizedVectors(
+            str(Path(db_path).with_suffix("")),
+            self.embedder.dim,
+            mode=vector_mode or DEFAULT_VECTOR_MODE,
+            capacity=self._INITIAL_CAPACITY
+        )
+        if rescore is None:
+            rescore = os.environ.get("POINTER_VECTOR_RESCORE", "1") != "0"
+        self.rescore = rescore and self.vectors.mode != "float32"
+        # Bumped on every write; cached derived results compare against it
+        self.generation = 0
+        self._recall_cache: Optional[Tuple[int, Dict[str, Any]]] = None
+        self._embed_cache = LRUCache(self._EMBED_CACHE_SIZE)
+        self._result_cache = LRUCache(self._RESULT_CACHE_SIZE)
+        # Row sets for file_id / metadata filters, keyed by generation like results
+        self._filter_cache = LRUCache(self._FILTER_CACHE_SIZE)
+        # In-memory BM25 index, only built (lazily) when SQLite has no FTS5
+        self.keywords: Optional[BM25Index] = None
+        # Approximate index persisted next to the database (knowledge_base.ivf.npz)
+        self.ann = IVFIndex(
+            self.embedder.dim,
+            id_of_row=lambda row: self._ids[row],
+            path=str(Path(db_path).with_suffix(".ivf.npz")),
+            signature=self.embedder.signature
+        )
+        self.fts_available = False
+        # One long-lived WAL connection per thread (FastAPI handlers, ADK tools,
+        # ingestion threads). Queries share the read lock; writes to the
+        # in-memory indexes + database take it exclusively.
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._lock = ReadWriteLock()
         self._init_db()
-        self._load_from_db()
+        self._migrate_embeddings()
+        self._load_rows()
+        self._load_ann_index()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def connection(self) -> sqlite3.Connection:
+        """This thread's persistent connection to the knowledge base database.
+
+        Connections run in WAL mode (readers never block the writer) with
+        synchronous=NORMAL, and keep the sqlite3 module's prepared-statement
+        cache warm across calls.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, cached_statements=256,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA cache_size=-{self._CACHE_SIZE_KB}")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        """Flush the vector file, mark it clean and close every thread's connection (on shutdown)"""
+        with self._lock.write():
+            self.vectors.flush()
+            conn = self.connection()
+            conn.execute("INSERT OR REPLACE INTO store_meta (key, value) VALUES ('vectors_clean', '1')")
+            conn.commit()
+        with self._connections_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._connections = []
+            self._local = threading.local()
 
     def _init_db(self):
         """Initialize SQLite database for persistent storage"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.connection()
         cursor = conn.cursor()
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS documents (
@@ -71,149 +253,1386 @@ class TinyStore:
                 metadata TEXT
             )
         """)
+        cursor.execute("PRAGMA table_info(documents)")
+        columns = [col[1] for col in cursor.fetchall()]
+        # Documents written before chunking have no parent_id column
+        if "parent_id" not in columns:
+            cursor.execute("ALTER TABLE documents ADD COLUMN parent_id TEXT")
+        # Row of the document's vector in the memory-mapped vector file
+        if "vec_row" not in columns:
+            cursor.execute("ALTER TABLE documents ADD COLUMN vec_row INTEGER")
+        # Hash of the normalized text (standalone documents only) and its SimHash
+        if "content_hash" not in columns:
+            cursor.execute("ALTER TABLE documents ADD COLUMN content_hash TEXT")
+        if "simhash" not in columns:
+            cursor.execute("ALTER TABLE documents ADD COLUMN simhash INTEGER")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_documents_parent ON documents(parent_id)")
+        # Keyset pagination of the document list
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_documents_created ON documents(created_at, id)")
+        # Parent documents: one row per uploaded file, its chunks live in documents
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                id TEXT PRIMARY KEY,
+                filename TEXT,
+                source TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                chunk_count INTEGER NOT NULL,
+                char_count INTEGER NOT NULL,
+                metadata TEXT
+            )
+        """)
+        cursor.execute("PRAGMA table_info(files)")
+        if "content_hash" not in [col[1] for col in cursor.fetchall()]:
+            cursor.execute("ALTER TABLE files ADD COLUMN content_hash TEXT")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS store_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+        """)
+        conn.commit()
+        self._backfill_hashes(conn)
+        # Duplicate checks are single index lookups
+        cursor.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_documents_content_hash
+            ON documents(content_hash) WHERE content_hash IS NOT NULL
+        """)
+        cursor.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_files_content_hash
+            ON files(content_hash) WHERE content_hash IS NOT NULL
+        """)
+        conn.commit()
+        self._init_fts(conn)
+
+    def _backfill_hashes(self, conn: sqlite3.Connection):
+        """Hash standalone documents written before deduplication (once per database).
+
+        Duplicates that already exist are left in place, but only the oldest copy
+        gets the hash, so new copies of it are still caught.
+        """
+        import logging
+        logger = logging.getLogger("pointer.tools.rag")
+
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM store_meta WHERE key = 'content_hashes'")
+        if cursor.fetchone() is not None:
+            return
+        cursor.execute("SELECT rowid, text FROM documents WHERE parent_id IS NULL ORDER BY rowid")
+        seen = set()
+        updates = []
+        for rowid, text in cursor.fetchall():
+            digest = content_hash(text)
+            updates.append((None if digest in seen else digest, to_signed(simhash(text)), rowid))
+            seen.add(digest)
+        cursor.executemany("UPDATE documents SET content_hash = ?, simhash = ? WHERE rowid = ?", updates)
+        cursor.execute("INSERT OR REPLACE INTO store_meta (key, value) VALUES ('content_hashes', '1')")
         conn.commit()
-        conn.close()
+        duplicates = len(updates) - len(seen)
+        if duplicates:
+            logger.info(f"🧬 Found {duplicates} existing duplicate document(s); new copies will be skipped")
 
-    def _load_from_db(self):
-        """Load all documents from database into memory"""
+    def _init_fts(self, conn: sqlite3.Connection):
+        """Create the FTS5 index over documents, kept in sync by triggers"""
         import logging
         logger = logging.getLogger("pointer.tools.rag")
-        
-        logger.info(f"📖 Loading documents from database: {self.db_path}")
-        
+
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'documents_fts'")
+        exists = cursor.fetchone() is not None
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, text, vec, source, filename, created_at, metadata FROM documents")
-            rows = cursor.fetchall()
-            
-            logger.info(f"📖 Found {len(rows)} documents in database")
-            
-            for row in rows:
-                doc_id, text, vec_blob, source, filename, created_at, metadata_json = row
-                vec = np.frombuffer(vec_blob, dtype=float)
-                metadata = json.loads(metadata_json) if metadata_json else {}
-                self.docs.append(Doc(
-                    id=doc_id,
-                    text=text,
-                    vec=vec,
-                    source=source,
-                    filename=filename,
-                    created_at=created_at,
-                    metadata=metadata
-                ))
-                logger.info(f"✅ Loaded document: {filename or doc_id[:8]}... (source: {source})")
-            
-            conn.close()
-            logger.info(f"📖 Loaded {len(self.docs)} documents into memory")
-        except Exception as e:
-            logger.error(f"❌ Error loading from database: {e}")
-            import traceback
-            traceback.print_exc()
-
-    def add(self, id: str, text: str, vec: np.ndarray, source: str = "manual", 
-            filename: Optional[str] = None, metadata: Optional[Dict[str, Any]] = None):
-        """Add document to both memory and database"""
-        doc = Doc(
-            id=id,
-            text=text,
-            vec=vec,
-            source=source,
-            filename=filename,
-            metadata=metadata or {}
+            cursor.executescript("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+                    text, filename, content='documents', content_rowid='rowid',
+                    tokenize='unicode61 remove_diacritics 2'
+                );
+                CREATE TRIGGER IF NOT EXISTS documents_fts_insert AFTER INSERT ON documents BEGIN
+                    INSERT INTO documents_fts (rowid, text, filename)
+                    VALUES (new.rowid, new.text, new.filename);
+                END;
+                CREATE TRIGGER IF NOT EXISTS documents_fts_delete AFTER DELETE ON documents BEGIN
+                    INSERT INTO documents_fts (documents_fts, rowid, text, filename)
+                    VALUES ('delete', old.rowid, old.text, old.filename);
+                END;
+                CREATE TRIGGER IF NOT EXISTS documents_fts_update AFTER UPDATE OF text, filename ON documents BEGIN
+                    INSERT INTO documents_fts (documents_fts, rowid, text, filename)
+                    VALUES ('delete', old.rowid, old.text, old.filename);
+                    INSERT INTO documents_fts (rowid, text, filename)
+                    VALUES (new.rowid, new.text, new.filename);
+                END;
+            """)
+            if not exists:
+                # Index documents written before the FTS table existed
+                cursor.execute("INSERT INTO documents_fts (documents_fts) VALUES ('rebuild')")
+            conn.commit()
+            self.fts_available = True
+        except sqlite3.OperationalError as e:
+            logger.warning(f"⚠️  SQLite FTS5 unavailable, full-text search disabled: {e}")
+
+    def _migrate_embeddings(self):
+        """Re-embed stored rows when they were written by a different embedder.
+
+        Older databases hold variable-length bag-of-words vectors that cannot be
+        compared with each other, so their text is re-embedded in place.
+        """
+        import logging
+        logger = logging.getLogger("pointer.tools.rag")
+
+        signature = self.embedder.signature
+        conn = self.connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT value FROM store_meta WHERE key = 'embedder'")
+        row = cursor.fetchone()
+        if row and row[0] == signature:
+            return
+
+        cursor.execute("SELECT id, text FROM documents")
+        rows = cursor.fetchall()
+        if rows:
+            logger.info(f"🔁 Re-embedding {len(rows)} documents with {signature} "
+                        f"(was {row[0] if row else 'legacy bag-of-words'})")
+        cursor.executemany(
+            "UPDATE documents SET vec = ? WHERE id = ?",
+            [(self.embedder.embed(text).tobytes(), doc_id) for doc_id, text in rows]
+        )
+        cursor.execute(
+            "INSERT OR REPLACE INTO store_meta (key, value) VALUES ('embedder', ?)",
+            (signature,)
         )
-        self.docs.append(doc)
-        
-        # Save to database
-        conn = sqlite3.connect(self.db_path)
+        # The vector file now holds stale vectors; rebuild it from the new ones
+        cursor.execute("DELETE FROM store_meta WHERE key = 'vectors'")
+        conn.commit()
+
+
+    def _load_rows(self):
+        """Map document ids onto rows of the vector file, rebuilding it if it's stale.
+
+        Only ids and row numbers are read; texts, metadata and vector blobs stay
+        on disk. Writes put vectors in the file before their SQLite commit, so
+        after an unclean shutdown (no 'vectors_clean' mark from close()) every
+        row is checked against SQLite instead of just the newest.
+        """
+        import logging
+        logger = logging.getLogger("pointer.tools.rag")
+
+        conn = self.connection()
         cursor = conn.cursor()
-        cursor.execute("""
-            INSERT OR REPLACE INTO documents (id, text, vec, source, filename, created_at, metadata)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
+        cursor.execute("SELECT value FROM store_meta WHERE key = 'vectors'")
+        meta = cursor.fetchone()
+        cursor.execute("SELECT 1 FROM store_meta WHERE key = 'vectors_clean'")
+        clean = cursor.fetchone() is not None
+        layout = f"{self.embedder.signature}:{self.vectors.mode}"
+        cursor.execute("SELECT vec_row, id, source, simhash, filename, created_at FROM documents")
+        rows = cursor.fetchall()
+
+        n = len(rows)
+        ids: List[Optional[str]] = [None] * n
+        valid = meta is not None and meta[0] == layout and self.vectors.stored_rows() >= n
+        if valid:
+            for vec_row, doc_id, *_ in rows:
+                if vec_row is None or not 0 <= vec_row < n or ids[vec_row] is not None:
+                    valid = False
+                    break
+                ids[vec_row] = doc_id
+        if valid and n and clean:
+            # Rows are appended at the end; make sure the newest one made it to the file
+            cursor.execute("SELECT vec FROM documents WHERE id = ?", (ids[n - 1],))
+            valid = self.vectors.matches(n - 1, normalize(np.frombuffer(cursor.fetchone()[0], dtype=np.float32)))
+        elif valid and n:
+            logger.info(f"🔎 Knowledge base wasn't closed cleanly; checking {n} vectors against the database")
+            valid = self._vectors_match()
+        if not valid:
+            ids = self._rebuild_vectors()
+        # Open for writing until close() marks the vector file clean again
+        cursor.execute("DELETE FROM store_meta WHERE key = 'vectors_clean'")
+        conn.commit()
+
+        self._ids = ids
+        self._row_of = {doc_id: row for row, doc_id in enumerate(ids)}
+        self._reset_columns(n)
+        if n:
+            order = np.array([self._row_of[doc_id] for _, doc_id, *_ in rows])
+            for row, (_, _, source, signature, filename, _) in zip(order.tolist(), rows):
+                self._set_source(row, source)
+                self._filename_codes[row] = self._filename_code(filename)
+                self._simhashes[row] = from_signed(signature)
+            created = [created_at for *_, created_at in rows]
+            try:
+                self._created[order] = np.array(created, dtype="datetime64[us]")
+            except ValueError:
+                # Timezone suffixes or odd formats: parse one by one
+                self._created[order] = [_parse_time(value) for value in created]
+        logger.info(f"📖 Opened knowledge base with {n} documents: {self.db_path}")
+
+    def _vectors_match(self) -> bool:
+        """Whether every row of the vector file holds its document's vector from SQLite"""
+        cursor = self.connection().cursor()
+        cursor.execute("SELECT vec_row, vec FROM documents")
+        while True:
+            batch = cursor.fetchmany(self._REBUILD_BATCH)
+            if not batch:
+                return True
+            rows = np.array([vec_row for vec_row, _ in batch], dtype=np.int64)
+            vecs = np.stack([normalize(np.frombuffer(vec_blob, dtype=np.float32)) for _, vec_blob in batch])
+            if not self.vectors.matches(rows, vecs):
+                return False
+
+    def _rebuild_vectors(self) -> List[str]:
+        """Rewrite the vector file from the vectors stored in SQLite, numbering rows 0..n-1"""
+        import logging
+        logger = logging.getLogger("pointer.tools.rag")
+
+        conn = self.connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM documents")
+        self.vectors.reset(max(self._INITIAL_CAPACITY, cursor.fetchone()[0]))
+
+        ids: List[str] = []
+        cursor.execute("SELECT id, vec FROM documents ORDER BY rowid")
+        while True:
+            batch = cursor.fetchmany(self._REBUILD_BATCH)
+            if not batch:
+                break
+            self.vectors.write(slice(len(ids), len(ids) + len(batch)), np.stack([
+                normalize(np.frombuffer(vec_blob, dtype=np.float32)) for _, vec_blob in batch
+            ]))
+            ids.extend(doc_id for doc_id, _ in batch)
+        self.vectors.flush()
+
+        cursor.executemany("UPDATE documents SET vec_row = ? WHERE id = ?",
+                           [(row, doc_id) for row, doc_id in enumerate(ids)])
+        cursor.execute(
+            "INSERT OR REPLACE INTO store_meta (key, value) VALUES ('vectors', ?)",
+            (f"{self.embedder.signature}:{self.vectors.mode}",)
+        )
+        conn.commit()
+        logger.info(f"🔁 Rebuilt vector file with {len(ids)} vectors: {self.vectors.path}")
+        return ids
+
+    # Per-row column attributes with their dtype and empty value
+    _COLUMNS = {
+        "_source_codes": (np.uint16, 0),
+        "_filename_codes": (np.int32, -1),
+        "_created": ("datetime64[us]", "NaT"),
+        "_simhashes": (np.uint64, 0),
+    }
+
+    def _reset_columns(self, capacity: int):
+        capacity = max(capacity, self._INITIAL_CAPACITY)
+        for name, (dtype, empty) in self._COLUMNS.items():
+            setattr(self, name, np.full(capacity, empty, dtype=dtype))
+        self._source_names: List[str] = []
+        self._source_index: Dict[str, int] = {}
+        self._source_counts: List[int] = []
+        self._filename_index: Dict[str, int] = {}
+
+    def _grow_columns(self, rows: int):
+        """Make the per-row columns hold at least `rows` rows"""
+        if rows <= len(self._source_codes):
+            return
+        capacity = max(rows, len(self._source_codes) * 2)
+        for name, (dtype, empty) in self._COLUMNS.items():
+            column = getattr(self, name)
+            grown = np.full(capacity, empty, dtype=dtype)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
+
+    def _move_columns(self, src: int, dst: int):
+        for name in self._COLUMNS:
+            column = getattr(self, name)
+            column[dst] = column[src]
+
+    def _filename_code(self, filename: Optional[str]) -> int:
+        if filename is None:
+            return -1
+        return self._filename_index.setdefault(filename, len(self._filename_index))
+
+    def _set_source(self, row: int, source: str, previous: Optional[int] = None):
+        """Record `row`'s source code and count it (uncounting its `previous` code)"""
+        code = self._source_index.get(source)
+        if code is None:
+            code = self._source_index[source] = len(self._source_names)
+            self._source_names.append(source)
+            self._source_counts.append(0)
+        self._grow_columns(row + 1)
+        if previous is not None:
+            self._source_counts[previous] -= 1
+        self._source_codes[row] = code
+        self._source_counts[code] += 1
+
+    def _load_ann_index(self):
+        """Load the persisted IVF index, or train it if the store is large enough"""
+        if self.ann.load(self._row_of):
+            self.ann.sync(self.vectors.dense(len(self._ids)))
+        self._maybe_train_ann()
+
+    def _maybe_train_ann(self):
+        n = len(self._ids)
+        if self.ann.needs_training(n):
+            self.ann.train(self.vectors.dense(n))
+
+    _UPSERT_SQL = """
+        INSERT INTO documents (id, text, vec, source, filename, created_at, metadata, parent_id, vec_row,
+                               content_hash, simhash)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(id) DO UPDATE SET
+            text = excluded.text, vec = excluded.vec, source = excluded.source,
+            filename = excluded.filename, created_at = excluded.created_at,
+            metadata = excluded.metadata, parent_id = excluded.parent_id,
+            vec_row = excluded.vec_row, content_hash = excluded.content_hash,
+            simhash = excluded.simhash
+    """
+
+    @staticmethod
+    def _db_row(doc: Doc, row: int, digest: Optional[str], signature: int) -> tuple:
+        return (
             doc.id,
             doc.text,
-            vec.tobytes(),
+            doc.vec.tobytes(),
             doc.source,
             doc.filename,
             doc.created_at,
-            json.dumps(doc.metadata)
+            json.dumps(doc.metadata),
+            doc.parent_id,
+            row,
+            digest,
+            to_signed(signature) if doc.parent_id is None else None
+        )
+
+    def find_duplicate(self, text: str) -> Optional[str]:
+        """Id of the stored document with the same normalized text, or None"""
+        conn = self.connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM documents WHERE content_hash = ?", (content_hash(text),))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def find_file(self, digest: str) -> Optional[Dict[str, Any]]:
+        """The uploaded file whose extracted text hashes to `digest` (see tools.dedup.content_hash), or None"""
+        conn = self.connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM files WHERE content_hash = ?", (digest,))
+        row = cursor.fetchone()
+        return self.get_file(row[0]) if row else None
+
+    def add(self, id: str, text: str, vec: Optional[np.ndarray] = None, source: str = "manual",
+            filename: Optional[str] = None, metadata: Optional[Dict[str, Any]] = None) -> str:
+        """Add document to both memory and database, embedding it if `vec` is None.
+
+        Returns the id the text is stored under: an existing document's id when
+        the text is a duplicate (nothing is written) or, in near-duplicate mode,
+        an edited copy (which replaces it).
+        """
+        if vec is None:
+            # Skip embedding texts that are already stored
+            existing = self.find_duplicate(text)
+            if existing is not None:
+                return existing
+            vec = self.embedder.embed(text)
+        vec = normalize(vec)
+        if vec.shape != (self.embedder.dim,):
+            raise ValueError(f"Expected a {self.embedder.dim}-dim vector, got shape {vec.shape}")
+        stored_as = self._write_docs([Doc(
+            id=id,
+            text=text,
+            vec=vec,
+            source=source,
+            filename=filename,
+            metadata=metadata or {}
+        )])
+        return stored_as.get(id, id)
+
+    def add_many(self, items: List[Dict[str, Any]]) -> List[str]:
+        """Add a batch of documents: one embedding pass, one transaction, one matrix update.
+
+        Each item has `text` and optionally `id`, `source`, `filename`, `metadata`
+        and a precomputed `vec`. Returns the stored document ids in input order
+        (duplicates map to the document they duplicate, as in add()).
+        Embedding happens before the write lock is taken.
+        """
+        missing = [i for i, item in enumerate(items) if item.get("vec") is None]
+        embedded = self.embedder.embed_many([items[i]["text"] for i in missing]) if missing else None
+        vecs = {i: embedded[j] for j, i in enumerate(missing)}
+
+        created_at = datetime.utcnow().isoformat()
+        docs = []
+        for i, item in enumerate(items):
+            vec = vecs[i] if i in vecs else normalize(item["vec"])
+            if vec.shape != (self.embedder.dim,):
+                raise ValueError(f"Expected a {self.embedder.dim}-dim vector, got shape {vec.shape}")
+            docs.append(Doc(
+                id=item.get("id") or str(uuid.uuid4()),
+                text=item["text"],
+                vec=vec,
+                source=item.get("source", "manual"),
+                filename=item.get("filename"),
+                created_at=created_at,
+                metadata=item.get("metadata") or {}
+            ))
+        stored_as = self._write_docs(docs)
+        return [stored_as.get(d.id, d.id) for d in docs]
+
+    def add_file(self, filename: Optional[str], chunks: List[Chunk], source: str = "file",
+                 metadata: Optional[Dict[str, Any]] = None,
+                 vecs: Optional[np.ndarray] = None, file_id: Optional[str] = None,
+                 content_hash: Optional[str] = None) -> Dict[str, Any]:
+        """Add an uploaded file as a parent row plus one document (and vector) per chunk.
+
+        `vecs` may hold precomputed chunk embeddings (e.g. from an ingestion worker).
+        With `content_hash` (of the file's extracted text), a file already stored
+        with the same hash is returned instead, marked `"duplicate": True`.
+        """
+        if content_hash is not None:
+            existing = self.find_file(content_hash)
+            if existing is not None:
+                return self._file_result(existing, duplicate=True)
+        file_id = file_id or str(uuid.uuid4())
+        created_at = datetime.utcnow().isoformat()
+        if vecs is None:
+            vecs = self.embedder.embed_many([c.text for c in chunks]) if chunks else []
+        docs = []
+        for index, (chunk, vec) in enumerate(zip(chunks, vecs)):
+            docs.append(Doc(
+                id=str(uuid.uuid4()),
+                text=chunk.text,
+                vec=vec,
+                source=source,
+                filename=filename,
+                created_at=created_at,
+                metadata={
+                    **(metadata or {}),
+                    "filename": filename,
+                    "page": chunk.page,
+                    "start": chunk.start,
+                    "end": chunk.end,
+                    "chunk_index": index,
+                    "chunk_count": len(chunks),
+                },
+                parent_id=file_id
+            ))
+        stored_as = self._write_docs(docs, file_row=(
+            file_id, filename, source, created_at, len(chunks),
+            max((c.end for c in chunks), default=0), json.dumps(metadata or {}), content_hash
         ))
-        conn.commit()
-        conn.close()
+        if file_id in stored_as:
+            # Another worker stored the same file first
+            return self._file_result(self.get_file(stored_as[file_id]), duplicate=True)
+        return {"id": file_id, "filename": filename, "chunk_count": len(docs)}
+
+    @staticmethod
+    def _file_result(file: Dict[str, Any], duplicate: bool = False) -> Dict[str, Any]:
+        return {"id": file["id"], "filename": file["filename"], "chunk_count": file["chunk_count"],
+                "duplicate": duplicate}
+
+    @_writes
+    def _write_docs(self, docs: List[Doc], file_row: Optional[tuple] = None) -> Dict[str, str]:
+        """Upsert documents (and an optional parent file row) in one transaction.
+
+        Vectors are written to the vector file before the commit so a committed
+        row always has its vector; they are restored if the commit fails.
+        Returns {input id: stored id} for documents (or the file) that turned
+        out to be duplicates.
+        """
+        conn = self.connection()
+        cursor = conn.cursor()
+        if file_row is not None and file_row[-1] is not None:
+            cursor.execute("SELECT id FROM files WHERE content_hash = ?", (file_row[-1],))
+            existing = cursor.fetchone()
+            if existing is not None:
+                return {file_row[0]: existing[0]}
+
+        # Later duplicates of an id win, like repeated single adds
+        docs = list({d.id: d for d in docs}.values())
+        docs, digests, signatures, stored_as = self._collapse_duplicates(docs)
+        start = n = len(self._ids)
+        rows = []
+        for doc in docs:
+            row = self._row_of.get(doc.id)
+            if row is None:
+                row, n = n, n + 1
+            rows.append(row)
+        rows = np.array(rows, dtype=np.int64)
+        replaced = rows[rows < start]
 
+        self.vectors.reserve(n)
+        previous = self.vectors.snapshot(replaced)
+        if docs:
+            self.vectors.write(rows, np.stack([d.vec for d in docs]))
+        try:
+            if file_row is not None:
+                cursor.execute("""
+                    INSERT INTO files (id, filename, source, created_at, chunk_count, char_count, metadata,
+                                       content_hash)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, file_row)
+            cursor.executemany(self._UPSERT_SQL, [
+                self._db_row(d, row, digests.get(d.id), signatures.get(d.id, 0))
+                for d, row in zip(docs, rows.tolist())
+            ])
+            conn.commit()
+        except Exception:
+            self.vectors.restore(replaced, previous)
+            raise
+
+        self.generation += 1
+        for doc, row in zip(docs, rows.tolist()):
+            if row >= start:
+                self._ids.append(doc.id)
+                self._row_of[doc.id] = row
+                self._set_source(row, doc.source)
+            else:
+                self._set_source(row, doc.source, previous=int(self._source_codes[row]))
+            self._filename_codes[row] = self._filename_code(doc.filename)
+            self._created[row] = _parse_time(doc.created_at)
+            self._simhashes[row] = signatures.get(doc.id, 0)
+        for row in replaced.tolist():
+            self.ann.add(row, self.vectors.read(row), n)
+        self.ann.add_many(np.arange(start, n), self.vectors.read(slice(start, n)), n)
+        self.keywords = None
+        self._maybe_train_ann()
+        return stored_as
+
+    def _collapse_duplicates(self, docs: List[Doc]):
+        """Drop standalone documents whose text is already stored and, in
+        near-duplicate mode, retarget edited copies at the document they copy.
+
+        Returns (docs to write, {id: content hash}, {id: SimHash}, {input id: stored id}).
+        Chunks of uploaded files are never collapsed.
+        """
+        digests = {d.id: content_hash(d.text) for d in docs if d.parent_id is None}
+        owners = self._hash_owners(list(set(digests.values())))
+        stored_as: Dict[str, str] = {}
+        kept = []
+        for doc in docs:
+            digest = digests.get(doc.id)
+            if digest is not None:
+                owner = owners.setdefault(digest, doc.id)
+                if owner != doc.id:
+                    stored_as[doc.id] = owner
+                    continue
+            kept.append(doc)
+
+        signatures = {d.id: simhash(d.text) for d in kept if d.parent_id is None}
+        if not self.near_duplicates:
+            return kept, digests, signatures, stored_as
+        collapsed: Dict[str, Doc] = {}
+        written: List[Tuple[int, str]] = []
+        for doc in kept:
+            signature = signatures.get(doc.id, 0)
+            target = self._near_duplicate(signature, written) if signature else None
+            if target is not None and target != doc.id:
+                # The edited copy replaces the original under the original's id
+                stored_as[doc.id] = target
+                digests[target] = digests[doc.id]
+                signatures[target] = signature
+                doc = replace(doc, id=target)
+            collapsed[doc.id] = doc
+            if signature:
+                written.append((signature, doc.id))
+        # Exact copies of a document that was itself folded into another
+        stored_as = {doc_id: stored_as.get(owner, owner) for doc_id, owner in stored_as.items()}
+        return list(collapsed.values()), digests, signatures, stored_as
+
+    def _hash_owners(self, digests: List[str]) -> Dict[str, str]:
+        """{content hash: id} for the stored documents among `digests`"""
+        owners: Dict[str, str] = {}
+        cursor = self.connection().cursor()
+        for start in range(0, len(digests), 500):
+            batch = digests[start:start + 500]
+            cursor.execute(f"""
+                SELECT content_hash, id FROM documents
+                WHERE content_hash IN ({", ".join("?" * len(batch))})
+            """, batch)
+            owners.update(cursor.fetchall())
+        return owners
+
+    def _near_duplicate(self, signature: int, pending: List[Tuple[int, str]]) -> Optional[str]:
+        """Id of the closest document within SIMHASH_DISTANCE bits of `signature`.
+
+        Checks stored rows with one vectorized popcount pass, then the (few)
+        documents earlier in the batch being written.
+        """
+        best_id, best = None, SIMHASH_DISTANCE + 1
+        n = len(self._ids)
+        if n:
+            stored = self._simhashes[:n]
+            distances = hamming_distances(stored, signature)
+            distances[stored == 0] = 64
+            row = int(np.argmin(distances))
+            if distances[row] < best:
+                best_id, best = self._ids[row], int(distances[row])
+        for other, doc_id in pending:
+            distance = bin(other ^ signature).count("1")
+            if distance < best:
+                best_id, best = doc_id, distance
+        return best_id
+
+    @_writes
     def delete(self, doc_id: str) -> bool:
-        """Delete document from both memory and database"""
-        # Remove from memory
-        self.docs = [d for d in self.docs if d.id != doc_id]
-        
-        # Remove from database
-        conn = sqlite3.connect(self.db_path)
+        """Delete document from both memory and database.
+
+        Deleting a chunk of an uploaded file updates the file's chunk count, and
+        removes the file once its last chunk is gone.
+        """
+        conn = self.connection()
         cursor = conn.cursor()
+        cursor.execute("SELECT parent_id FROM documents WHERE id = ?", (doc_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return False
         cursor.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
-        deleted = cursor.rowcount > 0
-        conn.commit()
-        conn.close()
-        return deleted
+        if row[0] is not None:
+            cursor.execute("UPDATE files SET chunk_count = chunk_count - 1 WHERE id = ?", (row[0],))
+            cursor.execute("DELETE FROM files WHERE id = ? AND chunk_count <= 0", (row[0],))
+        self._commit_removal(conn, [doc_id])
+        return True
+
+    @_writes
+    def delete_file(self, file_id: str) -> Optional[int]:
+        """Delete an uploaded file and all of its chunks; returns the chunk count, or None if not found"""
+        conn = self.connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM documents WHERE parent_id = ?", (file_id,))
+        chunk_ids = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SELECT 1 FROM files WHERE id = ?", (file_id,))
+        if cursor.fetchone() is None and not chunk_ids:
+            return None
+        cursor.execute("DELETE FROM documents WHERE parent_id = ?", (file_id,))
+        cursor.execute("DELETE FROM files WHERE id = ?", (file_id,))
+        self._commit_removal(conn, chunk_ids)
+        return len(chunk_ids)
+
+    def _commit_removal(self, conn: sqlite3.Connection, doc_ids: List[str]):
+        """Commit the pending deletes, compacting the removed rows out of the vector file.
+
+        Surviving rows from the tail of the matrix move into the holes (their
+        vec_row is updated in the same transaction), so rows stay 0..n-1.
+        """
+        n = len(self._ids)
+        removed = sorted({self._row_of[doc_id] for doc_id in doc_ids if doc_id in self._row_of})
+        keep = n - len(removed)
+        removed_set = set(removed)
+        holes = [row for row in removed if row < keep]
+        tail = [row for row in range(keep, n) if row not in removed_set]
+
+        previous = self.vectors.snapshot(holes)
+        self.vectors.copy_rows(tail, holes)
+        try:
+            conn.executemany("UPDATE documents SET vec_row = ? WHERE id = ?",
+                             [(dst, self._ids[src]) for src, dst in zip(tail, holes)])
+            conn.commit()
+        except Exception:
+            self.vectors.restore(holes, previous)
+            raise
+
+        self.generation += 1
+        for row in removed:
+            self.ann.remove(row, n)
+            del self._row_of[self._ids[row]]
+            self._source_counts[self._source_codes[row]] -= 1
+        for src, dst in zip(tail, holes):
+            moved = self._ids[src]
+            self._ids[dst] = moved
+            self._row_of[moved] = dst
+            self._move_columns(src, dst)
+            self.ann.move(src, dst)
+        del self._ids[keep:]
+        if removed:
+            self.keywords = None
+
+    def get_file(self, file_id: str) -> Optional[Dict[str, Any]]:
+        """Get an uploaded file's parent row, or None"""
+        return next((f for f in self.list_files(file_id=file_id)), None)
+
+    def list_files(self, file_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """List uploaded files (parent documents), newest first"""
+        conn = self.connection()
+        cursor = conn.cursor()
+        query = "SELECT id, filename, source, created_at, chunk_count, char_count, metadata FROM files"
+        if file_id is not None:
+            cursor.execute(query + " WHERE id = ?", (file_id,))
+        else:
+            cursor.execute(query + " ORDER BY created_at DESC")
+        rows = cursor.fetchall()
+        return [{
+            "id": file_id,
+            "filename": filename,
+            "source": source,
+            "created_at": created_at,
+            "chunk_count": chunk_count,
+            "char_count": char_count,
+            "metadata": json.loads(metadata_json) if metadata_json else {}
+        } for file_id, filename, source, created_at, chunk_count, char_count, metadata_json in rows]
+
+    def fts_search(self, query: str, limit: int = 10, prefix: bool = True) -> List[Dict[str, Any]]:
+        """Full-text search inside SQLite; returns ids and highlighted snippets, not full texts"""
+        if not self.fts_available:
+            raise RuntimeError("Full-text search is not available (SQLite built without FTS5)")
+        # Quote every token so user input can't inject FTS5 query syntax
+        terms = [f'"{t}"' + ("*" if prefix else "") for t in tokenize(query)]
+        if not terms or limit <= 0:
+            return []
+
+        conn = self.connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT d.id, d.source, d.filename, d.created_at,
+                   snippet(documents_fts, 0, '<mark>', '</mark>', '…', 16),
+                   snippet(documents_fts, 0, '', '', '…', 16),
+                   bm25(documents_fts)
+            FROM documents_fts
+            JOIN documents d ON d.rowid = documents_fts.rowid
+            WHERE documents_fts MATCH ?
+            ORDER BY bm25(documents_fts)
+            LIMIT ?
+        """, (" ".join(terms), limit))
+        rows = cursor.fetchall()
+        return [{
+            "id": doc_id,
+            "source": source,
+            "filename": filename,
+            "created_at": created_at,
+            "snippet": snippet,
+            "preview": preview,
+            # bm25() is negative (lower is better); squash it into 0..1
+            "score": -rank / (1 - rank),
+        } for doc_id, source, filename, created_at, snippet, preview, rank in rows]
+
+
+    def _fetch_docs(self, doc_ids: List[str]) -> Dict[str, Doc]:
+        """Load full documents for the given ids from SQLite (vectors come from the matrix)"""
+        docs: Dict[str, Doc] = {}
+        conn = self.connection()
+        cursor = conn.cursor()
+        # Stay under SQLite's default limit on bound parameters
+        for start in range(0, len(doc_ids), 500):
+            batch = doc_ids[start:start + 500]
+            cursor.execute(f"""
+                SELECT id, text, source, filename, created_at, metadata, parent_id
+                FROM documents WHERE id IN ({", ".join("?" * len(batch))})
+            """, batch)
+            for doc_id, text, source, filename, created_at, metadata_json, parent_id in cursor.fetchall():
+                row = self._row_of.get(doc_id)
+                docs[doc_id] = Doc(
+                    id=doc_id,
+                    text=text,
+                    vec=self.vectors.read(row) if row is not None else None,
+                    source=source,
+                    filename=filename,
+                    created_at=created_at,
+                    metadata=json.loads(metadata_json) if metadata_json else {},
+                    parent_id=parent_id
+                )
+        return docs
+
+    def _hydrate(self, ranked: List[Tuple[str, float]]) -> List[Tuple[Doc, float]]:
+        """Turn ranked (id, score) pairs into (Doc, score) pairs, keeping the order"""
+        docs = self._fetch_docs([doc_id for doc_id, _ in ranked])
+        return [(docs[doc_id], score) for doc_id, score in ranked if doc_id in docs]
+
+    def export_records(self, batch_size: int = 500) -> Iterator[List[Dict[str, Any]]]:
+        """The whole knowledge base as batches of export records, read from one snapshot.
+
+        Yields {"type": "file", "data": ...} records for uploaded files, then
+        {"type": "document", "data": ...} records with the float32 vector
+        base64-encoded. Rows are read with fetchmany on a private read-only
+        connection (batches may be pulled from different threads), so memory
+        stays flat however big the store is; close() the generator to stop early.
+        """
+        conn = sqlite3.connect(f"{Path(self.db_path).resolve().as_uri()}?mode=ro", uri=True,
+                               check_same_thread=False)
+        try:
+            # Files and documents come from the same snapshot
+            conn.execute("BEGIN")
+            cursor = conn.execute("""
+                SELECT id, filename, source, created_at, chunk_count, char_count, metadata, content_hash
+                FROM files ORDER BY rowid
+            """)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [{"type": "file", "data": {
+                    "id": file_id,
+                    "filename": filename,
+                    "source": source,
+                    "created_at": created_at,
+                    "chunk_count": chunk_count,
+                    "char_count": char_count,
+                    "metadata": json.loads(metadata_json) if metadata_json else {},
+                    "content_hash": digest
+                }} for file_id, filename, source, created_at, chunk_count, char_count, metadata_json, digest in rows]
+
+            cursor = conn.execute("""
+                SELECT id, text, vec, source, filename, created_at, metadata, parent_id
+                FROM documents ORDER BY rowid
+            """)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [{"type": "document", "data": {
+                    "id": doc_id,
+                    "text": text,
+                    "source": source,
+                    "filename": filename,
+                    "created_at": created_at,
+                    "metadata": json.loads(metadata_json) if metadata_json else {},
+                    "parent_id": parent_id,
+                    "vec": base64.b64encode(vec_blob).decode("ascii")
+                }} for doc_id, text, vec_blob, source, filename, created_at, metadata_json, parent_id in rows]
+        finally:
+            conn.close()
 
     def get_all(self) -> List[Dict[str, Any]]:
         """Get all documents with metadata"""
+        conn = self.connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, text, source, filename, created_at, metadata FROM documents ORDER BY rowid")
         return [{
-            "id": d.id,
-            "text": d.text,
-            "source": d.source,
-            "filename": d.filename,
-            "created_at": d.created_at,
-            "metadata": d.metadata,
-            "preview": d.text[:200] + "..." if len(d.text) > 200 else d.text
-        } for d in self.docs]
+            "id": doc_id,
+            "text": text,
+            "source": source,
+            "filename": filename,
+            "created_at": created_at,
+            "metadata": json.loads(metadata_json) if metadata_json else {},
+            "preview": text[:200] + "..." if len(text) > 200 else text
+        } for doc_id, text, source, filename, created_at, metadata_json in cursor.fetchall()]
+
+    @_reads
+    def stats(self) -> Dict[str, Any]:
+        """Document counts, overall and per source (kept up to date on every write)"""
+        return {
+            "total_documents": len(self._ids),
+            "by_source": {name: count for name, count in zip(self._source_names, self._source_counts) if count}
+        }
+
+    # Columns list_documents can return, and the keys it can sort by
+    _DOCUMENT_FIELDS = {
+        "id": "id",
+        "preview": "CASE WHEN length(text) > 100 THEN substr(text, 1, 100) || '...' ELSE text END",
+        "text": "text",
+        "source": "source",
+        "filename": "filename",
+        "created_at": "created_at",
+        "metadata": "metadata",
+        "parent_id": "parent_id",
+    }
+    _DOCUMENT_SORTS = {
+        "created_at": "created_at",
+        "filename": "COALESCE(filename, '')",
+        "source": "source",
+    }
+
+    def list_documents(self, limit: int = 50, cursor: Optional[str] = None,
+                       fields: Tuple[str, ...] = ("id", "preview"), sort: str = "created_at",
+                       order: str = "desc", search: Optional[str] = None,
+                       source: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """A page of documents ordered by (`sort`, id), plus the cursor of the next page (None after the last).
+
+        Pages are keyset-paginated in SQLite: the cursor holds the last row's
+        sort key and id, so every page is a range scan instead of an OFFSET that
+        re-reads all earlier rows. Only the requested `fields` are selected;
+        `search` matches words (by prefix) in the text or filename.
+        """
+        unknown = [f for f in fields if f not in self._DOCUMENT_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown field(s): {', '.join(unknown)} "
+                             f"(expected {', '.join(self._DOCUMENT_FIELDS)})")
+        if sort not in self._DOCUMENT_SORTS:
+            raise ValueError(f"Unknown sort: {sort} (expected {', '.join(self._DOCUMENT_SORTS)})")
+        if order not in ("asc", "desc"):
+            raise ValueError(f"Unknown order: {order} (expected asc or desc)")
+        sort_key = self._DOCUMENT_SORTS[sort]
+
+        where, params = [], []
+        if source is not None:
+            where.append("source = ?")
+            params.append(source)
+        if search:
+            terms = [f'"{t}"*' for t in tokenize(search)]
+            if not terms:
+                return [], None
+            if self.fts_available:
+                where.append("rowid IN (SELECT rowid FROM documents_fts WHERE documents_fts MATCH ?)")
+                params.append(" AND ".join(terms))
+            else:
+                where.append("(text LIKE ? ESCAPE '\\' OR filename LIKE ? ESCAPE '\\')")
+                pattern = "%" + search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                params += [pattern, pattern]
+        if cursor is not None:
+            last_key, last_id = self._decode_cursor(cursor)
+            where.append(f"({sort_key}, id) {'<' if order == 'desc' else '>'} (?, ?)")
+            params += [last_key, last_id]
+
+        direction = order.upper()
+        conn = self.connection()
+        db_cursor = conn.cursor()
+        db_cursor.execute(f"""
+            SELECT {", ".join(self._DOCUMENT_FIELDS[f] for f in fields)}, {sort_key}, id
+            FROM documents
+            {"WHERE " + " AND ".join(where) if where else ""}
+            ORDER BY {sort_key} {direction}, id {direction}
+            LIMIT ?
+        """, (*params, limit + 1))
+        rows = db_cursor.fetchall()
 
-    def search(self, qvec: np.ndarray, k: int = 5):
-        if not self.docs:
+        page = []
+        for row in rows[:limit]:
+            doc = dict(zip(fields, row))
+            if "metadata" in doc:
+                doc["metadata"] = json.loads(doc["metadata"]) if doc["metadata"] else {}
+            page.append(doc)
+        next_cursor = self._encode_cursor(rows[limit - 1][-2:]) if len(rows) > limit and limit > 0 else None
+        return page, next_cursor
+
+    @staticmethod
+    def _encode_cursor(key: tuple) -> str:
+        return base64.urlsafe_b64encode(json.dumps(list(key)).encode("utf-8")).decode("ascii")
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> Tuple[Any, str]:
+        try:
+            last_key, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        except (ValueError, TypeError):
+            raise ValueError("Invalid cursor")
+        return last_key, last_id
+
+    @_reads
+    def search(self, qvec: np.ndarray, k: int = 5, mode: str = "exact",
+               nprobe: Optional[int] = None, filters: Optional[QueryFilter] = None,
+               mmr_lambda: Optional[float] = None, fetch_k: Optional[int] = None):
+        """Top-k documents by cosine similarity.
+
+        mode="exact" scans every vector; mode="ann" only scores the documents in
+        the `nprobe` nearest IVF lists (falls back to exact until the index is trained).
+        With `filters`, only matching documents are scored. With `mmr_lambda`,
+        the top `fetch_k` are reranked for diversity (see _mmr).
+        """
+        pool = self._mmr_pool(k, mmr_lambda, fetch_k)
+        ranked = self._search(qvec, pool, mode, nprobe, self._filter_mask(filters))
+        if mmr_lambda is not None:
+            ranked = self._mmr(ranked, qvec, k, mmr_lambda)
+        return self._hydrate(ranked)
+
+    def _search(self, qvec: np.ndarray, k: int, mode: str, nprobe: Optional[int],
+                mask: Optional[np.ndarray] = None) -> List[Tuple[str, float]]:
+        n = len(self._ids)
+        if not n or k <= 0:
+            return []
+        qvec = normalize(qvec)
+        subset = np.flatnonzero(mask) if mask is not None else None
+        if subset is not None and not len(subset):
             return []
-        sims = [float(qvec @ d.vec / (np.linalg.norm(qvec) * np.linalg.norm(d.vec) + 1e-9)) for d in self.docs]
-        topk = np.argsort(sims)[::-1][:k]
-        return [(self.docs[i], sims[i]) for i in topk]
+        if mode == "ann" and self.ann.trained:
+            rows = self.ann.candidates(qvec, nprobe)
+            if subset is not None:
+                # Scan the filtered subset itself when it's smaller than the probed
+                # lists, or when too few of their rows pass the filter
+                matching = rows[mask[rows]]
+                rows = subset if len(subset) <= len(rows) or len(matching) < k else matching
+        elif mode in ("exact", "ann"):
+            rows = subset
+        else:
+            raise ValueError(f"Unknown search mode: {mode}")
+
+        sims = self.vectors.scores(qvec, n, rows)
+        fetch_k = k * self._RESCORE_FACTOR if self.rescore else k
+        top = self._top_k(sims, fetch_k)
+        ranked = [(self._ids[i if rows is None else rows[i]], float(sims[i])) for i in top]
+        return self._rescore(ranked, qvec, k) if self.rescore else ranked
+
+    def _rescore(self, ranked: List[Tuple[str, float]], qvec: np.ndarray, k: int) -> List[Tuple[str, float]]:
+        """Re-rank quantized-search candidates with their exact float32 vectors from SQLite"""
+        exact = {doc_id: float(vec @ qvec) for doc_id, vec in self._float32_vectors([d for d, _ in ranked]).items()}
+        rescored = [(doc_id, exact.get(doc_id, score)) for doc_id, score in ranked]
+        rescored.sort(key=lambda item: item[1], reverse=True)
+        return rescored[:k]
+
+    def _float32_vectors(self, doc_ids: List[str]) -> Dict[str, np.ndarray]:
+        """Exact stored vectors for `doc_ids`, read from SQLite"""
+        vecs: Dict[str, np.ndarray] = {}
+        cursor = self.connection().cursor()
+        for start in range(0, len(doc_ids), 500):
+            batch = doc_ids[start:start + 500]
+            cursor.execute(f"SELECT id, vec FROM documents WHERE id IN ({', '.join('?' * len(batch))})", batch)
+            for doc_id, vec_blob in cursor.fetchall():
+                vecs[doc_id] = normalize(np.frombuffer(vec_blob, dtype=np.float32))
+        return vecs
+
+    def _keyword_search(self, text: str, k: int,
+                        mask: Optional[np.ndarray] = None) -> List[Tuple[str, float]]:
+        """Top-k (id, BM25 score) pairs, ranked by FTS5 inside SQLite when available.
+
+        With a row `mask`, matches are read in rank order until k of them pass it.
+        """
+        if not self.fts_available:
+            if mask is None:
+                return self._bm25_index().search(text, k=k)
+            ranked = self._bm25_index().search(text, k=len(self._ids))
+            return [(doc_id, score) for doc_id, score in ranked if mask[self._row_of[doc_id]]][:k]
+        terms = [f'"{t}"' for t in tokenize(text)]
+        if not terms or k <= 0:
+            return []
+        conn = self.connection()
+        cursor = conn.cursor()
+        sql = """
+            SELECT d.id, d.vec_row, documents_fts.rank
+            FROM documents_fts
+            JOIN documents d ON d.rowid = documents_fts.rowid
+            WHERE documents_fts MATCH ?
+            ORDER BY documents_fts.rank
+        """
+        if mask is None:
+            cursor.execute(sql + " LIMIT ?", (" OR ".join(terms), k))
+        else:
+            cursor.execute(sql, (" OR ".join(terms),))
+        # FTS5's rank is bm25() negated (lower is better)
+        ranked = []
+        for doc_id, row, rank in cursor:
+            if mask is None or mask[row]:
+                ranked.append((doc_id, -rank))
+                if len(ranked) == k:
+                    break
+        return ranked
 
+    def _filter_mask(self, filters: Optional[QueryFilter]) -> Optional[np.ndarray]:
+        """Boolean mask over rows 0..n-1 of the documents matching `filters` (None for no filter).
+
+        Source, filename and creation time are compared against the in-memory
+        columns; file and metadata filters use row sets read from SQLite, cached
+        until the next write.
+        """
+        if filters is None or filters.is_empty():
+            return None
+        n = len(self._ids)
+        mask = np.ones(n, dtype=bool)
+        if filters.source is not None:
+            codes = [self._source_index[s] for s in filters.source if s in self._source_index]
+            mask &= np.isin(self._source_codes[:n], codes)
+        if filters.filename is not None:
+            mask &= self._filename_codes[:n] == self._filename_index.get(filters.filename, -2)
+        for bound, keep in ((filters.created_after, np.greater_equal), (filters.created_before, np.less)):
+            if bound is None:
+                continue
+            when = _parse_time(bound)
+            if np.isnat(when):
+                raise ValueError(f"Invalid timestamp: {bound}")
+            mask &= keep(self._created[:n], when)
+        if filters.file_id is not None:
+            mask[~self._filter_rows("parent_id = ?", (filters.file_id,), n)] = False
+        for key, value in (filters.metadata or {}).items():
+            path = '$."' + key.replace('"', '') + '"'
+            if value is None:
+                condition, params = "json_extract(metadata, ?) IS NULL", (path,)
+            elif isinstance(value, (dict, list)):
+                condition, params = "json_extract(metadata, ?) = json(?)", (path, json.dumps(value))
+            else:
+                condition, params = "json_extract(metadata, ?) = ?", (path, int(value) if isinstance(value, bool) else value)
+            mask[~self._filter_rows(condition, params, n)] = False
+        return mask
+
+    def _filter_rows(self, condition: str, params: tuple, n: int) -> np.ndarray:
+        """Mask of the rows whose documents match an SQL condition"""
+        key = (condition, params, self.generation)
+        rows = self._filter_cache.get(key)
+        if rows is None:
+            cursor = self.connection().cursor()
+            cursor.execute(f"SELECT vec_row FROM documents WHERE {condition}", params)
+            rows = np.zeros(n, dtype=bool)
+            rows[np.array([row for row, in cursor.fetchall() if row is not None], dtype=np.int64)] = True
+            self._filter_cache.put(key, rows)
+        return rows
+
+    def _bm25_index(self) -> BM25Index:
+        """In-memory BM25 fallback for SQLite builds without FTS5, rebuilt on first use after a write"""
+        keywords = self.keywords
+        if keywords is None:
+            keywords = BM25Index()
+            conn = self.connection()
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, text FROM documents")
+            for doc_id, text in cursor.fetchall():
+                keywords.add(doc_id, text)
+            self.keywords = keywords
+        return keywords
+
+    def query(self, text: str, k: int = 5, mode: str = "exact", nprobe: Optional[int] = None,
+              filters: Optional[QueryFilter] = None, mmr_lambda: Optional[float] = None,
+              fetch_k: Optional[int] = None):
+        """Top-k documents for a text query.
+
+        Modes: "exact"/"ann" (vector), "bm25" (keyword) or "hybrid", which fuses
+        the vector and BM25 rankings with reciprocal-rank fusion. `filters`
+        restricts every mode to the matching documents. With `mmr_lambda`, the
+        mode's top `fetch_k` results are reranked with Maximal Marginal
+        Relevance so near-identical chunks don't crowd out the rest.
+        """
+        return self.hydrate(self.rank(text, k, mode, nprobe, filters, mmr_lambda, fetch_k))
+
+    def rank(self, text: str, k: int = 5, mode: str = "exact", nprobe: Optional[int] = None,
+             filters: Optional[QueryFilter] = None, mmr_lambda: Optional[float] = None,
+             fetch_k: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Ranked (id, score) pairs for a text query, without loading the documents.
+
+        Takes the same arguments as query(); pass the result to hydrate() (whole
+        or in batches). Rankings are cached until the next write.
+        """
+        if mode not in ("exact", "ann", "bm25", "hybrid"):
+            raise ValueError(f"Unknown search mode: {mode}")
+        pool = self._mmr_pool(k, mmr_lambda, fetch_k)
+        # Every mode only sees the query's tokens, so equal token lists share entries
+        normalized = " ".join(tokenize(text))
+        query_hash = hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+        # Writes bump the generation, so results cached before them are never hit again
+        result_key = (query_hash, k, mode, nprobe, filters.cache_key() if filters is not None else None,
+                      mmr_lambda, pool, self.generation)
+        ranked = self._result_cache.get(result_key)
+        if ranked is not None:
+            return list(ranked)
+
+        # Embed before taking the read lock; it only depends on the text
+        qvec = None
+        if mode != "bm25" or mmr_lambda is not None:
+            qvec = self._embed_cache.get(query_hash)
+            if qvec is None:
+                qvec = self.embedder.embed(text)
+                self._embed_cache.put(query_hash, qvec)
+        ranked = self._rank(text, qvec, k, mode, nprobe, filters, mmr_lambda, pool)
+        self._result_cache.put(result_key, tuple(ranked))
+        return ranked
+
+    @_reads
+    def hydrate(self, ranked: List[Tuple[str, float]]) -> List[Tuple[Doc, float]]:
+        """(Doc, score) pairs for ranked (id, score) pairs, skipping documents deleted since"""
+        return self._hydrate(ranked)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters of the query embedding and result caches"""
+        return {
+            "embeddings": self._embed_cache.stats(),
+            "results": self._result_cache.stats(),
+        }
+
+    @_reads
+    def _rank(self, text: str, qvec: Optional[np.ndarray], k: int, mode: str,
+              nprobe: Optional[int], filters: Optional[QueryFilter] = None,
+              mmr_lambda: Optional[float] = None, pool: Optional[int] = None) -> List[Tuple[str, float]]:
+        mask = self._filter_mask(filters)
+        # Candidates for the MMR stage, or just the top k
+        pool = pool or k
+        if mode in ("exact", "ann"):
+            ranked = self._search(qvec, pool, mode, nprobe, mask)
+        elif mode == "bm25":
+            ranked = self._keyword_search(text, pool, mask)
+        else:
+            fetch_k = max(pool * 4, 50)
+            vector_ids = [doc_id for doc_id, _ in self._search(qvec, fetch_k, "exact", None, mask)]
+            keyword_ids = [doc_id for doc_id, _ in self._keyword_search(text, fetch_k, mask)]
+            ranked = reciprocal_rank_fusion([vector_ids, keyword_ids], k=pool)
+        if mmr_lambda is not None:
+            ranked = self._mmr(ranked, qvec, k, mmr_lambda)
+        return ranked
+
+    @staticmethod
+    def _mmr_pool(k: int, mmr_lambda: Optional[float], fetch_k: Optional[int]) -> int:
+        """How many candidates to rank before the (optional) MMR stage picks k"""
+        if mmr_lambda is None:
+            return k
+        if not 0.0 <= mmr_lambda <= 1.0:
+            raise ValueError(f"MMR lambda must be between 0 and 1, got {mmr_lambda}")
+        return max(fetch_k or max(k * 4, 20), k)
+
+    def _mmr(self, ranked: List[Tuple[str, float]], qvec: np.ndarray, k: int,
+             mmr_lambda: float) -> List[Tuple[str, float]]:
+        """Pick k of the ranked candidates by Maximal Marginal Relevance.
+
+        Each step takes the candidate maximizing
+        lambda * sim(query, d) - (1 - lambda) * max(sim(d, already picked)),
+        using the stored vectors; lambda=1 keeps the relevance order, lower
+        values favour diversity. Candidates keep their original scores.
+        """
+        if len(ranked) <= 1 or k <= 0:
+            return ranked[:k]
+        rows = np.array([self._row_of[doc_id] for doc_id, _ in ranked], dtype=np.int64)
+        vecs = self.vectors.read(rows)
+        relevance = vecs @ normalize(qvec)
+        similarity = vecs @ vecs.T
+        redundancy = np.zeros(len(ranked), dtype=np.float32)
+        available = np.ones(len(ranked), dtype=bool)
+        picked = []
+        for _ in range(min(k, len(ranked))):
+            scores = np.where(available, mmr_lambda * relevance - (1 - mmr_lambda) * redundancy, -np.inf)
+            best = int(np.argmax(scores))
+            picked.append(best)
+            available[best] = False
+            redundancy = similarity[best] if len(picked) == 1 else np.maximum(redundancy, similarity[best])
+        return [ranked[i] for i in picked]
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        """Indices of the k highest scores, best first"""
+        if k < len(scores):
+            top = np.argpartition(-scores, k - 1)[:k]
+            return top[np.argsort(-scores[top])]
+        return np.argsort(-scores)
+
+    @_reads
+    def ann_recall(self, queries: List[np.ndarray], k: int = 10,
+                   nprobe: Optional[int] = None) -> Dict[str, Any]:
+        """Measure ANN recall@k and latency against exact search for the given query vectors"""
+        import time
+
+        recalls = []
+        exact_time = ann_time = 0.0
+        for qvec in queries:
+            start = time.perf_counter()
+            exact = {doc_id for doc_id, _ in self._search(qvec, k, "exact", None)}
+            exact_time += time.perf_counter() - start
+            start = time.perf_counter()
+            approx = {doc_id for doc_id, _ in self._search(qvec, k, "ann", nprobe)}
+            ann_time += time.perf_counter() - start
+            if exact:
+                recalls.append(len(exact & approx) / len(exact))
+        count = max(len(queries), 1)
+        return {
+            "documents": len(self._ids),
+            "k": k,
+            "nlist": self.ann.nlist,
+            "nprobe": min(nprobe or self.ann.nprobe, self.ann.nlist),
+            "trained": self.ann.trained,
+            "recall_at_k": float(np.mean(recalls)) if recalls else 0.0,
+            "exact_ms": exact_time / count * 1000,
+            "ann_ms": ann_time / count * 1000,
+        }
+
+    @_reads
+    def vector_stats(self) -> Dict[str, Any]:
+        """Vector storage mode, memory footprint and estimated search recall"""
+        n = len(self._ids)
+        stats = {
+            "mode": self.vectors.mode,
+            "rescore": self.rescore,
+            "dim": self.embedder.dim,
+            "vectors": n,
+            "bytes_per_vector": self.vectors.bytes_per_vector,
+            "vector_bytes": n * self.vectors.bytes_per_vector,
+            "float32_bytes": n * self.embedder.dim * 4,
+            "mapped_bytes": self.vectors.capacity * self.vectors.bytes_per_vector,
+        }
+        cached = self._recall_cache
+        if cached is None or cached[0] != self.generation:
+            cached = (self.generation, self._estimate_recall())
+            self._recall_cache = cached
+        stats["recall"] = cached[1]
+        return stats
+
+    def _estimate_recall(self, k: int = 10) -> Dict[str, Any]:
+        """Recall@k of quantized (and rescored) search against float32 on a random sample.
+
+        Stored vectors from the sample serve as queries against the rest of the
+        sample, so no full float32 copy of the collection is ever loaded.
+        """
+        n = len(self._ids)
+        if self.vectors.mode == "float32" or n <= k:
+            return {"k": k, "sample": n, "recall_at_k": 1.0, "rescored_recall_at_k": 1.0}
+        rng = np.random.default_rng(0)
+        rows = np.sort(rng.choice(n, size=min(n, self._RECALL_SAMPLE), replace=False))
+        exact_by_id = self._float32_vectors([self._ids[r] for r in rows.tolist()])
+        rows = np.array([r for r in rows.tolist() if self._ids[r] in exact_by_id], dtype=np.int64)
+        exact = np.stack([exact_by_id[self._ids[r]] for r in rows.tolist()])
+        approx = self.vectors.read(rows)
+
+        recalls, rescored = [], []
+        for q in rng.choice(len(rows), size=min(len(rows), self._RECALL_QUERIES), replace=False).tolist():
+            true_sims = exact @ exact[q]
+            # Count a hit for anything scoring at least the true k-th score, so ties don't count as misses
+            threshold = true_sims[self._top_k(true_sims, k)[-1]] - 1e-6
+            sims = approx @ exact[q]
+            recalls.append(float(np.mean(true_sims[self._top_k(sims, k)] >= threshold)))
+            candidates = self._top_k(sims, k * self._RESCORE_FACTOR)
+            best = candidates[self._top_k(true_sims[candidates], k)]
+            rescored.append(float(np.mean(true_sims[best] >= threshold)))
+        return {
+            "k": k,
+            "sample": len(rows),
+            "recall_at_k": float(np.mean(recalls)),
+            "rescored_recall_at_k": float(np.mean(rescored)),
+        }
+
+    @_writes
+    def save_index(self):
+        """Flush pending IVF index updates and the vector file to disk"""
+        self.ann.save(len(self._ids))
+        self.vectors.flush()
+
+    @_writes
     def clear(self):
         """Clear all documents"""
-        self.docs = []
-        conn = sqlite3.connect(self.db_path)
+        conn = self.connection()
         cursor = conn.cursor()
         cursor.execute("DELETE FROM documents")
+        cursor.execute("DELETE FROM files")
         conn.commit()
-        conn.close()
+        self.generation += 1
+        self._ids = []
+        self._row_of = {}
+        self._reset_columns(self._INITIAL_CAPACITY)
+        self.vectors.reset(self._INITIAL_CAPACITY)
+        self.ann.clear()
+        self.keywords = None
 
 
-STORE = TinyStore()
+# Opened on first use rather than at import, so the backend starts without
+# touching the knowledge base
+_store: Optional[TinyStore] = None
+_store_lock = threading.Lock()
 
 
-# Embeddings: simple bag-of-words toy to avoid external deps. Replace with real embeddings as needed.
+# Embeddings: fixed-width hashing-trick vectors (see tools/embeddings.py) so every
+# stored vector lives in the same space as every query.
 def embed(text: str) -> np.ndarray:
-    """Create a simple embedding from text"""
-    tokens = text.lower().split()
-    vocab = {}
-    for t in tokens:
-        vocab[t] = vocab.get(t, 0) + 1
-    vec = np.array([v for _, v in sorted(vocab.items())], dtype=float)
-    if vec.size == 0:
-        vec = np.zeros(1)
-    return vec
+    """Create an embedding from text with the process-wide embedder"""
+    return get_embedder().embed(text)
 
 
 # API functions for the agent
-async def rag_add(id: str, text: str, source: str = "manual", 
+async def rag_add(id: str, text: str, source: str = "manual",
                   filename: Optional[str] = None) -> Dict[str, Any]:
     """Add a document to the knowledge base"""
     if not id:
         id = str(uuid.uuid4())
-    STORE.add(id, text, embed(text), source=source, filename=filename)
-    return {"status": "ok", "id": id, "count": len(STORE.docs)}
+    store = await run_in_store_pool(get_store)
+    # Text that is already stored isn't embedded or written again
+    stored_id = await run_in_store_pool(store.add, id, text, source=source, filename=filename)
+    return {"status": "ok", "id": stored_id, "duplicate": stored_id != id, "count": len(store)}
 
 
-async def rag_query(query: str, k: int = 5) -> Dict[str, Any]:
-    """Query the knowledge base"""
-    results = STORE.search(embed(query), k=k)
+async def rag_query(query: str, k: int = 5, mode: str = "hybrid", source: Optional[str] = None,
+                    filename: Optional[str] = None, created_after: Optional[str] = None,
+                    created_before: Optional[str] = None,
+                    metadata: Optional[Dict[str, Any]] = None,
+                    mmr_lambda: Optional[float] = None,
+                    fetch_k: Optional[int] = None) -> Dict[str, Any]:
+    """Query the knowledge base.
+
+    mode: "hybrid" (keyword + vector, best for short notes), "bm25" (keyword),
+    "exact" (vector) or "ann" (approximate vector search).
+    Optional filters: source ("manual", "file", "selection"), filename,
+    created_after / created_before (ISO 8601 timestamps) and metadata
+    (exact values for metadata keys, e.g. {"page": 3}).
+    mmr_lambda (0-1) reranks the top fetch_k results for diversity so that
+    near-identical chunks don't fill every slot (e.g. 0.5).
+    """
+    store = await run_in_store_pool(get_store)
+    try:
+        filters = QueryFilter(source=source, filename=filename, created_after=created_after,
+                              created_before=created_before, metadata=metadata)
+        results = await run_in_store_pool(store.query, query, k=k, mode=mode, filters=filters,
+                                          mmr_lambda=mmr_lambda, fetch_k=fetch_k)
+    except ValueError as e:
+        # Bad arguments from the model (unknown mode, unparseable date, ...);
+        # report them so it can retry instead of failing the whole turn
+        return {"status": "error", "error": str(e)}
     return {
         "matches": [{
             "id": d.id,
@@ -221,6 +1640,7 @@ async def rag_query(query: str, k: int = 5) -> Dict[str, Any]:
             "text": d.text,
             "source": d.source,
             "filename": d.filename,
+            "page": d.metadata.get("page"),
             "preview": d.text[:200] + "..." if len(d.text) > 200 else d.text
         } for d, s in results]
     }
@@ -228,9 +1648,21 @@ async def rag_query(query: str, k: int = 5) -> Dict[str, Any]:
 
 # Export store for direct access
 def get_store() -> TinyStore:
-    """Get the global store instance"""
-    return STORE
+    """Get the global store instance, opening it on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = TinyStore()
+    return _store
+
+
+def set_store(store: TinyStore):
+    """Replace the global store (e.g. with one on a scratch database)"""
+    global _store
+    with _store_lock:
+        _store = store
 
 
 RagAddTool = FunctionTool(func=rag_add)
-RagQueryTool = FunctionTool(func=rag_query)
\ No newline at end of file
+RagQueryTool = FunctionTool(func=rag_query)
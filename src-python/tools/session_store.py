@@ -0,0 +1,365 @@
+"""
+Persistent agent sessions in SQLite.
+
+SQLiteSessionService writes every session, event and piece of app/user state
+to sessions.db in the app data dir, so conversations survive backend
+restarts. Only the hot tail of recently used sessions stays in memory
+(BoundedSessionService's LRU/TTL limits decide which); an evicted session is
+loaded back from disk the next time it is used.
+
+Once a session holds more than max_events events, its oldest turns are
+compacted: they are folded into a short plain-text summary (each turn's
+request, tools used and reply, truncated) that is kept on the session row and
+shown to the agent as the first event of the session, and their rows are
+deleted. Prompt size and storage per session therefore stay bounded however
+long the conversation runs.
+"""
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import json
+import logging
+import os
+import sqlite3
+import time
+
+from google.adk.events.event import Event
+from google.adk.sessions.base_session_service import (
+    GetSessionConfig,
+    ListEventsResponse,
+    ListSessionsResponse,
+)
+from google.adk.sessions.session import Session
+from google.adk.sessions.state import State
+from google.genai import types
+
+from tools.sessions import (
+    MAX_SESSION_EVENTS,
+    MAX_SESSIONS,
+    SESSION_TTL,
+    BoundedSessionService,
+    SessionKey,
+)
+
+logger = logging.getLogger("pointer.session_store")
+
+# Longest compacted summary kept per session; the oldest lines go first
+SUMMARY_CHARS = int(os.environ.get("POINTER_SESSION_SUMMARY_CHARS", 4000))
+# Sessions untouched this many days are deleted from disk at startup (0 keeps them)
+RETENTION_DAYS = float(os.environ.get("POINTER_SESSION_RETENTION_DAYS", 30))
+
+# Marks the synthetic event that carries a session's summary
+SUMMARY_INVOCATION_ID = "session-summary"
+_SUMMARY_HEADER = "Summary of earlier turns in this conversation:\n"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT '{}',
+    summary TEXT,
+    last_update_time REAL NOT NULL,
+    PRIMARY KEY (app_name, user_id, id)
+);
+CREATE TABLE IF NOT EXISTS session_events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    event_id TEXT NOT NULL,
+    event TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_session_events_session
+    ON session_events(app_name, user_id, session_id, seq);
+CREATE TABLE IF NOT EXISTS app_states (
+    app_name TEXT PRIMARY KEY,
+    state TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS user_states (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (app_name, user_id)
+);
+"""
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+def _event_text(event: Event) -> str:
+    if not event.content or not event.content.parts:
+        return ""
+    return " ".join(part.text for part in event.content.parts if part.text)
+
+
+def summarize_turns(events: List[Event]) -> List[str]:
+    """One line per user turn: the request, the tools called and the final reply"""
+    lines = []
+    request, tools, reply = None, [], ""
+
+    def flush():
+        if request is not None or reply:
+            line = f"- User: {_clip(request or '', 200)}"
+            if tools:
+                line += f" | Tools: {', '.join(dict.fromkeys(tools))}"
+            if reply:
+                line += f" | Pointer: {_clip(reply, 300)}"
+            lines.append(line)
+
+    for event in events:
+        if event.author == "user":
+            flush()
+            request, tools, reply = _event_text(event), [], ""
+            continue
+        tools.extend(call.name for call in event.get_function_calls() if call.name)
+        text = _event_text(event)
+        if text:
+            reply = text
+    flush()
+    return lines
+
+
+class SQLiteSessionService(BoundedSessionService):
+    """BoundedSessionService backed by SQLite, with old turns compacted into a summary."""
+
+    def __init__(self, db_path: Optional[str] = None, max_sessions: int = MAX_SESSIONS,
+                 ttl: float = SESSION_TTL, max_events: int = MAX_SESSION_EVENTS,
+                 summary_chars: int = SUMMARY_CHARS, retention_days: float = RETENTION_DAYS):
+        super().__init__(max_sessions=max_sessions, ttl=ttl, max_events=max_events)
+        if db_path is None:
+            from tools.rag import _get_data_dir
+            db_path = str(_get_data_dir() / "sessions.db")
+        self.db_path = db_path
+        self.summary_chars = summary_chars
+        self.compactions = 0
+        self.loads = 0
+
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        # Session service calls are synchronous and serialized by self._lock
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.executescript(_SCHEMA)
+            if retention_days > 0:
+                self._prune(time.time() - retention_days * 86400)
+
+        for app_name, state in self._conn.execute("SELECT app_name, state FROM app_states"):
+            self.app_state[app_name] = json.loads(state)
+        for app_name, user_id, state in self._conn.execute(
+                "SELECT app_name, user_id, state FROM user_states"):
+            self.user_state.setdefault(app_name, {})[user_id] = json.loads(state)
+        logger.info(f"💾 Agent sessions stored in {db_path}")
+
+    def _prune(self, cutoff: float):
+        stale = self._conn.execute(
+            "SELECT app_name, user_id, id FROM sessions WHERE last_update_time < ?", (cutoff,)
+        ).fetchall()
+        for key in stale:
+            self._delete_rows(key)
+        if stale:
+            logger.info(f"🧹 Deleted {len(stale)} agent session(s) idle since before the retention window")
+
+    def _delete_rows(self, key: SessionKey):
+        self._conn.execute(
+            "DELETE FROM session_events WHERE app_name = ? AND user_id = ? AND session_id = ?", key
+        )
+        self._conn.execute("DELETE FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?", key)
+
+    def create_session(self, *, app_name: str, user_id: str,
+                       state: Optional[Dict[str, Any]] = None,
+                       session_id: Optional[str] = None) -> Session:
+        with self._lock:
+            session = super().create_session(
+                app_name=app_name, user_id=user_id, state=state, session_id=session_id
+            )
+            key = (app_name, user_id, session.id)
+            with self._conn:
+                # Creating over an existing id starts that session afresh
+                self._delete_rows(key)
+                self._conn.execute(
+                    "INSERT INTO sessions (app_name, user_id, id, state, last_update_time) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (*key, json.dumps(state or {}, default=str), session.last_update_time)
+                )
+            return session
+
+    def get_session(self, *, app_name: str, user_id: str, session_id: str,
+                    config: Optional[GetSessionConfig] = None) -> Optional[Session]:
+        key = (app_name, user_id, session_id)
+        with self._lock:
+            if self._is_expired(key, time.time()):
+                # Idle sessions only leave memory; they are still on disk
+                self._drop(key)
+                self.expired += 1
+            if self._stored(key) is None and not self._load(key):
+                return None
+            return super().get_session(
+                app_name=app_name, user_id=user_id, session_id=session_id, config=config
+            )
+
+    def _load(self, key: SessionKey) -> bool:
+        """Bring a session from disk into memory; False if there is no such session"""
+        row = self._conn.execute(
+            "SELECT state, summary, last_update_time FROM sessions "
+            "WHERE app_name = ? AND user_id = ? AND id = ?", key
+        ).fetchone()
+        if row is None:
+            return False
+        state, summary, last_update_time = row
+        app_name, user_id, session_id = key
+        events, sizes = [], deque()
+        if summary:
+            summary_event = self._summary_event(summary, last_update_time)
+            events.append(summary_event)
+            sizes.append(len(summary))
+        for (event_json,) in self._conn.execute(
+                "SELECT event FROM session_events WHERE app_name = ? AND user_id = ? AND session_id = ? "
+                "ORDER BY seq", key):
+            events.append(Event.model_validate_json(event_json))
+            sizes.append(len(event_json))
+
+        session = Session(app_name=app_name, user_id=user_id, id=session_id,
+                          state=json.loads(state), events=events, last_update_time=last_update_time)
+        self.sessions.setdefault(app_name, {}).setdefault(user_id, {})[session_id] = session
+        self._touch(key)
+        self._event_bytes[key] = sizes
+        self.loads += 1
+        self._trim(key, session)
+        self._evict_over_limit()
+        return True
+
+    def list_sessions(self, *, app_name: str, user_id: str) -> ListSessionsResponse:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, last_update_time FROM sessions WHERE app_name = ? AND user_id = ? "
+                "ORDER BY last_update_time DESC", (app_name, user_id)
+            ).fetchall()
+        return ListSessionsResponse(sessions=[
+            Session(app_name=app_name, user_id=user_id, id=session_id, last_update_time=updated)
+            for session_id, updated in rows
+        ])
+
+    def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        with self._lock:
+            super().delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+            with self._conn:
+                self._delete_rows((app_name, user_id, session_id))
+
+    def list_events(self, *, app_name: str, user_id: str, session_id: str) -> ListEventsResponse:
+        """Stored events, oldest first (compacted turns are only in the summary)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT event FROM session_events WHERE app_name = ? AND user_id = ? AND session_id = ? "
+                "ORDER BY seq", (app_name, user_id, session_id)
+            ).fetchall()
+        return ListEventsResponse(events=[Event.model_validate_json(event) for event, in rows])
+
+    def append_event(self, session: Session, event: Event) -> Event:
+        with self._lock:
+            # Memory first: a compaction it triggers never includes this event
+            super().append_event(session=session, event=event)
+            if event.partial:
+                return event
+            key = (session.app_name, session.user_id, session.id)
+            stored = self._stored(key) or session
+            with self._conn:
+                updated = self._conn.execute(
+                    "UPDATE sessions SET state = ?, last_update_time = ? "
+                    "WHERE app_name = ? AND user_id = ? AND id = ?",
+                    (json.dumps(stored.state, default=str), event.timestamp, *key)
+                ).rowcount
+                if not updated:
+                    return event
+                self._conn.execute(
+                    "INSERT INTO session_events (app_name, user_id, session_id, event_id, event) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (*key, event.id, event.model_dump_json(exclude_none=True))
+                )
+                self._save_shared_state(session.app_name, session.user_id, event)
+            return event
+
+    def _save_shared_state(self, app_name: str, user_id: str, event: Event):
+        """Persist app:/user: state the event changed (InMemorySessionService keeps it in dicts)"""
+        delta = event.actions.state_delta if event.actions else None
+        if not delta:
+            return
+        if any(key.startswith(State.APP_PREFIX) for key in delta):
+            self._conn.execute(
+                "INSERT OR REPLACE INTO app_states (app_name, state) VALUES (?, ?)",
+                (app_name, json.dumps(self.app_state.get(app_name, {}), default=str))
+            )
+        if any(key.startswith(State.USER_PREFIX) for key in delta):
+            self._conn.execute(
+                "INSERT OR REPLACE INTO user_states (app_name, user_id, state) VALUES (?, ?, ?)",
+                (app_name, user_id,
+                 json.dumps(self.user_state.get(app_name, {}).get(user_id, {}), default=str))
+            )
+
+    def _summary_event(self, summary: str, timestamp: float) -> Event:
+        return Event(
+            invocation_id=SUMMARY_INVOCATION_ID,
+            author="user",
+            content=types.Content(role="user", parts=[types.Part(text=_SUMMARY_HEADER + summary)]),
+            timestamp=timestamp,
+        )
+
+    def _trim(self, key: SessionKey, stored: Session):
+        """Compact the oldest turns past max_events into the session summary,
+        cutting only at a user turn so a tool call is never separated from its response"""
+        events = stored.events
+        start = 1 if events and events[0].invocation_id == SUMMARY_INVOCATION_ID else 0
+        if self.max_events <= 0 or len(events) - start <= self.max_events:
+            return
+        cut = len(events) - self.max_events
+        while cut < len(events) and events[cut].author != "user":
+            cut += 1
+        if cut == len(events):
+            return
+        compacted = events[start:cut]
+
+        previous = events[0].content.parts[0].text[len(_SUMMARY_HEADER):] if start else ""
+        lines = (previous.splitlines() if previous else []) + summarize_turns(compacted)
+        while len(lines) > 1 and sum(len(line) + 1 for line in lines) > self.summary_chars:
+            lines.pop(0)
+        summary = "\n".join(lines)
+
+        events[:cut] = [self._summary_event(summary, compacted[-1].timestamp)]
+        sizes = self._event_bytes.get(key, deque())
+        self._event_bytes[key] = deque([len(summary)] + list(sizes)[cut:])
+        self.trimmed_events += len(compacted)
+        self.compactions += 1
+
+        with self._conn:
+            self._conn.execute(
+                "UPDATE sessions SET summary = ? WHERE app_name = ? AND user_id = ? AND id = ?",
+                (summary, *key)
+            )
+            self._conn.executemany(
+                "DELETE FROM session_events WHERE app_name = ? AND user_id = ? AND session_id = ? "
+                "AND event_id = ?",
+                [(*key, event.id) for event in compacted]
+            )
+        logger.info(f"🗜️ Compacted {len(compacted)} event(s) of session {key[2]} into its summary")
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        with self._lock:
+            stored_sessions, = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()
+            stored_events, = self._conn.execute("SELECT COUNT(*) FROM session_events").fetchone()
+        stats.update({
+            "stored_sessions": stored_sessions,
+            "stored_events": stored_events,
+            "compactions": self.compactions,
+            "loads": self.loads,
+            "db_path": self.db_path,
+        })
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,169 @@
+"""
+Bounded in-memory session service for the ADK runner.
+
+InMemorySessionService keeps every session and every event for the life of
+the process, and requests without a session_id (/api/process-query, inline
+mode) start a new session each time. BoundedSessionService caps that: idle
+sessions expire after a TTL, the least recently used ones are evicted past
+max_sessions, and each session keeps only its most recent events.
+"""
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Optional, Tuple
+import logging
+import os
+import threading
+import time
+
+from google.adk.events.event import Event
+from google.adk.sessions.base_session_service import GetSessionConfig
+from google.adk.sessions.in_memory_session_service import InMemorySessionService
+from google.adk.sessions.session import Session
+
+logger = logging.getLogger("pointer.sessions")
+
+MAX_SESSIONS = int(os.environ.get("POINTER_MAX_SESSIONS", 256))
+# Seconds a session may sit idle before it is dropped (0 keeps them forever)
+SESSION_TTL = float(os.environ.get("POINTER_SESSION_TTL", 6 * 3600))
+# Events kept per session (0 keeps them all)
+MAX_SESSION_EVENTS = int(os.environ.get("POINTER_SESSION_MAX_EVENTS", 200))
+
+SessionKey = Tuple[str, str, str]
+
+
+class BoundedSessionService(InMemorySessionService):
+    """InMemorySessionService with LRU/TTL eviction and a per-session event cap."""
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, ttl: float = SESSION_TTL,
+                 max_events: int = MAX_SESSION_EVENTS):
+        super().__init__()
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_events = max_events
+        # Session keys, least recently used first, with their last use time
+        self._last_used: "OrderedDict[SessionKey, float]" = OrderedDict()
+        # Serialized size of each stored event, oldest first
+        self._event_bytes: Dict[SessionKey, Deque[int]] = {}
+        self._lock = threading.RLock()
+        self.evicted = 0
+        self.expired = 0
+        self.trimmed_events = 0
+
+    def create_session(self, *, app_name: str, user_id: str,
+                       state: Optional[Dict[str, Any]] = None,
+                       session_id: Optional[str] = None) -> Session:
+        with self._lock:
+            self._expire()
+            session = super().create_session(
+                app_name=app_name, user_id=user_id, state=state, session_id=session_id
+            )
+            key = (app_name, user_id, session.id)
+            self._touch(key)
+            self._event_bytes[key] = deque()
+            self._evict_over_limit()
+            return session
+
+    def get_session(self, *, app_name: str, user_id: str, session_id: str,
+                    config: Optional[GetSessionConfig] = None) -> Optional[Session]:
+        key = (app_name, user_id, session_id)
+        with self._lock:
+            if self._is_expired(key, time.time()):
+                self._drop(key)
+                self.expired += 1
+                return None
+            session = super().get_session(
+                app_name=app_name, user_id=user_id, session_id=session_id, config=config
+            )
+            if session is not None:
+                self._touch(key)
+            return session
+
+    def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        with self._lock:
+            self._drop((app_name, user_id, session_id))
+
+    def append_event(self, session: Session, event: Event) -> Event:
+        with self._lock:
+            super().append_event(session=session, event=event)
+            key = (session.app_name, session.user_id, session.id)
+            stored = self._stored(key)
+            if event.partial or stored is None:
+                return event
+            self._touch(key)
+            self._event_bytes.setdefault(key, deque()).append(
+                len(event.model_dump_json(exclude_none=True))
+            )
+            self._trim(key, stored)
+            return event
+
+    def stats(self) -> Dict[str, Any]:
+        """Session counts, stored events and their approximate size in bytes"""
+        with self._lock:
+            now = time.time()
+            return {
+                "sessions": len(self._last_used),
+                "events": sum(len(sizes) for sizes in self._event_bytes.values()),
+                "event_bytes": sum(sum(sizes) for sizes in self._event_bytes.values()),
+                "max_sessions": self.max_sessions,
+                "max_events": self.max_events,
+                "ttl_seconds": self.ttl,
+                "oldest_idle_seconds": round(now - next(iter(self._last_used.values())), 1)
+                if self._last_used else 0.0,
+                "evicted": self.evicted,
+                "expired": self.expired,
+                "trimmed_events": self.trimmed_events,
+            }
+
+    def _stored(self, key: SessionKey) -> Optional[Session]:
+        app_name, user_id, session_id = key
+        return self.sessions.get(app_name, {}).get(user_id, {}).get(session_id)
+
+    def _touch(self, key: SessionKey):
+        self._last_used[key] = time.time()
+        self._last_used.move_to_end(key)
+
+    def _is_expired(self, key: SessionKey, now: float) -> bool:
+        last_used = self._last_used.get(key)
+        return self.ttl > 0 and last_used is not None and now - last_used > self.ttl
+
+    def _expire(self):
+        """Drop idle sessions; they sit at the front of the LRU order"""
+        now = time.time()
+        while self._last_used:
+            key = next(iter(self._last_used))
+            if not self._is_expired(key, now):
+                break
+            self._drop(key)
+            self.expired += 1
+
+    def _evict_over_limit(self):
+        while len(self._last_used) > self.max_sessions > 0:
+            oldest = next(iter(self._last_used))
+            self._drop(oldest)
+            self.evicted += 1
+            logger.info(f"🧹 Evicted least recently used session {oldest[2]}")
+
+    def _drop(self, key: SessionKey):
+        app_name, user_id, session_id = key
+        user_sessions = self.sessions.get(app_name, {}).get(user_id, {})
+        user_sessions.pop(session_id, None)
+        if not user_sessions:
+            self.sessions.get(app_name, {}).pop(user_id, None)
+        self._last_used.pop(key, None)
+        self._event_bytes.pop(key, None)
+
+    def _trim(self, key: SessionKey, stored: Session):
+        """Drop the oldest events past max_events, cutting only at a user turn
+        so a tool call is never separated from its response"""
+        events = stored.events
+        if self.max_events <= 0 or len(events) <= self.max_events:
+            return
+        cut = len(events) - self.max_events
+        while cut < len(events) and events[cut].author != "user":
+            cut += 1
+        if cut == len(events):
+            return
+        del events[:cut]
+        sizes = self._event_bytes[key]
+        for _ in range(min(cut, len(sizes))):
+            sizes.popleft()
+        self.trimmed_events += cut
@@ -0,0 +1,220 @@
+"""
+Memory-mapped vector matrix for the knowledge base.
+
+Vectors live in raw sidecar files next to knowledge_base.db opened with
+np.memmap, so startup maps the file instead of reading and decoding every
+row; the OS pages vectors in as searches touch them. SQLite still holds each
+float32 vector as the source of truth, and the files are rebuilt from it
+whenever they are missing or out of date.
+
+Vectors can be stored as float32, float16 (half the size) or int8 with one
+float32 scale per vector (a quarter of the size, plus 4 bytes a row).
+"""
+from typing import Optional, Tuple, Union
+import numpy as np
+import os
+
+VECTOR_MODES = ("float32", "float16", "int8")
+DEFAULT_VECTOR_MODE = os.environ.get("POINTER_VECTOR_DTYPE", "float32")
+
+_SUFFIXES = {"float32": ".vectors.f32", "float16": ".vectors.f16", "int8": ".vectors.i8"}
+_DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+# Largest per-component error a stored unit vector can have in each mode
+_TOLERANCE = {"float32": 1e-6, "float16": 1e-3, "int8": 1 / 127}
+
+Rows = Union[slice, np.ndarray, list]
+
+
+class VectorFile:
+    """Growable (capacity, dim) matrix backed by a memory-mapped file."""
+
+    def __init__(self, path: str, dim: int, capacity: int = 256, dtype=np.float32):
+        self.path = path
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self._row_bytes = dim * self.dtype.itemsize
+        self.matrix: Optional[np.memmap] = None
+        self._open(max(capacity, self.stored_rows()))
+
+    @property
+    def capacity(self) -> int:
+        return self.matrix.shape[0]
+
+    def stored_rows(self) -> int:
+        """Whole rows currently in the file (0 if it doesn't exist)."""
+        if not os.path.exists(self.path):
+            return 0
+        return os.path.getsize(self.path) // self._row_bytes
+
+    def _open(self, capacity: int):
+        with open(self.path, "ab") as f:
+            if f.tell() < capacity * self._row_bytes:
+                f.truncate(capacity * self._row_bytes)
+        self.matrix = np.memmap(self.path, dtype=self.dtype, mode="r+", shape=(capacity, self.dim))
+
+    def _unmap(self):
+        if self.matrix is not None:
+            self.matrix.flush()
+            # Drop our mapping before resizing the file (Windows can't shrink
+            # a mapped file); callers never keep views past the store lock
+            self.matrix = None
+
+    def reserve(self, rows: int):
+        """Make room for at least `rows` rows, doubling the file as needed."""
+        if rows <= self.capacity:
+            return
+        capacity = self.capacity
+        while capacity < rows:
+            capacity *= 2
+        self._unmap()
+        self._open(capacity)
+
+    def reset(self, capacity: int = 256):
+        """Discard every stored vector."""
+        self._unmap()
+        with open(self.path, "wb"):
+            pass
+        self._open(capacity)
+
+    def flush(self):
+        if self.matrix is not None:
+            self.matrix.flush()
+
+    def close(self):
+        self._unmap()
+
+
+class QuantizedVectors:
+    """Unit vectors stored as float32, float16 or per-vector-scaled int8.
+
+    Reads always return float32; scoring dequantizes in blocks so a scan never
+    materializes the whole matrix as float32.
+    """
+
+    # Small blocks keep the dequantized copy in cache
+    BLOCK_ROWS = 1024
+
+    def __init__(self, base_path: str, dim: int, mode: str = DEFAULT_VECTOR_MODE, capacity: int = 256):
+        if mode not in VECTOR_MODES:
+            raise ValueError(f"Unknown vector mode: {mode} (expected one of {', '.join(VECTOR_MODES)})")
+        self.mode = mode
+        self.dim = dim
+        self.codes = VectorFile(base_path + _SUFFIXES[mode], dim, capacity, _DTYPES[mode])
+        # int8 rows are codes * scale, with scale = max(|v|) / 127
+        self.scales = (VectorFile(base_path + ".vectors.scale", 1, capacity, np.float32)
+                       if mode == "int8" else None)
+
+    @property
+    def path(self) -> str:
+        return self.codes.path
+
+    @property
+    def capacity(self) -> int:
+        return self.codes.capacity
+
+    @property
+    def bytes_per_vector(self) -> int:
+        return self.dim * self.codes.dtype.itemsize + (4 if self.scales is not None else 0)
+
+    def stored_rows(self) -> int:
+        rows = self.codes.stored_rows()
+        return min(rows, self.scales.stored_rows()) if self.scales is not None else rows
+
+    def encode(self, vecs: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Quantize float32 row vectors into (codes, scales)."""
+        vecs = np.asarray(vecs, dtype=np.float32)
+        if self.mode != "int8":
+            return vecs.astype(self.codes.dtype), None
+        scales = np.abs(vecs).max(axis=-1, keepdims=True) / 127
+        safe = np.where(scales > 0, scales, 1.0)
+        codes = np.clip(np.rint(vecs / safe), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def read(self, rows: Union[int, Rows]) -> np.ndarray:
+        """Dequantized float32 copies of `rows` (an index, slice or index array)."""
+        vecs = np.asarray(self.codes.matrix[rows], dtype=np.float32)
+        if self.scales is not None:
+            vecs = vecs * self.scales.matrix[rows]
+        return vecs
+
+    def write(self, rows: Rows, vecs: np.ndarray):
+        codes, scales = self.encode(vecs)
+        self.codes.matrix[rows] = codes
+        if self.scales is not None:
+            self.scales.matrix[rows] = scales
+
+    def snapshot(self, rows: Rows) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Raw stored codes for `rows`, to put back with restore()."""
+        return (np.array(self.codes.matrix[rows]),
+                np.array(self.scales.matrix[rows]) if self.scales is not None else None)
+
+    def restore(self, rows: Rows, snapshot: Tuple[np.ndarray, Optional[np.ndarray]]):
+        codes, scales = snapshot
+        self.codes.matrix[rows] = codes
+        if self.scales is not None:
+            self.scales.matrix[rows] = scales
+
+    def copy_rows(self, src: Rows, dst: Rows):
+        """Move stored rows without re-quantizing them."""
+        self.restore(dst, self.snapshot(src))
+
+    def matches(self, rows: Union[int, Rows], vecs: np.ndarray) -> bool:
+        """Whether stored `rows` hold (the quantized form of) `vecs`."""
+        vecs = np.asarray(vecs, dtype=np.float32)
+        stored = self.read(rows)
+        return vecs.shape == stored.shape and np.allclose(stored, vecs, atol=_TOLERANCE[self.mode])
+
+    def scores(self, qvec: np.ndarray, n: int, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Dot products of `qvec` with the first `n` rows, or with `rows`."""
+        if self.mode == "float32":
+            return self.codes.matrix[:n] @ qvec if rows is None else self.codes.matrix[rows] @ qvec
+        total = n if rows is None else len(rows)
+        out = np.empty(total, dtype=np.float32)
+        for start in range(0, total, self.BLOCK_ROWS):
+            block = slice(start, min(start + self.BLOCK_ROWS, total))
+            stored = block if rows is None else rows[block]
+            out[block] = np.asarray(self.codes.matrix[stored], dtype=np.float32) @ qvec
+            if self.scales is not None:
+                # (codes * scale) . q == (codes . q) * scale
+                out[block] *= self.scales.matrix[stored][:, 0]
+        return out
+
+    def dense(self, n: int) -> "DenseView":
+        """Read-only float32 view of the first `n` rows (for IVF training)."""
+        return DenseView(self, n)
+
+    def reserve(self, rows: int):
+        self.codes.reserve(rows)
+        if self.scales is not None:
+            self.scales.reserve(rows)
+
+    def reset(self, capacity: int = 256):
+        self.codes.reset(capacity)
+        if self.scales is not None:
+            self.scales.reset(capacity)
+
+    def flush(self):
+        self.codes.flush()
+        if self.scales is not None:
+            self.scales.flush()
+
+    def close(self):
+        self.codes.close()
+        if self.scales is not None:
+            self.scales.close()
+
+
+class DenseView:
+    """Indexable float32 view over the first `n` stored rows, dequantized on access."""
+
+    def __init__(self, vectors: QuantizedVectors, n: int):
+        self._vectors = vectors
+        self._n = n
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __getitem__(self, rows):
+        if isinstance(rows, slice):
+            rows = slice(*rows.indices(self._n))
+        return self._vectors.read(rows)
@@ -277,35 +277,19 @@ class KeyboardMonitor:
         
         print(f"📤 Sending message: {message}", flush=True)
         
-        # Since we're in a different thread (pynput's thread), we need to schedule
-        # the async operations in the main event loop
-        import threading
+        # We're on pynput's thread; hand the send to the server's event loop so it
+        # goes through the connection manager's per-socket lock like every other message
+        loop = self.connection_manager.loop
+        if loop is None or loop.is_closed():
+            print("⚠️  Server event loop is not running; dropping hotkey event", flush=True)
+            return
         
-        def send_to_all():
-            """Send message to all connections"""
-            connections = self.connection_manager.get_all()
-            print(f"🔄 [WebSocket Thread] Starting send_to_all with {len(connections)} connections", flush=True)
-            for i, connection in enumerate(connections):
-                try:
-                    print(f"📡 [WebSocket] Sending to connection {i+1}...", flush=True)
-                    print(f"📡 [WebSocket] Creating new event loop...", flush=True)
-                    loop = asyncio.new_event_loop()
-                    print(f"📡 [WebSocket] Setting event loop...", flush=True)
-                    asyncio.set_event_loop(loop)
-                    print(f"📡 [WebSocket] Running send_json...", flush=True)
-                    loop.run_until_complete(connection.send_json(message))
-                    print(f"📡 [WebSocket] Closing loop...", flush=True)
-                    loop.close()
-                    print(f"✅ [WebSocket] Sent to connection {i+1}", flush=True)
-                except Exception as e:
-                    print(f"❌ [WebSocket] Failed to send to connection {i+1}: {e}", flush=True)
-                    import traceback
-                    traceback.print_exc()
-            print(f"🔄 [WebSocket Thread] Finished send_to_all", flush=True)
+        def report(future):
+            if not future.cancelled() and future.exception() is not None:
+                print(f"❌ [WebSocket] Broadcast failed: {future.exception()}", flush=True)
         
-        # Run in a separate thread to avoid blocking the keyboard listener
-        thread = threading.Thread(target=send_to_all, daemon=True)
-        thread.start()
+        future = asyncio.run_coroutine_threadsafe(self.connection_manager.broadcast(message), loop)
+        future.add_done_callback(report)
         
         print("="*60 + "\n", flush=True)
     
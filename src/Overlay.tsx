@@ -227,6 +227,30 @@ export default function Overlay() {
   const [doneMessage, setDoneMessage] = useState(
     "Your request has been processed."
   );
+  // Warm connection to the backend, reused for every query from this overlay
+  const socketRef = useRef<WebSocket | null>(null);
+  const activeQueryRef = useRef<string | null>(null);
+
+  useEffect(() => {
+    let closed = false;
+    let reconnectTimeout: ReturnType<typeof setTimeout> | null = null;
+
+    const connect = () => {
+      const ws = new WebSocket("ws://127.0.0.1:8765/ws");
+      socketRef.current = ws;
+      ws.onclose = () => {
+        if (socketRef.current === ws) socketRef.current = null;
+        if (!closed) reconnectTimeout = setTimeout(connect, 2000);
+      };
+    };
+    connect();
+
+    return () => {
+      closed = true;
+      if (reconnectTimeout) clearTimeout(reconnectTimeout);
+      socketRef.current?.close(1000);
+    };
+  }, []);
 
   useEffect(() => {
     // Fetch context from Tauri state (primary method)
@@ -264,6 +288,16 @@ export default function Overlay() {
   }, []);
 
   const closeOverlay = async () => {
+    // Stop a query that is still running; its result has nowhere to go
+    const ws = socketRef.current;
+    if (activeQueryRef.current && ws?.readyState === WebSocket.OPEN) {
+      ws.send(
+        JSON.stringify({
+          type: "agent-cancel",
+          data: { id: activeQueryRef.current },
+        })
+      );
+    }
     try {
       console.log("Closing overlay...");
       await invoke("hide_overlay");
@@ -272,6 +306,106 @@ export default function Overlay() {
     }
   };
 
+  type FrameHandler = (eventType: string, payload: any) => void;
+
+  // agent-query over the open WebSocket; resolves on agent-done
+  const streamOverSocket = (
+    ws: WebSocket,
+    body: object,
+    handleFrame: FrameHandler
+  ) =>
+    new Promise<void>((resolve, reject) => {
+      const id = crypto.randomUUID();
+      activeQueryRef.current = id;
+
+      const finish = (error?: Error) => {
+        ws.removeEventListener("message", onMessage);
+        ws.removeEventListener("close", onClose);
+        activeQueryRef.current = null;
+        if (error) reject(error);
+        else resolve();
+      };
+      const onMessage = (event: MessageEvent) => {
+        const message = JSON.parse(event.data);
+        if (!message.type?.startsWith("agent-") || message.data?.id !== id) {
+          return;
+        }
+        if (message.type === "agent-cancelled") {
+          finish(new Error("Query cancelled"));
+          return;
+        }
+        try {
+          // agent-function-call-start -> function_call_start
+          handleFrame(
+            message.type.slice(6).replace(/-/g, "_"),
+            message.data
+          );
+        } catch (error) {
+          finish(error as Error);
+          return;
+        }
+        if (message.type === "agent-done") finish();
+      };
+      const onClose = () => finish(new Error("Connection to backend lost"));
+
+      ws.addEventListener("message", onMessage);
+      ws.addEventListener("close", onClose);
+      ws.send(JSON.stringify({ type: "agent-query", data: { id, ...body } }));
+    });
+
+  // Fallback when the socket isn't open: Server-Sent Events over HTTP
+  const streamOverHttp = async (body: object, handleFrame: FrameHandler) => {
+    const response = await fetch("http://127.0.0.1:8765/api/agent/stream", {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+      },
+      body: JSON.stringify(body),
+    });
+
+    if (!response.ok) {
+      const errorData = await response
+        .json()
+        .catch(() => ({ detail: response.statusText }));
+      throw new Error(
+        errorData.detail || `HTTP ${response.status}: ${response.statusText}`
+      );
+    }
+
+    if (!response.body) {
+      throw new Error("Streaming is not supported");
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+
+    const parseFrame = (frame: string) => {
+      let eventType = "message";
+      let data = "";
+      for (const line of frame.split("\n")) {
+        if (line.startsWith("event: ")) {
+          eventType = line.slice(7);
+        } else if (line.startsWith("data: ")) {
+          data += line.slice(6);
+        }
+      }
+      if (data) handleFrame(eventType, JSON.parse(data));
+    };
+
+    while (true) {
+      const { value, done: streamDone } = await reader.read();
+      if (streamDone) break;
+      buffer += decoder.decode(value, { stream: true });
+      let boundary = buffer.indexOf("\n\n");
+      while (boundary !== -1) {
+        parseFrame(buffer.slice(0, boundary));
+        buffer = buffer.slice(boundary + 2);
+        boundary = buffer.indexOf("\n\n");
+      }
+    }
+  };
+
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault();
     if (!query.trim() || isProcessing) return;
@@ -315,33 +449,45 @@ export default function Overlay() {
         session_id: null,
       });
 
-      const response = await fetch("http://127.0.0.1:8765/api/agent", {
-        method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-        },
-        body: JSON.stringify({
-          message: query,
-          context_parts: contextParts.length > 0 ? contextParts : null,
-          session_id: null,
-        }),
-      });
+      const body = {
+        message: query,
+        context_parts: contextParts.length > 0 ? contextParts : null,
+        session_id: null,
+      };
+      let responseText = "";
+      let finalResponse: string | null = null;
+
+      // Frame types match the backend's agent_events(): text shows up as the
+      // agent produces it
+      const handleFrame = (eventType: string, payload: any) => {
+        if (eventType === "delta") {
+          responseText += payload.text;
+          clearInterval(messageInterval);
+          setDone(true);
+          setDoneMessage(responseText);
+        } else if (eventType === "function_call_start") {
+          clearInterval(messageInterval);
+          setLoadingMessage(`Running ${payload.name}...`);
+        } else if (eventType === "done") {
+          console.log("Arrow Agent Result:", payload);
+          finalResponse = payload.response;
+        } else if (eventType === "error") {
+          throw new Error(payload.message);
+        }
+      };
 
-      if (!response.ok) {
-        const errorData = await response
-          .json()
-          .catch(() => ({ detail: response.statusText }));
-        throw new Error(
-          errorData.detail || `HTTP ${response.status}: ${response.statusText}`
-        );
+      const ws = socketRef.current;
+      if (ws && ws.readyState === WebSocket.OPEN) {
+        await streamOverSocket(ws, body, handleFrame);
+      } else {
+        await streamOverHttp(body, handleFrame);
       }
 
-      const result = await response.json();
-      console.log("Arrow Agent Result:", result);
-
       clearInterval(messageInterval);
       setDone(true);
-      setDoneMessage(result.response || "Your request has been processed.");
+      setDoneMessage(
+        finalResponse || responseText || "Your request has been processed."
+      );
       // Don't auto-close, let user dismiss with ESC
     } catch (error) {
       console.error("Error processing query:", error);
@@ -276,7 +276,6 @@ const ButtonGroup = styled.div`
 
 interface Document {
   id: string;
-  text: string;
   source: string;
   filename?: string;
   created_at: string;
@@ -294,6 +293,7 @@ export default function RagPanel({ onShowToast }: RagPanelProps) {
   const [textToAdd, setTextToAdd] = useState("");
   const [searchQuery, setSearchQuery] = useState("");
   const [documents, setDocuments] = useState<Document[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [searchResults, setSearchResults] = useState<any[]>([]);
   const [isLoading, setIsLoading] = useState(false);
   const [dragOver, setDragOver] = useState(false);
@@ -308,13 +308,28 @@ export default function RagPanel({ onShowToast }: RagPanelProps) {
     loadDocuments();
   }, []);
 
-  const loadDocuments = async () => {
+  // Loads the first page, or appends the page after `cursor`
+  const loadDocuments = async (cursor?: string) => {
     try {
-      const response = await fetch("http://127.0.0.1:8765/api/rag/documents");
+      const params = new URLSearchParams({
+        limit: "50",
+        fields: "id,preview,source,filename,created_at",
+      });
+      if (cursor) {
+        params.set("cursor", cursor);
+      }
+      const response = await fetch(
+        `http://127.0.0.1:8765/api/rag/documents?${params}`
+      );
       const data = await response.json();
       if (data.success) {
-        setDocuments(data.documents);
-        calculateStats(data.documents);
+        setDocuments((docs) =>
+          cursor ? [...docs, ...data.documents] : data.documents
+        );
+        setNextCursor(data.next_cursor);
+      }
+      if (!cursor) {
+        loadStats();
       }
     } catch (error) {
       console.error("Error loading documents:", error);
@@ -322,13 +337,18 @@ export default function RagPanel({ onShowToast }: RagPanelProps) {
     }
   };
 
-  const calculateStats = (docs: Document[]) => {
-    setStats({
-      total: docs.length,
-      files: docs.filter((d) => d.source === "file").length,
-      manual: docs.filter((d) => d.source === "manual").length,
-      selection: docs.filter((d) => d.source === "selection").length,
-    });
+  const loadStats = async () => {
+    const response = await fetch("http://127.0.0.1:8765/api/rag/stats");
+    const data = await response.json();
+    if (data.success) {
+      const bySource = data.by_source || {};
+      setStats({
+        total: data.total_documents,
+        files: bySource.file || 0,
+        manual: bySource.manual || 0,
+        selection: bySource.selection || 0,
+      });
+    }
   };
 
   const handleAddText = async () => {
@@ -350,8 +370,19 @@ export default function RagPanel({ onShowToast }: RagPanelProps) {
 
       const data = await response.json();
       if (data.success) {
-        onShowToast("Text added to knowledge base", "success");
-        setTextToAdd("");
+        // Duplicates come back without a job; new text is embedded in the background
+        const job = data.job_id ? await waitForIngestJob(data.job_id) : data;
+        if (job?.status === "done") {
+          onShowToast(
+            data.duplicate
+              ? "Text is already in the knowledge base"
+              : "Text added to knowledge base",
+            "success"
+          );
+          setTextToAdd("");
+        } else {
+          onShowToast(job?.error || "Failed to add text", "error");
+        }
         loadDocuments();
       } else {
         onShowToast("Failed to add text", "error");
@@ -364,6 +395,21 @@ export default function RagPanel({ onShowToast }: RagPanelProps) {
     }
   };
 
+  const waitForIngestJob = async (jobId: string) => {
+    // Uploads are indexed in the background; poll until the job finishes
+    while (true) {
+      const response = await fetch(
+        `http://127.0.0.1:8765/api/rag/jobs/${jobId}`
+      );
+      const data = await response.json();
+      if (!data.success) return null;
+      if (data.job.status === "done" || data.job.status === "failed") {
+        return data.job;
+      }
+      await new Promise((resolve) => setTimeout(resolve, 500));
+    }
+  };
+
   const handleFileUpload = async (file: File) => {
     setIsLoading(true);
     try {
@@ -382,7 +428,13 @@ export default function RagPanel({ onShowToast }: RagPanelProps) {
 
         const data = await response.json();
         if (data.success) {
-          onShowToast(`File "${file.name}" indexed successfully`, "success");
+          onShowToast(`Indexing "${file.name}"...`, "info");
+          const job = await waitForIngestJob(data.job_id);
+          if (job?.status === "done") {
+            onShowToast(`File "${file.name}" indexed successfully`, "success");
+          } else {
+            onShowToast(job?.error || "Failed to index file", "error");
+          }
           loadDocuments();
         } else {
           onShowToast(data.detail || "Failed to upload file", "error");
@@ -404,7 +456,12 @@ export default function RagPanel({ onShowToast }: RagPanelProps) {
 
       const data = await response.json();
       if (data.success) {
-        onShowToast(`File "${file.name}" indexed successfully`, "success");
+        const job = data.job_id ? await waitForIngestJob(data.job_id) : data;
+        if (job?.status === "done") {
+          onShowToast(`File "${file.name}" indexed successfully`, "success");
+        } else {
+          onShowToast(job?.error || "Failed to index file", "error");
+        }
         loadDocuments();
       } else {
         onShowToast("Failed to upload file", "error");
@@ -653,6 +710,11 @@ export default function RagPanel({ onShowToast }: RagPanelProps) {
                     </DocumentItem>
                   ))}
                 </AnimatePresence>
+                {nextCursor && (
+                  <Button onClick={() => loadDocuments(nextCursor)}>
+                    Load more
+                  </Button>
+                )}
               </DocumentList>
             )}
           </>